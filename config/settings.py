@@ -46,12 +46,16 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "vtso.middleware.AdmissionControlMiddleware",
+    "vtso.middleware.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "vtso.middleware.RequestClockMiddleware",
+    "vtso.middleware.ReplicaRoutingMiddleware",
 ]
 
 ROOT_URLCONF = "config.urls"
@@ -85,6 +89,16 @@ DATABASES = {
     }
 }
 
+# Read replicas are additional DATABASES aliases listed in VTSO_READ_REPLICAS.
+# Reads of GET/HEAD/OPTIONS requests are sent to them, except for clients that
+# wrote in the last VTSO_REPLICA_STICKY_SECONDS (see vtso/routers.py).
+# To try the routing locally, add an alias pointing at the same database:
+#     DATABASES["replica"] = {**DATABASES["default"], "TEST": {"MIRROR": "default"}}
+#     VTSO_READ_REPLICAS = ["replica"]
+VTSO_READ_REPLICAS: list[str] = []
+VTSO_REPLICA_STICKY_SECONDS = 5
+DATABASE_ROUTERS = ["vtso.routers.ReadReplicaRouter"]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -129,11 +143,20 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 AUTH_USER_MODEL = "vtso.User"
 
+# ModelBackend with the permissions of each user kept in the cache named by
+# VTSO_PERMISSION_CACHE for VTSO_PERMISSION_CACHE_SECONDS (vtso/backends.py).
+# The cache must be shared by all the workers for permission changes to be
+# seen by every worker at once.
+AUTHENTICATION_BACKENDS = ["vtso.backends.CachedModelBackend"]
+VTSO_PERMISSION_CACHE = "default"
+VTSO_PERMISSION_CACHE_SECONDS = 3600
+
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
         "rest_framework.authentication.BasicAuthentication",
         "rest_framework.authentication.SessionAuthentication",
         "rest_framework.authentication.TokenAuthentication",
+        "vtso.authentication.ExpiringTokenAuthentication",
     ],
     # Use Django's standard `django.contrib.auth` permissions,
     # or allow read-only access for unauthenticated users.
@@ -141,6 +164,13 @@ REST_FRAMEWORK = {
         "rest_framework.permissions.DjangoModelPermissionsOrAnonReadOnly"
     ],
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    # per client and endpoint budgets (see vtso/throttling.py); views that
+    # list or aggregate whole tables use the "expensive" scope
+    "DEFAULT_THROTTLE_CLASSES": ["vtso.throttling.ClientRateThrottle"],
+    "DEFAULT_THROTTLE_RATES": {
+        "expensive": "60/minute",
+        "cheap": "600/minute",
+    },
 }
 
 # drf-spectacular settings (for OpenAPI)
@@ -151,3 +181,75 @@ SPECTACULAR_SETTINGS = {
     "SERVE_INCLUDE_SCHEMA": False,
     # OTHER SETTINGS
 }
+
+# Admin changelists switch to the database's row estimate instead of an
+# exact COUNT(*) once an unfiltered table grows beyond this many rows
+VTSO_ADMIN_ESTIMATED_COUNT_THRESHOLD = 100_000
+
+# Maximum number of ids accepted by the ?ids= batch lookups
+VTSO_MULTI_GET_MAX_IDS = 100
+
+# Maximum number of items accepted by PATCH /vtso/ships/bulk/
+VTSO_BULK_UPDATE_MAX_ITEMS = 500
+
+# Visits that exited more than this many days ago are moved to the
+# VISIT_ARCHIVE table by `manage.py archive_visits`
+VTSO_VISIT_ARCHIVE_HORIZON_DAYS = 365
+
+# Seconds an expiring API token from POST /vtso/tokens/ stays valid. Clients
+# renew it before then with POST /vtso/tokens/refresh/, and
+# `manage.py prune_tokens` deletes the expired ones
+VTSO_TOKEN_TTL = 86_400
+
+# Seconds an Idempotency-Key and the response of its POST request are kept
+# for replay. Expired keys are deleted by `manage.py prune_idempotency_keys`
+VTSO_IDEMPOTENCY_KEY_TTL = 86_400
+
+# Maximum number of changes returned by one GET /vtso/changes/ request
+VTSO_CHANGE_FEED_MAX_LIMIT = 1000
+# /vtso/changes/ holds back the changes written in the last this many
+# seconds, so that changes of transactions still in flight are not skipped.
+# Keep it above the duration of the longest write transaction.
+VTSO_CHANGE_FEED_SETTLE_SECONDS = 5
+
+# Maximum number of buckets returned by GET /vtso/harbours/<pk>/occupancy/
+VTSO_OCCUPANCY_MAX_BUCKETS = 5000
+
+# Origin-destination matrix (GET /vtso/harbours/od-matrix/): consecutive calls
+# of a ship further apart than this are not counted as a passage, and the
+# matrices of periods that already ended are cached this many seconds
+VTSO_OD_MAX_PASSAGE_DAYS = 90
+VTSO_OD_CACHE_SECONDS = 86_400
+
+# Berth forecasts (vtso/forecast.py). Dwell times are learned in hourly bins
+# up to VTSO_DWELL_MAX_HOURS, changing it requires
+# `manage.py learn_dwell_times --rebuild`. Ship types with fewer learned
+# visits than VTSO_FORECAST_MIN_SAMPLES use the harbour-wide distribution.
+# Visits closed in the last VTSO_DWELL_SETTLE_SECONDS are learned by the next
+# run, so that transactions still in flight when a run starts are not skipped.
+VTSO_DWELL_MAX_HOURS = 336
+VTSO_DWELL_SETTLE_SECONDS = 60
+VTSO_FORECAST_MIN_SAMPLES = 20
+VTSO_FORECAST_MAX_HOURS = 168
+
+# Admission control (vtso.middleware.AdmissionControlMiddleware). Keep the
+# global limit below the number of database connections the workers of a
+# process can open. None disables a limit.
+VTSO_MAX_CONCURRENT_REQUESTS = 32
+VTSO_MAX_CONCURRENT_REQUESTS_PER_CLIENT = 8
+VTSO_ADMISSION_RETRY_AFTER = 1
+
+# Store of the throttling and admission counters. LocalCounterStore counts
+# per process; vtso.throttling.CacheCounterStore shares the counters through
+# the cache named by VTSO_COUNTER_CACHE.
+VTSO_COUNTER_STORE = "vtso.throttling.LocalCounterStore"
+VTSO_COUNTER_CACHE = "default"
+
+# Response compression (vtso.middleware.CompressionMiddleware). Brotli is
+# used when the optional `brotli` package is installed, gzip otherwise.
+# Only the API's JSON is compressed: compressing HTML pages, which carry a
+# CSRF token next to reflected input, would expose them to BREACH.
+VTSO_COMPRESSION_MIN_SIZE = 1024
+VTSO_COMPRESSION_CONTENT_TYPES = ("application/json",)
+VTSO_GZIP_LEVEL = 6
+VTSO_BROTLI_QUALITY = 4
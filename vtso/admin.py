@@ -4,10 +4,20 @@
 from django.contrib import admin
 
 from .models import (
+    AccessToken,
+    AccessTokenAdmin,
+    ArchivedVisit,
+    ArchivedVisitAdmin,
+    ChangeLog,
+    ChangeLogAdmin,
     Company,
     CompanyAdmin,
+    DwellHistogram,
+    DwellHistogramAdmin,
     Harbour,
     HarbourAdmin,
+    IdempotencyKey,
+    IdempotencyKeyAdmin,
     Person,
     PersonAdmin,
     Ship,
@@ -23,4 +33,9 @@ admin.site.register(Person, PersonAdmin)
 admin.site.register(Harbour, HarbourAdmin)
 admin.site.register(Ship, ShipAdmin)
 admin.site.register(Visit, VisitAdmin)
+admin.site.register(ArchivedVisit, ArchivedVisitAdmin)
+admin.site.register(ChangeLog, ChangeLogAdmin)
+admin.site.register(DwellHistogram, DwellHistogramAdmin)
+admin.site.register(IdempotencyKey, IdempotencyKeyAdmin)
+admin.site.register(AccessToken, AccessTokenAdmin)
 admin.site.register(User)
@@ -0,0 +1,397 @@
+"""
+Aggregate queries behind the reporting endpoints.
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+from heapq import merge
+from itertools import pairwise
+from operator import attrgetter
+from statistics import median
+
+from django.conf import settings
+from django.db.models import Count, DateTimeField, F, Q, Subquery, Sum, Value, Window
+from django.db.models.functions import Coalesce, Lag, Lead
+from django.utils import timezone
+
+from vtso import clock
+from vtso.archive import archive_cutoff, archive_needed
+from vtso.models import ArchivedVisit, Harbour, Person, Ship, Visit
+
+
+def company_summaries(companies) -> dict[int, dict]:
+    """
+    Computes the fleet summary of many Companies with one grouped query
+    per figure, whatever the number of Companies.
+
+    Args:
+        companies (QuerySet[Company]): the Companies to summarise
+
+    Returns:
+        dict[int, dict]: {company id: {"ship_count", "total_tonnage",
+        "ship_types", "person_count", "active_visits"}}
+    """
+    company_ids = companies.values("id")
+    summaries: dict[int, dict] = defaultdict(
+        lambda: {
+            "ship_count": 0,
+            "total_tonnage": 0,
+            "ship_types": {},
+            "person_count": 0,
+            "active_visits": 0,
+        }
+    )
+
+    ships = (
+        Ship.objects.filter(company_id__in=company_ids)
+        .values("company_id", "type")
+        .annotate(count=Count("id"), tonnage=Sum("tonnage"))
+        .order_by()
+    )
+    for row in ships:
+        summary = summaries[row["company_id"]]
+        summary["ship_count"] += row["count"]
+        summary["total_tonnage"] += row["tonnage"] or 0
+        summary["ship_types"][row["type"]] = row["count"]
+
+    persons = (
+        Person.objects.filter(company_id__in=company_ids)
+        .values("company_id")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+    for row in persons:
+        summaries[row["company_id"]]["person_count"] = row["count"]
+
+    # one count per part of Visit.objects.current(), added up below
+    at = clock.now()
+    visits = Visit.objects.filter(ship__company_id__in=company_ids)
+    open_counts, closing_counts = (
+        part.values("ship__company_id").annotate(count=Count("id")).order_by()
+        for part in (visits.open_at(at), visits.closing_after(at))
+    )
+    for row in open_counts.union(closing_counts, all=True):
+        summaries[row["ship__company_id"]]["active_visits"] += row["count"]
+
+    return summaries
+
+
+def current_ships(harbour_ids) -> dict[int, list]:
+    """
+    Fetches the Ships docked at many Harbours with a single query, in the
+    "current_ships" context format of HarbourDetailsSerializer.
+
+    Args:
+        harbour_ids (Iterable[int]): the Harbours to look up
+
+    Returns:
+        dict[int, list[Ship]]: {harbour id: docked Ships}, Harbours without
+        Ships are left out
+    """
+    ships: dict[int, list] = defaultdict(list)
+    visits = (
+        Visit.objects.filter(harbour__in=harbour_ids)
+        .select_related("ship")
+        .current()
+        .order_by("harbour", "entry_time", "id")
+    )
+    for visit in visits:
+        ships[visit.harbour_id].append(visit.ship)
+    return ships
+
+
+def occupancy_timeline(
+    stays, start: datetime, end: datetime, bucket: timedelta
+) -> list[dict]:
+    """
+    Computes how many ships were at a place in each bucket of a time range
+    with a single sweep over the sorted entry and exit events, instead of
+    one overlap query per bucket.
+
+    Args:
+        stays (Iterable[tuple[datetime, datetime | None]]): (entry, exit) of
+            each stay, exit is None for stays that are still going on
+        start (datetime): start of the first bucket
+        end (datetime): end of the last bucket, which may be shorter
+        bucket (timedelta): length of the buckets
+
+    Returns:
+        list[dict]: one {"start", "end", "peak", "average"} per bucket, where
+        average is the time weighted number of ships in the bucket
+    """
+    range_start, range_end = start.timestamp(), end.timestamp()
+    events = []
+    for entry_time, exit_time in stays:
+        entry_ts = max(entry_time.timestamp(), range_start)
+        exit_ts = (
+            range_end if exit_time is None else min(exit_time.timestamp(), range_end)
+        )
+        if entry_ts <= exit_ts:
+            events.append((entry_ts, 1))
+            events.append((exit_ts, -1))
+    # at equal times exits sort before entries, so a berth handed over
+    # from one ship to the next is not counted twice
+    events.sort()
+
+    timeline = []
+    occupancy = 0
+    i = 0
+    step = bucket.total_seconds()
+    bucket_start = range_start
+    while bucket_start < range_end:
+        bucket_end = min(bucket_start + step, range_end)
+        # ships leaving exactly at the bucket start are not in the bucket
+        while i < len(events) and events[i][0] <= bucket_start:
+            occupancy += events[i][1]
+            i += 1
+        peak = occupancy
+        area = 0.0
+        at = bucket_start
+        while i < len(events) and events[i][0] < bucket_end:
+            event_time, delta = events[i]
+            area += occupancy * (event_time - at)
+            at = event_time
+            occupancy += delta
+            peak = max(peak, occupancy)
+            i += 1
+        area += occupancy * (bucket_end - at)
+        timeline.append(
+            {
+                "start": datetime.fromtimestamp(bucket_start, tz=start.tzinfo),
+                "end": datetime.fromtimestamp(bucket_end, tz=start.tzinfo),
+                "peak": peak,
+                "average": round(area / (bucket_end - bucket_start), 3),
+            }
+        )
+        bucket_start = bucket_end
+    return timeline
+
+
+def bucket_start(time: datetime, bucket: timedelta) -> datetime:
+    """
+    Truncates a time to the start of its bucket on the local clock: the
+    quarter hour, the hour, midnight, or Monday midnight for weeks.
+
+    Args:
+        time (datetime): an aware datetime
+        bucket (timedelta): one of the occupancy bucket lengths
+
+    Returns:
+        datetime: the start of the bucket, in the current time zone
+    """
+    local = timezone.localtime(time)
+    midnight = local.replace(hour=0, minute=0, second=0, microsecond=0)
+    if bucket >= timedelta(weeks=1):
+        return midnight - timedelta(days=midnight.weekday())
+    if bucket >= timedelta(days=1):
+        return midnight
+    # same tzinfo, so this is the wall clock time since midnight
+    return midnight + (local - midnight) // bucket * bucket
+
+
+def harbour_stays(harbour_id: int, start: datetime, end: datetime) -> list:
+    """
+    Fetches the (entry, exit) times of the Visits to a Harbour that overlap
+    a time range, open Visits included. Archived Visits are only read when
+    the range reaches back past the archive cutoff.
+
+    Returns:
+        list[tuple[datetime, datetime]]
+    """
+    models = [Visit, ArchivedVisit] if start < archive_cutoff() else [Visit]
+    stays = []
+    for model in models:
+        stays.extend(
+            model.objects.filter(
+                Q(exit_time__gt=start) | Q(exit_time__isnull=True),
+                harbour_id=harbour_id,
+                entry_time__lt=end,
+            ).values_list("entry_time", "exit_time")
+        )
+    return stays
+
+
+# port calls are ordered by entry time, ties broken by id
+PORT_CALL_ORDER = ("entry_time", "id")
+
+
+def port_calls(model, ship_id: int, start: datetime | None, end: datetime | None):
+    """
+    Builds the query returning the port calls of a Ship between start and
+    end, each annotated by window functions with the previous and next call:
+    previous_harbour_id, previous_harbour_name, previous_exit_time,
+    next_harbour_id, next_harbour_name and next_entry_time.
+
+    The range is widened to the last call before start and the first call
+    after end, so the calls at its edges get their neighbours; callers drop
+    the widening calls with in_range().
+
+    Args:
+        model (Visit | ArchivedVisit)
+
+    Returns:
+        QuerySet[Visit | ArchivedVisit]
+    """
+    ship_calls = model.objects.filter(ship_id=ship_id, entry_time__isnull=False)
+    calls = ship_calls
+    if start is not None:
+        before = ship_calls.filter(entry_time__lt=start).order_by("-entry_time")
+        calls = calls.filter(
+            entry_time__gte=Coalesce(
+                Subquery(before.values("entry_time")[:1]),
+                Value(start, output_field=DateTimeField()),
+            )
+        )
+    if end is not None:
+        after = ship_calls.filter(entry_time__gt=end).order_by("entry_time")
+        calls = calls.filter(
+            entry_time__lte=Coalesce(
+                Subquery(after.values("entry_time")[:1]),
+                Value(end, output_field=DateTimeField()),
+            )
+        )
+
+    def window(function):
+        return Window(function, order_by=[F(field).asc() for field in PORT_CALL_ORDER])
+
+    return (
+        calls.annotate(
+            previous_harbour_id=window(Lag("harbour_id")),
+            previous_harbour_name=window(Lag("harbour__name")),
+            previous_exit_time=window(Lag("exit_time")),
+            next_harbour_id=window(Lead("harbour_id")),
+            next_harbour_name=window(Lead("harbour__name")),
+            next_entry_time=window(Lead("entry_time")),
+        )
+        .select_related("harbour")
+        .order_by(*PORT_CALL_ORDER)
+    )
+
+
+def link_port_calls(calls: list) -> list:
+    """
+    Sets the previous/next annotations of port calls from their neighbours
+    in the list. Only needed when calls from VISIT and VISIT_ARCHIVE are
+    merged, the window functions cover a single table.
+    """
+    for previous, call in pairwise(calls):
+        call.previous_harbour_id = previous.harbour_id
+        call.previous_harbour_name = previous.harbour.name
+        call.previous_exit_time = previous.exit_time
+        previous.next_harbour_id = call.harbour_id
+        previous.next_harbour_name = call.harbour.name
+        previous.next_entry_time = call.entry_time
+    return calls
+
+
+def ship_itinerary(
+    ship_id: int, start: datetime | None = None, end: datetime | None = None
+) -> list:
+    """
+    Lists the port calls of a Ship that entered between start and end,
+    hot and archived, annotated as described in port_calls().
+
+    Returns:
+        list[Visit | ArchivedVisit]: in (entry_time, id) order
+    """
+
+    def in_range(calls):
+        return [
+            call
+            for call in calls
+            if (start is None or call.entry_time >= start)
+            and (end is None or call.entry_time <= end)
+        ]
+
+    calls = list(port_calls(Visit, ship_id, start, end))
+    first = next(iter(in_range(calls)), None)
+    # the previous call of the first one may have been archived
+    if archive_needed(start) or first is None or first.previous_harbour_id is None:
+        archived = list(port_calls(ArchivedVisit, ship_id, start, end))
+        if archived:
+            key = attrgetter(*PORT_CALL_ORDER)
+            calls = link_port_calls(list(merge(calls, archived, key=key)))
+    return in_range(calls)
+
+
+def od_matrix(start: datetime, end: datetime, ship_type: str | None = None) -> list:
+    """
+    Computes the origin-destination matrix of the fleet: for every pair of
+    Harbours, how many passages went from one to the other and their median
+    duration (from the exit of the origin to the entry at the destination).
+
+    A passage is counted in the period in which it arrives. Consecutive calls
+    of a Ship more than VTSO_OD_MAX_PASSAGE_DAYS apart are not a passage,
+    which also bounds how far before start the Visits are read.
+
+    The Visits are streamed once, ordered by Ship and entry time, and the
+    pairs are aggregated on the fly; archived Visits are merged into the
+    stream when the range reaches back past the archive cutoff.
+
+    Args:
+        start (datetime): passages arriving at or after this time
+        end (datetime): passages arriving before this time
+        ship_type (str | None): only count Ships of this Ship.ShipType
+
+    Returns:
+        list[dict]: {"from_harbour", "from_harbour_name", "to_harbour",
+        "to_harbour_name", "count", "median_passage"} per pair,
+        most travelled first
+    """
+    max_passage = timedelta(days=getattr(settings, "VTSO_OD_MAX_PASSAGE_DAYS", 90))
+    read_from = start - max_passage
+    models = [Visit, ArchivedVisit] if read_from < archive_cutoff() else [Visit]
+    order = ("ship_id", "entry_time", "id")
+
+    streams = []
+    for model in models:
+        visits = model.objects.filter(
+            entry_time__gte=read_from, entry_time__lt=end
+        ).order_by(*order)
+        if ship_type is not None:
+            visits = visits.filter(ship__type=ship_type)
+        streams.append(
+            visits.values_list(*order, "harbour_id", "exit_time").iterator(
+                chunk_size=10_000
+            )
+        )
+
+    counts: dict[tuple, int] = defaultdict(int)
+    passages: dict[tuple, list] = defaultdict(list)
+    for previous, visit in pairwise(merge(*streams, key=lambda row: row[:3])):
+        ship_id, entry_time, _, harbour_id, _ = visit
+        previous_ship_id, _, _, previous_harbour_id, previous_exit = previous
+        if ship_id != previous_ship_id or entry_time < start:
+            continue
+        if previous_exit is not None:
+            passage = entry_time - previous_exit
+            if passage > max_passage:
+                continue
+            if passage >= timedelta(0):
+                passages[previous_harbour_id, harbour_id].append(passage)
+        counts[previous_harbour_id, harbour_id] += 1
+
+    names = Harbour.objects.in_bulk(
+        {harbour_id for pair in counts for harbour_id in pair}
+    )
+    matrix = [
+        {
+            "from_harbour": origin,
+            "from_harbour_name": names[origin].name if origin in names else None,
+            "to_harbour": destination,
+            "to_harbour_name": (
+                names[destination].name if destination in names else None
+            ),
+            "count": count,
+            "median_passage": (
+                median(passages[origin, destination])
+                if passages[origin, destination]
+                else None
+            ),
+        }
+        for (origin, destination), count in counts.items()
+    ]
+    matrix.sort(
+        key=lambda pair: (-pair["count"], pair["from_harbour"], pair["to_harbour"])
+    )
+    return matrix
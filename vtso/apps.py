@@ -1,6 +1,63 @@
 from django.apps import AppConfig
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 
 
 class VtsoConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "vtso"
+
+    def ready(self):
+        from vtso.models import ChangeLog, ChangeLoggedModel, Visit
+
+        # deletes are recorded from the signal so that cascaded deletes,
+        # which never call Model.delete(), are recorded too
+        for model in self.get_models():
+            if issubclass(model, ChangeLoggedModel):
+                post_delete.connect(
+                    ChangeLog.record_delete,
+                    sender=model,
+                    dispatch_uid=f"vtso_change_log_{model._meta.model_name}",
+                )
+        pre_delete.connect(
+            Visit.collect_ship_location,
+            sender=Visit,
+            dispatch_uid="vtso_ship_location_collect",
+        )
+        post_delete.connect(
+            Visit.sync_ship_location,
+            sender=Visit,
+            dispatch_uid="vtso_ship_location",
+        )
+
+        self.connect_permission_cache()
+
+    @staticmethod
+    def connect_permission_cache():
+        """
+        Invalidates the permissions cached by vtso.backends.CachedModelBackend
+        when users, groups or permissions change.
+        """
+        from django.contrib.auth import get_user_model
+        from django.contrib.auth.models import Group, Permission
+
+        from vtso import backends
+
+        user_model = get_user_model()
+        for through in (user_model.groups.through, user_model.user_permissions.through):
+            m2m_changed.connect(
+                backends.user_relations_changed,
+                sender=through,
+                dispatch_uid=f"vtso_perms_{through._meta.model_name}",
+            )
+        m2m_changed.connect(
+            backends.group_permissions_changed,
+            sender=Group.permissions.through,
+            dispatch_uid="vtso_perms_group_permissions",
+        )
+        for model in (Group, Permission):
+            for signal in (post_save, post_delete):
+                signal.connect(
+                    backends.permissions_rows_changed,
+                    sender=model,
+                    dispatch_uid=f"vtso_perms_{model._meta.model_name}",
+                )
@@ -0,0 +1,170 @@
+"""
+Archival of closed Visit history.
+
+Visits whose exit_time is older than VTSO_VISIT_ARCHIVE_HORIZON_DAYS are
+moved from VISIT to VISIT_ARCHIVE in small batches, so the hot table and
+its indexes only hold recent traffic. Readers that may need older Visits
+use ship_visit_querysets() (ShipVisits) or with_archive() (VisitList) to
+query both tables.
+"""
+
+from datetime import datetime, timedelta
+from heapq import merge
+from operator import attrgetter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+
+from vtso import changes, clock
+from vtso.models import ArchivedVisit, Visit
+
+ARCHIVED_FIELDS = [
+    "id",
+    "ship_id",
+    "harbour_id",
+    "entry_time",
+    "exit_time",
+    "version",
+    "closed_at",
+]
+
+
+def archive_cutoff() -> datetime:
+    """
+    Returns:
+        datetime: Visits that exited before this time belong to the archive
+    """
+    horizon = getattr(settings, "VTSO_VISIT_ARCHIVE_HORIZON_DAYS", 365)
+    return clock.now() - timedelta(days=horizon)
+
+
+def archive_batch(before: datetime, batch_size: int) -> int:
+    """
+    Moves up to batch_size Visits that exited before a given time to the
+    archive, in one transaction. Running it again after a failure is safe.
+
+    Returns:
+        int: number of Visits archived
+    """
+    with transaction.atomic():
+        rows = list(
+            Visit.objects.filter(exit_time__lt=before)
+            .order_by("id")
+            .values(*ARCHIVED_FIELDS)[:batch_size]
+        )
+        if not rows:
+            return 0
+        ArchivedVisit.objects.bulk_create(
+            [ArchivedVisit(**row) for row in rows], ignore_conflicts=True
+        )
+        # the Visits are still served from the archive, so mirrors
+        # following the change log must not see them as deleted
+        with changes.suppressed():
+            Visit.objects.filter(id__in=[row["id"] for row in rows]).delete()
+    return len(rows)
+
+
+def archive_needed(entry_time_after: datetime | None) -> bool:
+    """
+    Tells whether a Visit query starting at entry_time_after can match
+    archived rows. Reads the newest archived entry_time from its index.
+    """
+    if entry_time_after is None:
+        return True
+    newest = ArchivedVisit.objects.aggregate(newest=Max("entry_time"))["newest"]
+    return newest is not None and newest >= entry_time_after
+
+
+async def aarchive_needed(entry_time_after: datetime | None) -> bool:
+    """
+    Async counterpart of archive_needed().
+    """
+    if entry_time_after is None:
+        return True
+    newest = (await ArchivedVisit.objects.aaggregate(newest=Max("entry_time")))[
+        "newest"
+    ]
+    return newest is not None and newest >= entry_time_after
+
+
+def visit_filters_need_archive(filters: dict) -> bool:
+    """
+    Tells whether the cleaned data of a VisitFilter can match archived
+    Visits: archived Visits are closed and entered before the newest
+    archived entry_time.
+    """
+    if filters.get("open"):
+        return False
+    entry_time = filters.get("entry_time")
+    return archive_needed(entry_time.start if entry_time else None)
+
+
+async def avisit_filters_need_archive(filters: dict) -> bool:
+    """
+    Async counterpart of visit_filters_need_archive().
+    """
+    if filters.get("open"):
+        return False
+    entry_time = filters.get("entry_time")
+    return await aarchive_needed(entry_time.start if entry_time else None)
+
+
+def with_archive(visits, archived, ordering: list[str] | None = None):
+    """
+    Builds the UNION ALL of filtered hot and archived Visits, sorted in SQL.
+
+    Args:
+        visits (QuerySet[Visit])
+        archived (QuerySet[ArchivedVisit]): filtered like visits
+        ordering (list[str] | None): field names, "-" for descending;
+            defaults to id
+
+    Returns:
+        QuerySet[dict]: the ARCHIVED_FIELDS of each Visit, see as_visits()
+    """
+    return (
+        visits.order_by()
+        .values(*ARCHIVED_FIELDS)
+        .union(archived.order_by().values(*ARCHIVED_FIELDS), all=True)
+        .order_by(*(ordering or ["id"]))
+    )
+
+
+def as_visits(rows) -> list:
+    """
+    Turns the rows of with_archive() into unsaved Visits for serializers.
+    """
+    return [Visit(**row) for row in rows]
+
+
+def ship_visit_querysets(
+    ship_id: int,
+    entry_time_after: datetime | None = None,
+    entry_time_before: datetime | None = None,
+    include_archive: bool = True,
+) -> list:
+    """
+    Builds the querysets returning the Visits of a Ship, in id order.
+
+    Returns:
+        list[QuerySet]: the hot Visits, followed by the archived ones
+        when include_archive is True
+    """
+    models = [Visit, ArchivedVisit] if include_archive else [Visit]
+    querysets = []
+    for model in models:
+        queryset = model.objects.filter(ship_id=ship_id)
+        if entry_time_after is not None:
+            queryset = queryset.filter(entry_time__gte=entry_time_after)
+        if entry_time_before is not None:
+            queryset = queryset.filter(entry_time__lte=entry_time_before)
+        querysets.append(queryset.select_related("harbour").order_by("id"))
+    return querysets
+
+
+def merge_by_id(*results) -> list:
+    """
+    Merges lists of Visits and ArchivedVisits already sorted by id.
+    """
+    return list(merge(*results, key=attrgetter("id")))
@@ -0,0 +1,278 @@
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse
+from django.views import View
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from vtso import clock
+from vtso.archive import (
+    aarchive_needed,
+    as_visits,
+    avisit_filters_need_archive,
+    merge_by_id,
+    ship_visit_querysets,
+    with_archive,
+)
+from vtso.authentication import (
+    AsyncBasicAuthentication,
+    AsyncExpiringTokenAuthentication,
+    AsyncSessionAuthentication,
+    AsyncTokenAuthentication,
+)
+from vtso.models import Harbour, Ship, Visit
+from vtso.serializers import (
+    HarbourDetailsSerializer,
+    HarbourListSerializer,
+    ShipSerializer,
+    ShipVisitSerializer,
+    VisitSerializer,
+)
+from vtso.throttling import ClientRateThrottle
+from vtso.views import (
+    HarbourDetails,
+    HarbourList,
+    ShipDetail,
+    ShipList,
+    ShipVisits,
+    VisitList,
+    parse_datetime_param,
+    parse_ids,
+    version_etag,
+)
+
+
+class AsyncAPIView(View):
+    """
+    Minimal async counterpart of DRF's APIView for read-only endpoints.
+
+    Requests are authenticated with the async ORM and only authenticated
+    users are allowed through, matching the IsAuthenticated permission of
+    the sync views. They are throttled like the sync views, with the
+    throttle_scope of their sync counterpart. Responses are rendered with
+    DRF's JSONRenderer so they are byte-for-byte identical to the JSON of
+    the sync views.
+    """
+
+    authentication_classes = [
+        AsyncBasicAuthentication,
+        AsyncSessionAuthentication,
+        AsyncTokenAuthentication,
+        AsyncExpiringTokenAuthentication,
+    ]
+    throttle_classes = [ClientRateThrottle]
+    http_method_names = ["get", "head", "options"]
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            await self.authenticate(request)
+            self.check_throttles(request)
+            return await super().dispatch(request, *args, **kwargs)
+        except (exceptions.APIException, Http404) as exc:
+            return self.handle_exception(request, exc)
+
+    async def authenticate(self, request):
+        """
+        Tries each authentication class in turn, like DRF does.
+
+        Raises:
+            NotAuthenticated: no authentication class accepted the request.
+        """
+        for authentication_class in self.authentication_classes:
+            user_auth = await authentication_class().aauthenticate(request)
+            if user_auth is not None:
+                request.user, request.auth = user_auth
+                return
+        raise exceptions.NotAuthenticated()
+
+    def check_throttles(self, request):
+        """
+        Raises:
+            Throttled: a throttle class refused the request.
+        """
+        for throttle_class in self.throttle_classes:
+            throttle = throttle_class()
+            if not throttle.allow_request(request, self):
+                raise exceptions.Throttled(throttle.wait())
+
+    def handle_exception(self, request, exc):
+        """
+        Async counterpart of rest_framework.views.exception_handler().
+        """
+        if isinstance(exc, Http404):
+            exc = exceptions.NotFound(*exc.args)
+        if isinstance(exc.detail, (list, dict)):
+            data = exc.detail
+        else:
+            data = {"detail": exc.detail}
+        response = self.render(data, status=exc.status_code)
+        if isinstance(
+            exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)
+        ):
+            # the first authentication class decides the challenge, as in DRF
+            authenticator = self.authentication_classes[0]()
+            response.headers["WWW-Authenticate"] = authenticator.authenticate_header(
+                request
+            )
+        if getattr(exc, "wait", None):
+            response.headers["Retry-After"] = str(int(exc.wait))
+        return response
+
+    async def filter_queryset(self, request, queryset):
+        """
+        Applies the filter backends of the view in a thread: filters on a
+        related model (e.g. ?ship=) validate the given id with a query.
+        """
+
+        def apply_backends():
+            drf_request = Request(request)
+            filtered = queryset
+            for backend in getattr(self, "filter_backends", []):
+                filtered = backend().filter_queryset(drf_request, filtered, self)
+            return filtered
+
+        return await sync_to_async(apply_backends)()
+
+    @staticmethod
+    def render(data, status=200):
+        return HttpResponse(
+            JSONRenderer().render(data),
+            status=status,
+            content_type="application/json",
+        )
+
+
+class AsyncMultiGetMixin:
+    """
+    Async counterpart of MultiGetMixin: ?ids=1,2,3 fetches the objects with a
+    single IN query and answers {"results": [...], "missing": [...]}.
+    """
+
+    async def render_batch(self, queryset, ids, serializer_class):
+        objects = await queryset.ain_bulk(ids)
+        serializer = serializer_class(
+            [objects[pk] for pk in ids if pk in objects], many=True
+        )
+        return self.render(
+            {
+                "results": serializer.data,
+                "missing": [pk for pk in ids if pk not in objects],
+            }
+        )
+
+
+class AsyncShipList(AsyncMultiGetMixin, AsyncAPIView):
+    """
+    Async, read-only version of ShipList.
+    """
+
+    throttle_scope = ShipList.throttle_scope
+    filter_backends = ShipList.filter_backends
+    filterset_class = ShipList.filterset_class
+    search_fields = ShipList.search_fields
+
+    async def get(self, request):
+        ids = parse_ids(request.GET)
+        if ids is not None:
+            return await self.render_batch(ShipList.queryset.all(), ids, ShipSerializer)
+        queryset = await self.filter_queryset(request, ShipList.queryset.all())
+        ships = [ship async for ship in queryset]
+        return self.render(ShipSerializer(ships, many=True).data)
+
+
+class AsyncShipDetail(AsyncAPIView):
+    """
+    Async, read-only version of ShipDetail.
+    """
+
+    async def get(self, request, pk):
+        try:
+            ship = await ShipDetail.queryset.aget(pk=pk)
+        except Ship.DoesNotExist as e:
+            raise Http404("No Ship matches the given query.") from e
+        response = self.render(ShipSerializer(ship).data)
+        response["ETag"] = version_etag(ship.version)
+        return response
+
+
+class AsyncShipVisits(AsyncAPIView):
+    """
+    Async version of ShipVisits.
+    """
+
+    throttle_scope = ShipVisits.throttle_scope
+
+    async def get(self, request, pk):
+        if not await Ship.objects.filter(pk=pk).aexists():
+            raise exceptions.NotFound("Ship not found")
+        entry_time_after = parse_datetime_param(request.GET, "entry_time_after")
+        querysets = ship_visit_querysets(
+            pk,
+            entry_time_after=entry_time_after,
+            entry_time_before=parse_datetime_param(request.GET, "entry_time_before"),
+            include_archive=await aarchive_needed(entry_time_after),
+        )
+        results = [[visit async for visit in queryset] for queryset in querysets]
+        visits = merge_by_id(*results)
+        return self.render(ShipVisitSerializer(visits, many=True).data)
+
+
+class AsyncHarbourList(AsyncMultiGetMixin, AsyncAPIView):
+    """
+    Async, read-only version of HarbourList.
+    """
+
+    throttle_scope = HarbourList.throttle_scope
+
+    async def get(self, request):
+        ids = parse_ids(request.GET)
+        if ids is not None:
+            return await self.render_batch(
+                HarbourList.queryset.all(), ids, HarbourListSerializer
+            )
+        harbours = [harbour async for harbour in HarbourList.queryset.all()]
+        return self.render(HarbourListSerializer(harbours, many=True).data)
+
+
+class AsyncHarbourDetails(AsyncAPIView):
+    """
+    Async version of HarbourDetails.
+    The docked Ships are fetched up front and handed to the serializer.
+    """
+
+    async def get(self, request, pk):
+        as_of = parse_datetime_param(request.GET, "as_of")
+        with clock.frozen(as_of or clock.now()):
+            try:
+                harbour = await HarbourDetails.queryset.aget(pk=pk)
+            except Harbour.DoesNotExist as e:
+                raise Http404("No Harbour matches the given query.") from e
+            visits = (
+                Visit.objects.filter(harbour=harbour).select_related("ship").current()
+            )
+            ships = [visit.ship async for visit in visits]
+            serializer = HarbourDetailsSerializer(
+                harbour, context={"current_ships": {harbour.id: ships}}
+            )
+            return self.render(serializer.data)
+
+
+class AsyncVisitList(AsyncAPIView):
+    """
+    Async, read-only version of VisitList.
+    """
+
+    throttle_scope = VisitList.throttle_scope
+    filter_backends = VisitList.filter_backends
+    filterset_class = VisitList.filterset_class
+
+    async def get(self, request):
+        queryset = await self.filter_queryset(request, VisitList.queryset.all())
+        archived = await sync_to_async(VisitList.archive_filterset)(request.GET)
+        filters = archived.form.cleaned_data
+        if await avisit_filters_need_archive(filters):
+            rows = with_archive(queryset, archived.qs, filters.get("ordering"))
+            visits = as_visits([row async for row in rows])
+        else:
+            visits = [visit async for visit in queryset]
+        return self.render(VisitSerializer(visits, many=True).data)
@@ -0,0 +1,144 @@
+from django.contrib.auth import aauthenticate, get_user_model
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import (
+    BasicAuthentication,
+    SessionAuthentication,
+    TokenAuthentication,
+)
+
+from vtso.models import AccessToken
+
+
+def verify_access_token(access_token, key: str):
+    """
+    Checks a token found by its prefix against the token sent by the client.
+
+    Raises:
+        AuthenticationFailed: the token is unknown, expired or its user inactive.
+
+    Returns:
+        tuple[User, AccessToken]
+    """
+    if access_token is None or not access_token.matches(key):
+        raise exceptions.AuthenticationFailed(_("Invalid token."))
+    if access_token.is_expired:
+        raise exceptions.AuthenticationFailed(_("Token has expired."))
+    if not access_token.user.is_active:
+        raise exceptions.AuthenticationFailed(_("User inactive or deleted."))
+    return access_token.user, access_token
+
+
+class ExpiringTokenAuthentication(TokenAuthentication):
+    """
+    Authenticates "Authorization: Bearer <token>" headers against the hashed,
+    expiring AccessTokens. The token is found by its prefix with one indexed
+    query, without hashing any password.
+    """
+
+    keyword = "Bearer"
+    model = AccessToken
+
+    def authenticate_credentials(self, key):
+        access_token = (
+            AccessToken.objects.select_related("user")
+            .filter(prefix=key[: AccessToken.PREFIX_LENGTH])
+            .first()
+        )
+        return verify_access_token(access_token, key)
+
+
+# The async authentication classes below reuse DRF's header parsing, but their
+# sync authenticate_credentials() only returns the parsed credentials: the
+# database lookup happens in aauthenticate() with the async ORM, so they must
+# only be used by the views in vtso/async_views.py.
+
+
+class AsyncBasicAuthentication(BasicAuthentication):
+    def authenticate_credentials(self, userid, password, request=None):
+        return userid, password
+
+    async def aauthenticate(self, request):
+        """
+        Async counterpart of BasicAuthentication.authenticate().
+
+        Returns:
+            tuple[User, None] | None
+        """
+        credentials = self.authenticate(request)
+        if credentials is None:
+            return None
+
+        userid, password = credentials
+        user = await aauthenticate(
+            request=request,
+            **{get_user_model().USERNAME_FIELD: userid, "password": password},
+        )
+        if user is None:
+            raise exceptions.AuthenticationFailed(_("Invalid username/password."))
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_("User inactive or deleted."))
+        return user, None
+
+
+class AsyncSessionAuthentication(SessionAuthentication):
+    async def aauthenticate(self, request):
+        """
+        Async counterpart of SessionAuthentication.authenticate().
+        The async views are read-only, so CSRF is not enforced.
+
+        Returns:
+            tuple[User, None] | None
+        """
+        user = await request.auser()
+        if not user or not user.is_active:
+            return None
+        return user, None
+
+
+class AsyncTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        return key
+
+    async def aauthenticate(self, request):
+        """
+        Async counterpart of TokenAuthentication.authenticate().
+
+        Returns:
+            tuple[User, Token] | None
+        """
+        key = self.authenticate(request)
+        if key is None:
+            return None
+
+        model = self.get_model()
+        try:
+            token = await model.objects.select_related("user").aget(key=key)
+        except model.DoesNotExist as e:
+            raise exceptions.AuthenticationFailed(_("Invalid token.")) from e
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_("User inactive or deleted."))
+        return token.user, token
+
+
+class AsyncExpiringTokenAuthentication(ExpiringTokenAuthentication):
+    def authenticate_credentials(self, key):
+        return key
+
+    async def aauthenticate(self, request):
+        """
+        Async counterpart of ExpiringTokenAuthentication.authenticate().
+
+        Returns:
+            tuple[User, AccessToken] | None
+        """
+        key = self.authenticate(request)
+        if key is None:
+            return None
+
+        access_token = (
+            await AccessToken.objects.select_related("user")
+            .filter(prefix=key[: AccessToken.PREFIX_LENGTH])
+            .afirst()
+        )
+        return verify_access_token(access_token, key)
@@ -0,0 +1,145 @@
+"""
+Authentication backend caching the permissions of each user.
+
+Django's ModelBackend loads the permissions of a user with two queries (its
+own and its groups') the first time a request checks one, and forgets them
+with the request. CachedModelBackend keeps them in the cache named by
+VTSO_PERMISSION_CACHE, so permission checks of DjangoModelPermissions and
+the admin cost cache reads instead.
+
+Entries are never updated in place: their key embeds version counters that
+are bumped when permissions change (see invalidate_user() and
+invalidate_all(), connected to the auth signals in VtsoConfig.ready()). A
+bump makes the older entries unreachable and they expire after
+VTSO_PERMISSION_CACHE_SECONDS. With the default per-process cache, changes
+are only seen by the process that made them: use a cache shared by all the
+workers (e.g. Redis or Memcached) in production.
+"""
+
+import time
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+from django.db import transaction
+
+GLOBAL_VERSION_KEY = "vtso:perms:version"
+
+
+def permission_cache():
+    return caches[getattr(settings, "VTSO_PERMISSION_CACHE", "default")]
+
+
+def user_version_key(user_id) -> str:
+    return f"vtso:perms:version:{user_id}"
+
+
+def read_versions(*keys) -> list[int]:
+    """
+    Reads version counters, starting the missing ones. A counter starts at
+    the current time rather than 0, so one that was evicted from the cache
+    cannot take a value it had before and reach an outdated entry.
+    """
+    cache = permission_cache()
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump(key: str):
+    cache = permission_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def invalidate_user(user_id):
+    """
+    Drops the cached permissions of a user once the current transaction
+    commits, so they are not read again from the uncommitted state.
+    """
+    transaction.on_commit(lambda: bump(user_version_key(user_id)))
+
+
+def invalidate_all():
+    """
+    Drops the cached permissions of every user once the current transaction
+    commits. Used for changes to groups and permissions, which can affect
+    any number of users.
+    """
+    transaction.on_commit(lambda: bump(GLOBAL_VERSION_KEY))
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend whose get_all_permissions() is served from the cache.
+    """
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if not hasattr(user_obj, "_perm_cache"):
+            user_obj._perm_cache = self.cached_permissions(user_obj)
+        return user_obj._perm_cache
+
+    def cached_permissions(self, user_obj) -> set[str]:
+        """
+        Returns:
+            set[str]: "app_label.codename" of every permission of user_obj
+        """
+        global_version, user_version = read_versions(
+            GLOBAL_VERSION_KEY, user_version_key(user_obj.pk)
+        )
+        # superusers have every permission, so the flag is part of the key
+        key = (
+            f"vtso:perms:{user_obj.pk}:{global_version}:{user_version}:"
+            f"{int(user_obj.is_superuser)}"
+        )
+        cache = permission_cache()
+        perms = cache.get(key)
+        if perms is None:
+            perms = super().get_all_permissions(user_obj)
+            cache.set(
+                key,
+                perms,
+                timeout=getattr(settings, "VTSO_PERMISSION_CACHE_SECONDS", 3600),
+            )
+        return perms
+
+
+def user_relations_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    m2m_changed receiver of User.groups and User.user_permissions. From
+    the user side the instance is the user, from the other side pk_set
+    holds the users, or is None when the relation was cleared.
+    """
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        invalidate_user(instance.pk)
+    elif pk_set:
+        for user_id in pk_set:
+            invalidate_user(user_id)
+    else:
+        invalidate_all()
+
+
+def group_permissions_changed(sender, action, **kwargs):
+    """
+    m2m_changed receiver of Group.permissions.
+    """
+    if action in ("post_add", "post_remove", "post_clear"):
+        invalidate_all()
+
+
+def permissions_rows_changed(sender, **kwargs):
+    """
+    post_save and post_delete receiver of Group and Permission. Deleting
+    either drops its relations without m2m_changed signals, and a new
+    Permission is granted to every superuser.
+    """
+    invalidate_all()
@@ -0,0 +1,43 @@
+"""
+Helpers for the append-only change log behind GET /vtso/changes/.
+
+Every save or delete of a Company, Person, Harbour, Ship or Visit writes a
+ChangeLog row in the same transaction (see ChangeLoggedModel in
+vtso/models.py), so mirrors can replay the changes in seq order instead of
+downloading whole lists. Bulk writers that skip save() record their rows
+with ChangeLog.record_many().
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_suppressed: ContextVar[bool] = ContextVar("vtso_changes_suppressed", default=False)
+
+
+def enabled() -> bool:
+    return not _suppressed.get()
+
+
+@contextmanager
+def suppressed():
+    """
+    Stops recording changes for the duration of the block. Used for
+    storage moves that do not change what the API serves, such as
+    archiving Visits.
+    """
+    token = _suppressed.set(True)
+    try:
+        yield
+    finally:
+        _suppressed.reset(token)
+
+
+def snapshot(instance) -> dict:
+    """
+    Returns:
+        dict: {column name: value} of every concrete field of instance
+    """
+    return {
+        field.attname: field.value_from_object(instance)
+        for field in instance._meta.concrete_fields
+    }
@@ -0,0 +1,43 @@
+"""
+Request-scoped clock shared by models, serializers and filters.
+
+RequestClockMiddleware freezes the clock when a request starts, so every
+Ship age and every "currently docked" check in a response is computed
+against one snapshot time, without looking up the timezone once per row.
+Outside a request, or in tests, frozen() pins the clock explicitly.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+from django.utils.timezone import get_current_timezone
+
+_frozen_now: ContextVar[datetime | None] = ContextVar("vtso_frozen_now", default=None)
+
+
+def now() -> datetime:
+    """
+    Returns:
+        datetime: the frozen time if the clock is frozen, otherwise the
+        current time in the current timezone
+    """
+    frozen_now = _frozen_now.get()
+    if frozen_now is None:
+        return datetime.now(tz=get_current_timezone())
+    return frozen_now
+
+
+@contextmanager
+def frozen(at: datetime | None = None):
+    """
+    Pins now() to a single value for the duration of the block.
+
+    Args:
+        at (datetime | None): the time to pin, defaults to the current time
+    """
+    token = _frozen_now.set(at or datetime.now(tz=get_current_timezone()))
+    try:
+        yield _frozen_now.get()
+    finally:
+        _frozen_now.reset(token)
@@ -0,0 +1,81 @@
+import django_filters
+
+from vtso import clock
+from vtso.models import Ship, Visit
+
+
+class ShipOrderingFilter(django_filters.OrderingFilter):
+    """
+    Ordering filter that sorts by age through the indexed year_built_int
+    column. A larger age is an earlier year, so the direction is inverted.
+    """
+
+    def get_ordering_value(self, param):
+        value = super().get_ordering_value(param)
+        if param.lstrip("-") == "age":
+            value = value[1:] if value.startswith("-") else f"-{value}"
+        return value
+
+
+class ShipFilter(django_filters.FilterSet):
+    """
+    Filters for /vtso/ships/.
+
+    age_min and age_max are translated into a year_built_int range
+    so they can use the index instead of computing each Ship's age.
+    current_harbour reads the location column maintained by Visit writes.
+    """
+
+    year_built = django_filters.NumberFilter(field_name="year_built_int")
+    current_harbour = django_filters.NumberFilter(
+        field_name="current_harbour",
+        label="Only list the Ships currently in this Harbour.",
+    )
+    age_min = django_filters.NumberFilter(method="filter_age_min")
+    age_max = django_filters.NumberFilter(method="filter_age_max")
+    ordering = ShipOrderingFilter(
+        fields=(
+            ("year_built_int", "age"),
+            ("name", "name"),
+            ("tonnage", "tonnage"),
+        )
+    )
+
+    class Meta:
+        model = Ship
+        fields = ["type"]
+
+    @staticmethod
+    def current_year() -> int:
+        return clock.now().year
+
+    def filter_age_min(self, queryset, name, value):
+        return queryset.filter(year_built_int__lte=self.current_year() - int(value))
+
+    def filter_age_max(self, queryset, name, value):
+        return queryset.filter(year_built_int__gte=self.current_year() - int(value))
+
+
+class VisitFilter(django_filters.FilterSet):
+    """
+    Filters for /vtso/visits/.
+
+    entry_time and exit_time accept ISO 8601 ranges through
+    ?entry_time_after=, ?entry_time_before=, ?exit_time_after= and
+    ?exit_time_before= (both bounds inclusive), and ?open=true lists the
+    Visits of Ships still in port. The common combinations are served by
+    the indexes declared on Visit.Meta.
+    """
+
+    entry_time = django_filters.IsoDateTimeFromToRangeFilter()
+    exit_time = django_filters.IsoDateTimeFromToRangeFilter()
+    open = django_filters.BooleanFilter(
+        field_name="exit_time",
+        lookup_expr="isnull",
+        label="Only list the open (true) or closed (false) Visits.",
+    )
+    ordering = django_filters.OrderingFilter(fields=("entry_time", "exit_time", "id"))
+
+    class Meta:
+        model = Visit
+        fields = ["harbour", "ship", "entry_time", "exit_time"]
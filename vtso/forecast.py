@@ -0,0 +1,230 @@
+"""
+Berth availability forecasts.
+
+learn_dwell_times() folds the Visits closed since the last run into one
+DwellHistogram per Harbour and Ship type, so each run only reads the new
+Visits (`manage.py learn_dwell_times`, e.g. every hour). "Since" is measured
+on Visit.closed_at, the time the closure was written (or the exit_time if
+later), so Visits closed with a past exit_time or imported late are learned
+too. forecast_berths() combines those histograms with the Ships currently
+docked: a Ship with a known exit_time leaves at that time, the others stay
+with the probability that a Ship of their type at that Harbour stays that
+long. Its cost depends on the number of docked Ships and forecast hours,
+not on the history.
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+from itertools import accumulate, chain
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from vtso import clock
+from vtso.models import ArchivedVisit, DwellHistogram, DwellWatermark, Visit
+
+HOUR = timedelta(hours=1)
+
+
+def max_hours() -> int:
+    return getattr(settings, "VTSO_DWELL_MAX_HOURS", 336)
+
+
+def learn_dwell_times(until: datetime | None = None, rebuild: bool = False) -> int:
+    """
+    Adds the Visits closed after the watermark and up to until to the
+    DwellHistograms, then moves the watermark to until, in one transaction.
+
+    Args:
+        until (datetime | None): defaults to VTSO_DWELL_SETTLE_SECONDS ago
+        rebuild (bool): forget the histograms and learn the whole history,
+            archived Visits included
+
+    Returns:
+        int: number of Visits learned
+    """
+    settle = getattr(settings, "VTSO_DWELL_SETTLE_SECONDS", 60)
+    until = until or timezone.now() - timedelta(seconds=settle)
+    size = max_hours() + 1
+    with transaction.atomic():
+        watermark, _ = DwellWatermark.objects.select_for_update().get_or_create(pk=1)
+        if rebuild:
+            DwellHistogram.objects.all().delete()
+            watermark.learned_until = None
+
+        # a rebuild also reads the Visits moved to the archive, which keep
+        # their closed_at
+        models = [Visit, ArchivedVisit] if rebuild else [Visit]
+        new_counts: dict[tuple, list[int]] = defaultdict(lambda: [0] * size)
+        learned = 0
+        rows = chain.from_iterable(
+            learned_visits(model, watermark.learned_until, until).iterator(
+                chunk_size=10_000
+            )
+            for model in models
+        )
+        for harbour_id, ship_type, entry_time, exit_time in rows:
+            if exit_time < entry_time:
+                continue
+            hours = min(int((exit_time - entry_time) / HOUR), size - 1)
+            new_counts[harbour_id, ship_type or ""][hours] += 1
+            learned += 1
+
+        histograms = {
+            (histogram.harbour_id, histogram.ship_type): histogram
+            for histogram in DwellHistogram.objects.select_for_update().filter(
+                harbour_id__in={harbour_id for harbour_id, _ in new_counts}
+            )
+        }
+        created, updated = [], []
+        for (harbour_id, ship_type), counts in new_counts.items():
+            histogram = histograms.get((harbour_id, ship_type))
+            if histogram is None:
+                created.append(
+                    DwellHistogram(
+                        harbour_id=harbour_id,
+                        ship_type=ship_type,
+                        counts=counts,
+                        total=sum(counts),
+                    )
+                )
+                continue
+            old = histogram.counts + [0] * (size - len(histogram.counts))
+            histogram.counts = [a + b for a, b in zip(old, counts)]
+            histogram.total = sum(histogram.counts)
+            updated.append(histogram)
+        DwellHistogram.objects.bulk_create(created)
+        DwellHistogram.objects.bulk_update(updated, ["counts", "total"])
+
+        watermark.learned_until = until
+        watermark.save()
+    return learned
+
+
+def learned_visits(model, after: datetime | None, until: datetime):
+    """
+    Returns:
+        QuerySet[tuple]: (harbour_id, ship type, entry_time, exit_time) of
+        the Visits or ArchivedVisits closed after after and up to until
+    """
+    visits = model.objects.filter(closed_at__lte=until, entry_time__isnull=False)
+    if after is not None:
+        visits = visits.filter(closed_at__gt=after)
+    return visits.values_list("harbour_id", "ship__type", "entry_time", "exit_time")
+
+
+class DwellDistribution:
+    """
+    Survival function of a dwell time histogram: the probability that a
+    visit lasts at least t hours, with add-one smoothing so that Ships
+    staying longer than ever observed are expected to stay.
+    """
+
+    def __init__(self, counts: list[int]):
+        self.total = sum(counts)
+        # at_least[h] = number of visits that lasted h hours or more
+        self.at_least = list(accumulate(reversed(counts)))[::-1] + [0]
+
+    def survival(self, hours: float) -> float:
+        index = min(max(int(hours), 0), len(self.at_least) - 1)
+        return (self.at_least[index] + 1) / (self.total + 1)
+
+    def stays(self, elapsed: float, more: float) -> float:
+        """
+        Returns:
+            float: probability that a visit that lasted elapsed hours
+            lasts more hours
+        """
+        return self.survival(elapsed + more) / self.survival(elapsed)
+
+
+def dwell_distributions(harbour_id: int) -> dict[str, DwellDistribution]:
+    """
+    Loads the distributions of a Harbour per Ship type. Types with fewer
+    than VTSO_FORECAST_MIN_SAMPLES learned visits use the distribution of
+    all the Ships of the Harbour, available under the None key.
+    """
+    min_samples = getattr(settings, "VTSO_FORECAST_MIN_SAMPLES", 20)
+    histograms = list(DwellHistogram.objects.filter(harbour_id=harbour_id))
+    size = max([len(histogram.counts) for histogram in histograms], default=1)
+    overall = [0] * size
+    for histogram in histograms:
+        for hours, count in enumerate(histogram.counts):
+            overall[hours] += count
+
+    distributions = {None: DwellDistribution(overall)}
+    for histogram in histograms:
+        if histogram.total >= min_samples:
+            distributions[histogram.ship_type] = DwellDistribution(histogram.counts)
+    return distributions
+
+
+def forecast_visits(harbour, at: datetime, end: datetime):
+    """
+    Reads the Visits of a Harbour that may be in progress between at and end:
+    the open ones from visit_open_harbour_idx, and the closed ones ending
+    after at, whose ids come from visit_exit_time_idx. Neither part reads
+    the history of the Harbour.
+
+    Returns:
+        QuerySet[tuple]: (entry_time, exit_time, ship type) of each Visit
+    """
+    visits = Visit.objects.filter(harbour=harbour)
+    ending = Visit.objects.filter(exit_time__gte=at, entry_time__lte=end)
+    fields = ("entry_time", "exit_time", "ship__type")
+    return (
+        visits.open_at(end)
+        .values_list(*fields)
+        .union(
+            visits.filter(pk__in=ending.values("pk")).values_list(*fields),
+            all=True,
+        )
+    )
+
+
+def forecast_berths(harbour, hours: int, at: datetime | None = None) -> list[dict]:
+    """
+    Forecasts the occupancy of a Harbour at every hour from at.
+
+    Args:
+        harbour (Harbour)
+        hours (int): number of hourly points
+        at (datetime | None): defaults to vtso.clock.now()
+
+    Returns:
+        list[dict]: one {"time", "expected_occupied", "expected_free"} per
+        hour; expected_free is None when the Harbour has no berths count
+    """
+    at = at or clock.now()
+    end = at + hours * HOUR
+    distributions = dwell_distributions(harbour.id)
+    visits = forecast_visits(harbour, at, end)
+
+    expected = [0.0] * (hours + 1)
+    for entry_time, exit_time, ship_type in visits:
+        distribution = distributions.get(ship_type or "", distributions[None])
+        for hour in range(hours + 1):
+            time = at + hour * HOUR
+            if entry_time > time:
+                continue
+            if exit_time is not None:
+                expected[hour] += exit_time >= time
+            elif entry_time <= at:
+                elapsed = (at - entry_time) / HOUR
+                expected[hour] += distribution.stays(elapsed, hour)
+            else:
+                expected[hour] += distribution.survival((time - entry_time) / HOUR)
+
+    return [
+        {
+            "time": at + hour * HOUR,
+            "expected_occupied": round(occupied, 2),
+            "expected_free": (
+                None
+                if harbour.berths is None
+                else round(max(harbour.berths - occupied, 0.0), 2)
+            ),
+        }
+        for hour, occupied in enumerate(expected)
+    ]
@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from vtso.archive import archive_batch, archive_cutoff
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves Visits that exited before VTSO_VISIT_ARCHIVE_HORIZON_DAYS ago "
+        "to the VISIT_ARCHIVE table, one committed batch at a time. "
+        "The command can be stopped and rerun at any point."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5_000,
+            help="Number of Visits moved per transaction.",
+        )
+        parser.add_argument(
+            "--max-batches",
+            type=int,
+            help="Stop after this many batches, to bound a single run.",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0.0,
+            help="Seconds to sleep between batches to limit the load on the database.",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive.")
+
+        before = archive_cutoff()
+        archived = 0
+        batches = 0
+        while options["max_batches"] is None or batches < options["max_batches"]:
+            moved = archive_batch(before, options["batch_size"])
+            if not moved:
+                break
+            archived += moved
+            batches += 1
+            self.stdout.write(f"{archived} visits archived")
+            time.sleep(options["pause"])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Archived {archived} visits that exited before {before:%Y-%m-%d %H:%M}."
+            )
+        )
@@ -0,0 +1,124 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from vtso.middleware import brotli, compressor
+from vtso.models import Company, Harbour, Ship, Visit
+from vtso.serializers import ShipSerializer, VisitSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the size and CPU time of compressing the JSON of the ship "
+        "and visit list endpoints at every gzip level and Brotli quality, to "
+        "help choose VTSO_GZIP_LEVEL and VTSO_BROTLI_QUALITY."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows",
+            type=int,
+            default=10_000,
+            help="Number of rows per endpoint.",
+        )
+        parser.add_argument(
+            "--synthetic",
+            action="store_true",
+            help="Use generated rows instead of the ones in the database.",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=3,
+            help="Number of runs averaged per level.",
+        )
+
+    def handle(self, *args, **options):
+        payloads = self.payloads(options["rows"], options["synthetic"])
+        levels = [("gzip", level) for level in range(1, 10)]
+        if brotli is not None:
+            levels += [("br", quality) for quality in range(0, 12)]
+        else:
+            self.stdout.write("brotli is not installed, only gzip is measured.")
+
+        self.stdout.write(
+            f"{'endpoint':<10}{'encoding':>9}{'level':>6}{'bytes':>12}"
+            f"{'ratio':>8}{'ms':>10}{'MB/s':>9}"
+        )
+        for name, payload in payloads.items():
+            self.stdout.write(
+                f"{name:<10}{'identity':>9}{'':>6}{len(payload):>12}{1:>8.2f}"
+            )
+            for encoding, level in levels:
+                size, seconds = self.measure(
+                    payload, encoding, level, options["repeat"]
+                )
+                self.stdout.write(
+                    f"{name:<10}{encoding:>9}{level:>6}{size:>12}"
+                    f"{len(payload) / size:>8.2f}{seconds * 1000:>10.1f}"
+                    f"{len(payload) / seconds / 1e6:>9.1f}"
+                )
+
+    @staticmethod
+    def measure(payload: bytes, encoding: str, level: int, repeat: int):
+        """
+        Returns:
+            tuple[int, float]: compressed size and average seconds per run
+        """
+        started = time.perf_counter()
+        for _ in range(repeat):
+            compress, _, finish = compressor(encoding, level)
+            size = len(compress(payload) + finish())
+        return size, (time.perf_counter() - started) / repeat
+
+    def payloads(self, rows: int, synthetic: bool) -> dict[str, bytes]:
+        if synthetic:
+            ships, visits = self.synthetic_rows(rows)
+        else:
+            ships = Ship.objects.select_related("company")[:rows]
+            visits = Visit.objects.all()[:rows]
+        renderer = JSONRenderer()
+        return {
+            "ships": renderer.render(ShipSerializer(ships, many=True).data),
+            "visits": renderer.render(VisitSerializer(visits, many=True).data),
+        }
+
+    @staticmethod
+    def synthetic_rows(rows: int):
+        """
+        Builds unsaved Ships and Visits shaped like production data.
+        """
+        company = Company(id=1, name="Roxxon")
+        harbour = Harbour(id=1, name="Sydney Harbour")
+        types = Ship.ShipType.values
+        start = timezone.now()
+        ships = [
+            Ship(
+                id=i,
+                company=company,
+                name=f"Ship {i}",
+                tonnage=1000 + i % 9000,
+                max_load_draft=5 + i % 10,
+                dry_draft=3 + i % 5,
+                flag="AU",
+                beam=10 + i % 20,
+                length=50 + i % 100,
+                year_built=str(1950 + i % 70),
+                type=types[i % len(types)],
+            )
+            for i in range(1, rows + 1)
+        ]
+        visits = [
+            Visit(
+                id=i,
+                ship=ships[i % len(ships)],
+                harbour=harbour,
+                entry_time=start - timedelta(hours=i),
+                exit_time=start - timedelta(hours=i) + timedelta(hours=6),
+            )
+            for i in range(1, rows + 1)
+        ]
+        return ships, visits
@@ -0,0 +1,242 @@
+import csv
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models, transaction
+from django.utils import timezone
+
+from vtso.models import ChangeLog, Company, Harbour, Person, Ship, Visit
+
+# models that can be imported, keyed by the name used on the command line
+IMPORTABLE_MODELS = {
+    "company": Company,
+    "person": Person,
+    "harbour": Harbour,
+    "ship": Ship,
+    "visit": Visit,
+}
+
+# foreign keys are given in the input file by the natural key of the target
+NATURAL_KEYS = {
+    Company: "name",
+    Harbour: "name",
+    Ship: "name",
+}
+
+# marks a natural key shared by more than one row of the target table
+AMBIGUOUS = object()
+
+
+class Command(BaseCommand):
+    help = (
+        "Streams a CSV or NDJSON file into one of the VTSO tables using "
+        "bulk inserts. Foreign keys are given by name (e.g. the 'ship' column "
+        "of a visit holds the ship name). Progress is checkpointed after every "
+        "committed chunk so a failed import can be continued with --resume."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("model", choices=sorted(IMPORTABLE_MODELS))
+        parser.add_argument("path", type=Path)
+        parser.add_argument(
+            "--format",
+            choices=["csv", "ndjson"],
+            help="Input format. Guessed from the file extension when omitted.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5_000,
+            help="Number of rows per bulk_create call.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=50_000,
+            help="Number of rows committed per transaction.",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            type=Path,
+            help="Checkpoint file. Defaults to <path>.checkpoint.",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Skip the rows recorded as committed in the checkpoint file.",
+        )
+
+    def handle(self, *args, **options):
+        model = IMPORTABLE_MODELS[options["model"]]
+        path = options["path"]
+        if not path.exists():
+            raise CommandError(f"{path} does not exist.")
+        if options["batch_size"] < 1 or options["chunk_size"] < 1:
+            raise CommandError("--batch-size and --chunk-size must be positive.")
+
+        input_format = options["format"] or self.guess_format(path)
+        checkpoint = options["checkpoint"] or path.with_name(f"{path.name}.checkpoint")
+        skip = self.read_checkpoint(checkpoint) if options["resume"] else 0
+
+        fields = self.importable_fields(model)
+        key_maps = {
+            field.name: self.natural_key_map(field.related_model)
+            for field in fields.values()
+            if field.is_relation
+        }
+        batches_per_chunk = max(1, options["chunk_size"] // options["batch_size"])
+
+        imported = skip
+        started = time.monotonic()
+        with path.open(newline="", encoding="utf-8") as stream:
+            records = islice(
+                enumerate(self.read_records(stream, input_format), start=1),
+                skip,
+                None,
+            )
+            batches = self.batched(records, options["batch_size"])
+            while chunk := list(islice(batches, batches_per_chunk)):
+                with transaction.atomic():
+                    for batch in chunk:
+                        objs = [
+                            self.build(model, fields, key_maps, number, record)
+                            for number, record in batch
+                        ]
+                        model.objects.bulk_create(objs)
+                        ChangeLog.record_many(objs, ChangeLog.Action.CREATE)
+                        if model is Visit:
+                            # bulk_create() skips Visit.save()
+                            ships = Ship.objects.filter(
+                                pk__in={obj.ship_id for obj in objs}
+                            )
+                            ships.sync_location()
+                        imported += len(objs)
+                self.write_checkpoint(checkpoint, imported)
+                rate = (imported - skip) / max(time.monotonic() - started, 1e-9)
+                self.stdout.write(f"{imported} rows imported ({rate:.0f} rows/s)")
+
+        checkpoint.unlink(missing_ok=True)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {imported - skip} {model._meta.verbose_name_plural}."
+            )
+        )
+
+    @staticmethod
+    def guess_format(path: Path) -> str:
+        suffix = path.suffix.lower()
+        if suffix == ".csv":
+            return "csv"
+        if suffix in (".ndjson", ".jsonl"):
+            return "ndjson"
+        raise CommandError(f"Cannot guess the format of {path}, use --format.")
+
+    @staticmethod
+    def read_records(stream, input_format: str):
+        """
+        Lazily yields one dict per input row so the file is never
+        loaded in memory as a whole.
+        """
+        if input_format == "csv":
+            yield from csv.DictReader(stream)
+            return
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+
+    @staticmethod
+    def batched(iterable, size: int):
+        iterator = iter(iterable)
+        while batch := list(islice(iterator, size)):
+            yield batch
+
+    @staticmethod
+    def read_checkpoint(checkpoint: Path) -> int:
+        if not checkpoint.exists():
+            return 0
+        return int(checkpoint.read_text().strip() or 0)
+
+    @staticmethod
+    def write_checkpoint(checkpoint: Path, imported: int):
+        # write then rename so a crash never leaves a truncated checkpoint
+        tmp = checkpoint.with_name(f"{checkpoint.name}.tmp")
+        tmp.write_text(str(imported))
+        tmp.replace(checkpoint)
+
+    @staticmethod
+    def importable_fields(model) -> dict:
+        return {
+            field.name: field
+            for field in model._meta.concrete_fields
+            if not field.primary_key and field.editable
+        }
+
+    @staticmethod
+    def natural_key_map(model) -> dict:
+        """
+        Builds a {natural key: primary key} map of a whole table
+        in a single streamed query.
+
+        Returns:
+            dict: natural keys shared by several rows map to AMBIGUOUS
+        """
+        key_map: dict = {}
+        rows = model.objects.values_list(NATURAL_KEYS[model], "pk")
+        for key, pk in rows.iterator(chunk_size=10_000):
+            key_map[key] = AMBIGUOUS if key in key_map else pk
+        return key_map
+
+    def build(self, model, fields, key_maps, number, record):
+        """
+        Creates an unsaved instance from an input record and validates it
+        with the model field validators and Model.clean().
+
+        Raises:
+            CommandError: the record is invalid or references an unknown row
+        """
+        unknown = set(record) - set(fields)
+        if unknown:
+            raise CommandError(
+                f"Record {number}: unknown columns {', '.join(sorted(unknown))}."
+            )
+
+        values = {}
+        for name, value in record.items():
+            field = fields[name]
+            if value == "":
+                value = None
+            if field.is_relation:
+                if value is None:
+                    raise CommandError(f"Record {number}: {name} is required.")
+                pk = key_maps[name].get(value)
+                if pk is None:
+                    raise CommandError(f"Record {number}: unknown {name} {value!r}.")
+                if pk is AMBIGUOUS:
+                    raise CommandError(
+                        f"Record {number}: {name} {value!r} is ambiguous."
+                    )
+                values[field.attname] = pk
+            elif isinstance(field, models.CharField) and value is not None:
+                values[name] = str(value)
+            else:
+                values[name] = value
+
+        instance = model(**values)
+        try:
+            instance.clean_fields(
+                exclude=[name for name, field in fields.items() if field.is_relation]
+            )
+            # naive timestamps are read in the project's time zone
+            for name, field in fields.items():
+                value = getattr(instance, field.attname)
+                if isinstance(field, models.DateTimeField) and value is not None:
+                    if timezone.is_naive(value):
+                        setattr(instance, name, timezone.make_aware(value))
+            instance.clean()
+        except ValidationError as e:
+            raise CommandError(f"Record {number}: {'; '.join(e.messages)}") from e
+        return instance
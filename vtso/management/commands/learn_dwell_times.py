@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from vtso.forecast import learn_dwell_times
+
+
+class Command(BaseCommand):
+    help = (
+        "Learns the dwell times of the Visits closed since the last run into "
+        "the per harbour and ship type histograms used by the berth forecasts. "
+        "Schedule it (e.g. hourly) to keep the forecasts current."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Forget the histograms and learn the whole Visit history again.",
+        )
+
+    def handle(self, *args, **options):
+        learned = learn_dwell_times(rebuild=options["rebuild"])
+        self.stdout.write(self.style.SUCCESS(f"Learned {learned} visits."))
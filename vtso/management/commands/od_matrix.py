@@ -0,0 +1,54 @@
+import csv
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import is_naive, make_aware
+
+from vtso.analytics import od_matrix
+from vtso.models import Ship
+
+COLUMNS = [
+    "from_harbour",
+    "from_harbour_name",
+    "to_harbour",
+    "to_harbour_name",
+    "count",
+    "median_passage",
+]
+
+
+def aware_datetime(value: str):
+    at = parse_datetime(value)
+    if at is None:
+        raise CommandError(f"{value!r} is not an ISO 8601 date/time.")
+    return make_aware(at) if is_naive(at) else at
+
+
+class Command(BaseCommand):
+    help = (
+        "Prints the origin-destination matrix of the fleet: the number of "
+        "passages between every pair of harbours and their median duration, "
+        "for the passages arriving between --from and --to."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="start", type=aware_datetime, required=True)
+        parser.add_argument("--to", dest="end", type=aware_datetime, required=True)
+        parser.add_argument("--ship-type", choices=Ship.ShipType.values)
+        parser.add_argument("--format", choices=["csv", "json"], default="csv")
+
+    def handle(self, *args, **options):
+        if options["start"] >= options["end"]:
+            raise CommandError("--from must be before --to.")
+
+        matrix = od_matrix(
+            options["start"], options["end"], ship_type=options["ship_type"]
+        )
+        if options["format"] == "json":
+            self.stdout.write(json.dumps(matrix, cls=DjangoJSONEncoder, indent=2))
+            return
+        writer = csv.DictWriter(self.stdout, fieldnames=COLUMNS, lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(matrix)
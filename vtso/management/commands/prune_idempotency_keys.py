@@ -0,0 +1,11 @@
+from vtso.management.prune import PruneExpiredCommand
+from vtso.models import IdempotencyKey
+
+
+class Command(PruneExpiredCommand):
+    help = (
+        "Deletes the expired Idempotency-Keys and their stored responses, "
+        "one batch at a time, so they are only kept for VTSO_IDEMPOTENCY_KEY_TTL."
+    )
+    model = IdempotencyKey
+    noun = "keys"
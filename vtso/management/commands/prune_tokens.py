@@ -0,0 +1,11 @@
+from vtso.management.prune import PruneExpiredCommand
+from vtso.models import AccessToken
+
+
+class Command(PruneExpiredCommand):
+    help = (
+        "Deletes the expired API tokens, one batch at a time. Schedule it "
+        "to keep the token table to the tokens still in use."
+    )
+    model = AccessToken
+    noun = "tokens"
@@ -0,0 +1,90 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from vtso import clock
+from vtso.models import Ship, Visit
+
+
+class Command(BaseCommand):
+    help = (
+        "Checks the current_visit and current_harbour columns of every Ship "
+        "against its Visits in progress and repairs the Ships that drifted, "
+        "one committed batch at a time. Besides writes that bypass the ORM, "
+        "such as raw SQL or database restores, Visits written with a future "
+        "entry_time or exit_time move their Ship once that time has passed: "
+        "schedule the command with --recent-minutes to apply them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10_000,
+            help="Number of Ships checked per query.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report the Ships that drifted.",
+        )
+        parser.add_argument(
+            "--recent-minutes",
+            type=int,
+            help=(
+                "Only check the Ships with a Visit that started or ended in the "
+                "last N minutes, read from the entry_time and exit_time indexes. "
+                "Use a value larger than the schedule interval."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive.")
+
+        ships = Ship.objects.all()
+        if options["recent_minutes"] is not None:
+            if options["recent_minutes"] < 1:
+                raise CommandError("--recent-minutes must be positive.")
+            now = clock.now()
+            recent = (now - timedelta(minutes=options["recent_minutes"]), now)
+            visits = Visit.objects.filter(
+                Q(entry_time__range=recent) | Q(exit_time__range=recent)
+            )
+            ships = ships.filter(pk__in=visits.values("ship"))
+
+        checked = 0
+        drifted = 0
+        last_id = 0
+        while True:
+            # keyset pagination, so every batch is an index range scan
+            rows = list(
+                ships.filter(pk__gt=last_id)
+                .order_by("pk")
+                .with_expected_location()
+                .values_list(
+                    "pk",
+                    "current_visit",
+                    "current_harbour",
+                    "expected_visit",
+                    "expected_harbour",
+                )[: options["batch_size"]]
+            )
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            checked += len(rows)
+            ids = [row[0] for row in rows if row[1:3] != row[3:5]]
+            drifted += len(ids)
+            if ids and not options["dry_run"]:
+                with transaction.atomic():
+                    Ship.objects.filter(pk__in=ids).sync_location()
+
+        action = "found" if options["dry_run"] else "repaired"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Checked {checked} ships, {action} {drifted} with a stale location."
+            )
+        )
@@ -0,0 +1,71 @@
+"""
+Batched deletion of expired rows, shared by the prune_* commands.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from vtso import clock
+
+
+def prune_expired(model, batch_size: int, pause: float = 0.0) -> int:
+    """
+    Deletes the rows of a model whose expires_at has passed, batch_size at a
+    time. The batches are read from the expires_at index, so only expired
+    rows are touched. Nothing references these rows, so each batch is a
+    single DELETE.
+
+    Args:
+        model (Model): a model with an indexed expires_at field
+        batch_size (int): number of rows deleted per query
+        pause (float): seconds to sleep between batches
+
+    Returns:
+        int: number of rows deleted
+    """
+    now = clock.now()
+    pruned = 0
+    while True:
+        ids = list(
+            model.objects.filter(expires_at__lte=now)
+            .order_by("expires_at")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            return pruned
+        model.objects.filter(id__in=ids).delete()
+        pruned += len(ids)
+        time.sleep(pause)
+
+
+class PruneExpiredCommand(BaseCommand):
+    """
+    Base of the commands deleting the expired rows of a model with
+    prune_expired(). Subclasses set model and noun, the plural name of the
+    rows used in the messages.
+    """
+
+    model = None
+    noun = ""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5_000,
+            help=f"Number of {self.noun} deleted per query.",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0.0,
+            help="Seconds to sleep between batches to limit the load on the database.",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive.")
+
+        pruned = prune_expired(self.model, options["batch_size"], options["pause"])
+        self.stdout.write(self.style.SUCCESS(f"Pruned {pruned} expired {self.noun}."))
@@ -0,0 +1,408 @@
+import hashlib
+import time
+import zlib
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+from vtso import clock
+from vtso.routers import replica_reads
+from vtso.throttling import counter_store
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+
+def client_ids(request) -> list[str]:
+    """
+    Identifies the client of a request before authentication runs, from
+    the most to the least specific: its Authorization header, its session
+    cookie and its address.
+
+    Returns:
+        list[str]: sha256 digests of the identifiers present on the request
+    """
+    identifiers = [
+        request.META.get("HTTP_AUTHORIZATION"),
+        request.COOKIES.get(settings.SESSION_COOKIE_NAME),
+        request.META.get("REMOTE_ADDR"),
+    ]
+    return [
+        hashlib.sha256(identifier.encode()).hexdigest()
+        for identifier in identifiers
+        if identifier
+    ]
+
+
+class AdmissionControlMiddleware:
+    """
+    Sheds load before the workers run out of database connections.
+
+    At most VTSO_MAX_CONCURRENT_REQUESTS requests are served at once, further
+    requests get a 503. A single client may have at most
+    VTSO_MAX_CONCURRENT_REQUESTS_PER_CLIENT requests in flight, further
+    requests get a 429. Both carry a Retry-After of
+    VTSO_ADMISSION_RETRY_AFTER seconds. A limit set to None is not enforced.
+
+    The in-flight counters live in vtso.throttling.counter_store(). With the
+    default LocalCounterStore the limits apply per worker process.
+    A request leaves the count when its response is returned, before a
+    streaming body is consumed.
+    """
+
+    sync_capable = True
+    async_capable = True
+    # bounds how long a counter leaked by a killed worker survives in a
+    # shared store
+    counter_ttl = 300
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        rejection, keys = self.admit(request)
+        if rejection is not None:
+            return rejection
+        try:
+            return self.get_response(request)
+        finally:
+            self.release(keys)
+
+    async def __acall__(self, request):
+        rejection, keys = self.admit(request)
+        if rejection is not None:
+            return rejection
+        try:
+            return await self.get_response(request)
+        finally:
+            self.release(keys)
+
+    def admit(self, request) -> tuple[JsonResponse | None, list[str]]:
+        """
+        Counts the request in, unless a limit is reached.
+
+        Returns:
+            tuple[JsonResponse | None, list[str]]: the rejection response if
+            the request is shed, and the counters to release when it ends
+        """
+        limits = [
+            (
+                "vtso:inflight",
+                getattr(settings, "VTSO_MAX_CONCURRENT_REQUESTS", None),
+                503,
+                "The server is busy, try again later.",
+            ),
+        ]
+        ids = client_ids(request)
+        if ids:
+            limits.append(
+                (
+                    f"vtso:inflight:{ids[0]}",
+                    getattr(settings, "VTSO_MAX_CONCURRENT_REQUESTS_PER_CLIENT", None),
+                    429,
+                    "Too many concurrent requests.",
+                )
+            )
+
+        store = counter_store()
+        keys = []
+        for key, limit, status, detail in limits:
+            if limit is None:
+                continue
+            keys.append(key)
+            if store.incr(key, ttl=self.counter_ttl) > limit:
+                self.release(keys)
+                return self.reject(status, detail), []
+        return None, keys
+
+    def release(self, keys: list[str]):
+        store = counter_store()
+        for key in keys:
+            store.incr(key, -1, ttl=self.counter_ttl)
+
+    @staticmethod
+    def reject(status: int, detail: str) -> JsonResponse:
+        response = JsonResponse({"detail": detail}, status=status)
+        response.headers["Retry-After"] = str(
+            getattr(settings, "VTSO_ADMISSION_RETRY_AFTER", 1)
+        )
+        return response
+
+
+class RequestClockMiddleware:
+    """
+    Freezes vtso.clock for the duration of each request.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with clock.frozen():
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with clock.frozen():
+            return await self.get_response(request)
+
+
+def credential_id(credential: str) -> str:
+    return hashlib.sha256(credential.encode()).hexdigest()
+
+
+def pin_credentials(request, *authorizations: str):
+    """
+    Keeps the reads of Authorization header values issued by a request
+    (e.g. a new token) on the primary, like the reads of the client that
+    sent it, see ReplicaRoutingMiddleware.
+    """
+    request = getattr(request, "_request", request)
+    request.vtso_issued_credentials = [
+        *getattr(request, "vtso_issued_credentials", []),
+        *authorizations,
+    ]
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Lets the reads of safe requests go to the read replicas
+    (see vtso/routers.py).
+
+    After a client sends a write, its reads stay on the primary for
+    VTSO_REPLICA_STICKY_SECONDS. Clients are identified by the credentials
+    they authenticate with: their Authorization header, or else their
+    session cookie. Addresses are not used, so the clients behind a proxy
+    or NAT do not pin each other. Credentials issued by a write (a token
+    passed to pin_credentials(), a session cookie set by a login) are
+    pinned too, so they are usable right away. Anonymous requests always
+    read from the replicas. The deadlines are kept in the default cache,
+    which must be shared by all workers in production.
+    """
+
+    sync_capable = True
+    async_capable = True
+    safe_methods = ("GET", "HEAD", "OPTIONS")
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if request.method in self.safe_methods:
+            key = self.sticky_key(request)
+            deadline = None if key is None else cache.get(key)
+            with replica_reads(self.is_past(deadline)):
+                return self.get_response(request)
+
+        response = self.get_response(request)
+        if response.status_code < 500:
+            cache.set_many(*self.sticky_deadlines(request, response))
+        return response
+
+    async def __acall__(self, request):
+        if request.method in self.safe_methods:
+            key = self.sticky_key(request)
+            deadline = None if key is None else await cache.aget(key)
+            with replica_reads(self.is_past(deadline)):
+                return await self.get_response(request)
+
+        response = await self.get_response(request)
+        if response.status_code < 500:
+            await cache.aset_many(*self.sticky_deadlines(request, response))
+        return response
+
+    @staticmethod
+    def sticky_key(request) -> str | None:
+        """
+        Returns:
+            str | None: the cache key of the client's deadline, None for
+            anonymous requests
+        """
+        credential = request.META.get("HTTP_AUTHORIZATION") or request.COOKIES.get(
+            settings.SESSION_COOKIE_NAME
+        )
+        if not credential:
+            return None
+        return f"vtso:primary-until:{credential_id(credential)}"
+
+    def sticky_deadlines(self, request, response) -> tuple[dict, int]:
+        """
+        Returns:
+            tuple[dict, int]: set_many() arguments keeping the client and
+            the credentials issued by the request on the primary for
+            VTSO_REPLICA_STICKY_SECONDS
+        """
+        credentials = list(getattr(request, "vtso_issued_credentials", []))
+        session = response.cookies.get(settings.SESSION_COOKIE_NAME)
+        if session is not None and session.value:
+            credentials.append(session.value)
+        keys = [f"vtso:primary-until:{credential_id(c)}" for c in credentials]
+        key = self.sticky_key(request)
+        if key is not None:
+            keys.append(key)
+        seconds = getattr(settings, "VTSO_REPLICA_STICKY_SECONDS", 5)
+        until = time.time() + seconds
+        return {key: until for key in keys}, seconds
+
+    @staticmethod
+    def is_past(deadline: float | None) -> bool:
+        return deadline is None or deadline <= time.time()
+
+
+def accepted_encodings(accept_encoding: str) -> dict[str, float]:
+    """
+    Parses an Accept-Encoding header into {coding: q-value}.
+    """
+    encodings = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            encodings[coding.strip().lower()] = quality
+    return encodings
+
+
+def compressor(encoding: str, level: int):
+    """
+    Returns:
+        tuple: (compress, flush, finish) callables of a streaming compressor
+    """
+    if encoding == "br":
+        brotli_compressor = brotli.Compressor(quality=level)
+        return (
+            brotli_compressor.process,
+            brotli_compressor.flush,
+            brotli_compressor.finish,
+        )
+    # wbits=31 writes a gzip header and trailer
+    gzip_compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return (
+        gzip_compressor.compress,
+        lambda: gzip_compressor.flush(zlib.Z_SYNC_FLUSH),
+        gzip_compressor.flush,
+    )
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Negotiated Brotli/gzip compression of API responses.
+
+    Brotli is used when the brotli package is installed and the client
+    prefers it, gzip otherwise. Regular responses smaller than
+    VTSO_COMPRESSION_MIN_SIZE bytes are sent as they are. Streaming
+    responses are compressed chunk by chunk, flushing after each chunk so
+    clients can start parsing before the whole body is produced.
+
+    Only the VTSO_COMPRESSION_CONTENT_TYPES are compressed. Unlike Django's
+    GZipMiddleware, the output is not padded against BREACH, so do not add
+    types that carry secrets next to reflected input, such as the HTML of
+    the admin.
+
+    Levels are set with VTSO_GZIP_LEVEL (1-9) and VTSO_BROTLI_QUALITY
+    (0-11); `manage.py benchmark_compression` shows their trade-off.
+    """
+
+    def process_response(self, request, response):
+        if response.has_header("Content-Encoding"):
+            return response
+        content_type = response.get("Content-Type", "").split(";")[0]
+        if not content_type.startswith(
+            tuple(getattr(settings, "VTSO_COMPRESSION_CONTENT_TYPES", ()))
+        ):
+            return response
+        if not response.streaming and len(response.content) < getattr(
+            settings, "VTSO_COMPRESSION_MIN_SIZE", 1024
+        ):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = self.negotiate(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if encoding is None:
+            return response
+        level = (
+            getattr(settings, "VTSO_BROTLI_QUALITY", 4)
+            if encoding == "br"
+            else getattr(settings, "VTSO_GZIP_LEVEL", 6)
+        )
+        compress, flush, finish = compressor(encoding, level)
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = self.acompress_stream(
+                    response.streaming_content, compress, flush, finish
+                )
+            else:
+                response.streaming_content = self.compress_stream(
+                    response.streaming_content, compress, flush, finish
+                )
+            # the compressed size is only known once the stream is consumed
+            del response.headers["Content-Length"]
+        else:
+            compressed = compress(response.content) + finish()
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers["Content-Length"] = str(len(compressed))
+
+        # a strong ETag would claim the compressed body is byte-identical
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+    @staticmethod
+    def negotiate(accept_encoding: str) -> str | None:
+        """
+        Returns:
+            str | None: "br", "gzip" or None when the client accepts neither
+        """
+        encodings = accepted_encodings(accept_encoding)
+        wildcard = encodings.get("*", 0.0)
+        candidates = ["br", "gzip"] if brotli is not None else ["gzip"]
+        # on equal q-values the first candidate (the smaller output) wins
+        best = max(candidates, key=lambda coding: encodings.get(coding, wildcard))
+        return best if encodings.get(best, wildcard) > 0 else None
+
+    @staticmethod
+    def compress_stream(chunks, compress, flush, finish):
+        for chunk in chunks:
+            data = compress(chunk) + flush()
+            if data:
+                yield data
+        yield finish()
+
+    @staticmethod
+    async def acompress_stream(chunks, compress, flush, finish):
+        async for chunk in chunks:
+            data = compress(chunk) + flush()
+            if data:
+                yield data
+        yield finish()
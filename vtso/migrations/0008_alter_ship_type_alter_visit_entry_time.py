@@ -0,0 +1,35 @@
+# Generated by Django 5.0.6 on 2026-10-19 17:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("vtso", "0007_alter_company_options"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="ship",
+            name="type",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("bulk carrier", "Bulk Carrier"),
+                    ("fishing", "Fishing"),
+                    ("submarine", "Submarine"),
+                    ("tanker", "Tanker"),
+                    ("cruise ship", "Cruise Ship"),
+                ],
+                db_index=True,
+                max_length=256,
+                null=True,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="visit",
+            name="entry_time",
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.6 on 2026-10-19 17:18
+
+from django.db import migrations, models
+from django.db.models.functions import Cast
+
+
+def populate_year_built_int(apps, schema_editor):
+    """
+    Copies every numeric year_built into year_built_int with a single UPDATE.
+    """
+    Ship = apps.get_model("vtso", "Ship")
+    Ship.objects.filter(year_built__regex=r"^[0-9]+$").update(
+        year_built_int=Cast("year_built", models.PositiveSmallIntegerField())
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("vtso", "0008_alter_ship_type_alter_visit_entry_time"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ship",
+            name="year_built_int",
+            field=models.PositiveSmallIntegerField(
+                blank=True, db_index=True, editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(populate_year_built_int, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.6 on 2026-10-19 17:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("vtso", "0009_ship_year_built_int"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="visit",
+            index=models.Index(
+                fields=["harbour", "entry_time"], name="visit_harbour_entry_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="visit",
+            index=models.Index(
+                fields=["ship", "entry_time"], name="visit_ship_entry_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="visit",
+            index=models.Index(fields=["exit_time"], name="visit_exit_time_idx"),
+        ),
+    ]
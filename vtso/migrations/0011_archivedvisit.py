@@ -0,0 +1,45 @@
+# Generated by Django 5.0.6 on 2026-10-19 17:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("vtso", "0010_visit_visit_harbour_entry_idx_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedVisit",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                (
+                    "entry_time",
+                    models.DateTimeField(blank=True, db_index=True, null=True),
+                ),
+                ("exit_time", models.DateTimeField(blank=True, null=True)),
+                (
+                    "harbour",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="vtso.harbour"
+                    ),
+                ),
+                (
+                    "ship",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="vtso.ship"
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "VISIT_ARCHIVE",
+                "indexes": [
+                    models.Index(
+                        fields=["ship", "entry_time"], name="archive_ship_entry_idx"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.0.6 on 2026-10-19 17:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("vtso", "0012_changelog"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DwellWatermark",
+            fields=[
+                (
+                    "id",
+                    models.PositiveSmallIntegerField(
+                        default=1, primary_key=True, serialize=False
+                    ),
+                ),
+                ("learned_until", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "db_table": "DWELL_WATERMARK",
+            },
+        ),
+        migrations.AddField(
+            model_name="harbour",
+            name="berths",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name="DwellHistogram",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("ship_type", models.CharField(blank=True, max_length=256)),
+                ("counts", models.JSONField(default=list)),
+                ("total", models.PositiveIntegerField(default=0)),
+                (
+                    "harbour",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="vtso.harbour"
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "DWELL_HISTOGRAM",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="dwellhistogram",
+            constraint=models.UniqueConstraint(
+                fields=("harbour", "ship_type"), name="dwell_harbour_type_unique"
+            ),
+        ),
+    ]
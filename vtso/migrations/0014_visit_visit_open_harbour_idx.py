@@ -0,0 +1,21 @@
+# Generated by Django 5.0.6 on 2026-10-19 17:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("vtso", "0013_harbour_berths_dwellhistogram"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="visit",
+            index=models.Index(
+                condition=models.Q(("exit_time__isnull", True)),
+                fields=["harbour", "entry_time"],
+                name="visit_open_harbour_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.0.6 on 2026-10-19 17:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def populate_ship_location(apps, schema_editor):
+    """
+    Points every Ship at its latest Visit in progress (started, and open
+    or not exited yet, as in Visit.objects.current()) with a single UPDATE.
+    """
+    Ship = apps.get_model("vtso", "Ship")
+    Visit = apps.get_model("vtso", "Visit")
+    now = timezone.now()
+    visits = (
+        Visit.objects.filter(ship=models.OuterRef("pk"), entry_time__lte=now)
+        .filter(models.Q(exit_time__isnull=True) | models.Q(exit_time__gte=now))
+        .order_by("-entry_time", "-id")
+    )
+    Ship.objects.update(
+        current_visit=models.Subquery(visits.values("id")[:1]),
+        current_harbour=models.Subquery(visits.values("harbour")[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("vtso", "0014_visit_visit_open_harbour_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ship",
+            name="current_harbour",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="docked_ships",
+                to="vtso.harbour",
+            ),
+        ),
+        migrations.AddField(
+            model_name="ship",
+            name="current_visit",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="vtso.visit",
+            ),
+        ),
+        migrations.RunPython(populate_ship_location, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.6 on 2026-10-19 17:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("vtso", "0015_ship_current_harbour_ship_current_visit"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ship",
+            name="version",
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name="visit",
+            name="version",
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
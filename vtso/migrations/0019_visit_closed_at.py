@@ -0,0 +1,34 @@
+# Generated by Django 5.0.6 on 2026-10-19 18:20
+
+from django.db import migrations, models
+
+
+def populate_closed_at(apps, schema_editor):
+    """
+    Stamps the closed Visits with their exit_time, the order in which
+    learn_dwell_times read them so far, with a single UPDATE.
+    """
+    Visit = apps.get_model("vtso", "Visit")
+    Visit.objects.filter(exit_time__isnull=False).update(
+        closed_at=models.F("exit_time")
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("vtso", "0018_accesstoken"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="visit",
+            name="closed_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(populate_closed_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="visit",
+            index=models.Index(fields=["closed_at"], name="visit_closed_at_idx"),
+        ),
+    ]
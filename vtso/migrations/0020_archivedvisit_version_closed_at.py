@@ -0,0 +1,35 @@
+# Generated by Django 5.0.6 on 2026-10-19 18:24
+
+from django.db import migrations, models
+
+
+def populate_closed_at(apps, schema_editor):
+    """
+    Stamps the archived Visits with their exit_time, like 0019 did for
+    the hot ones, with a single UPDATE.
+    """
+    ArchivedVisit = apps.get_model("vtso", "ArchivedVisit")
+    ArchivedVisit.objects.filter(exit_time__isnull=False).update(
+        closed_at=models.F("exit_time")
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("vtso", "0019_visit_closed_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="archivedvisit",
+            name="closed_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="archivedvisit",
+            name="version",
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.RunPython(populate_closed_at, migrations.RunPython.noop),
+    ]
@@ -1,18 +1,177 @@
-from datetime import datetime
+import hashlib
+import hmac
+import secrets
+from datetime import timedelta
 
+from django.conf import settings
 from django.contrib import admin
 from django.contrib.auth.models import AbstractUser
 from django.core.exceptions import ValidationError
-from django.db import models
-from django.utils.timezone import get_current_timezone
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, models, router, transaction
+from django.utils import timezone
+
+from vtso import changes, clock
+from vtso.paginators import EstimatedCountPaginator
 
 
 class User(AbstractUser):
     pass
 
 
+# ChangeLog
+class ChangeLog(models.Model):
+    """
+    Append-only record of the writes to the VTSO models, read by
+    GET /vtso/changes/. seq only grows, so a mirror that stored the last
+    seq it applied can ask for the changes after it.
+    """
+
+    class Action(models.TextChoices):
+        CREATE = "create", "Create"
+        UPDATE = "update", "Update"
+        DELETE = "delete", "Delete"
+
+    seq = models.BigAutoField(primary_key=True)
+    # model_name of the changed row, e.g. "ship"
+    model = models.CharField(max_length=64)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=16, choices=Action.choices)
+    # the row after the change, null for deletes
+    payload = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "CHANGE_LOG"
+
+    @classmethod
+    def entry(cls, instance, action: str):
+        return cls(
+            model=instance._meta.model_name,
+            object_id=instance.pk,
+            action=action,
+            payload=None if action == cls.Action.DELETE else changes.snapshot(instance),
+        )
+
+    @classmethod
+    def record(cls, instance, action: str):
+        if changes.enabled():
+            cls.entry(instance, action).save(using=instance._state.db)
+
+    @classmethod
+    def record_many(cls, instances, action: str, using: str | None = None):
+        """
+        Records the changes of rows written by bulk_create(), bulk_update()
+        or any other path that skips save(). Must be called in the
+        transaction that wrote the rows.
+        """
+        if changes.enabled():
+            entries = [cls.entry(instance, action) for instance in instances]
+            cls.objects.using(using).bulk_create(entries)
+
+    @staticmethod
+    def record_delete(sender, instance, using, origin=None, **kwargs):
+        """
+        post_delete receiver of the change logged models, connected in
+        VtsoConfig.ready(). Cascaded deletes send one signal per row, inside
+        the transaction of the delete.
+        """
+        if changes.enabled():
+            ChangeLog.entry(instance, ChangeLog.Action.DELETE).save(using=using)
+
+
+class ChangeLogAdmin(admin.ModelAdmin):
+    list_display = ("seq", "model", "object_id", "action", "created_at")
+    list_filter = ("model", "action")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+class ChangeLoggedModel(models.Model):
+    """
+    Base class of the models mirrored through GET /vtso/changes/.
+    save() writes the row and its ChangeLog entry in one transaction.
+    """
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get("using") or router.db_for_write(type(self), instance=self)
+        action = (
+            ChangeLog.Action.CREATE if self._state.adding else ChangeLog.Action.UPDATE
+        )
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+            ChangeLog.record(self, action)
+
+
+class VersionConflict(Exception):
+    """
+    Raised by VersionedModel.save() when the row changed since it was read.
+    """
+
+
+class VersionedModel(ChangeLoggedModel):
+    """
+    Base class of the models updated with optimistic concurrency control.
+
+    version counts the updates of the row. save() of a loaded instance only
+    writes if the row still has the version that was read, so two clients
+    editing the same row cannot silently overwrite each other and no lock
+    is held between the read and the write. The API exposes the version as
+    the ETag of the row (see IfMatchMixin in vtso/views.py).
+    """
+
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if self._state.adding or kwargs.get("force_insert"):
+            super().save(*args, **kwargs)
+            return
+
+        using = kwargs.get("using") or router.db_for_write(type(self), instance=self)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, "version"}
+        read_version = self.version
+        with transaction.atomic(using=using, savepoint=False):
+            # compare-and-swap: the conditional UPDATE only matches the row
+            # if nobody wrote it since it was read, and holds its lock until
+            # the write below commits
+            swapped = (
+                type(self)
+                ._base_manager.using(using)
+                .filter(pk=self.pk, version=read_version)
+                .update(version=models.F("version") + 1)
+            )
+            if swapped:
+                self.version = read_version + 1
+                try:
+                    super().save(*args, **kwargs)
+                except Exception:
+                    self.version = read_version
+                    raise
+        # raised outside of the block, which wrote nothing, so that an
+        # enclosing transaction stays usable
+        if not swapped:
+            raise VersionConflict(
+                f"{self._meta.object_name} {self.pk} changed since "
+                f"version {read_version} was read."
+            )
+
+
 # Company
-class Company(models.Model):
+class Company(ChangeLoggedModel):
     id = models.BigAutoField(primary_key=True)
     name = models.CharField(max_length=256, null=True, blank=True)
 
@@ -35,7 +194,7 @@ class CompanyAdmin(admin.ModelAdmin):
 
 
 # Person
-class Person(models.Model):
+class Person(ChangeLoggedModel):
     id = models.BigAutoField(primary_key=True)
     # a Company may employ many Persons
     company = models.ForeignKey(to=Company, on_delete=models.CASCADE)
@@ -49,13 +208,17 @@ class Person(models.Model):
 
 class PersonAdmin(admin.ModelAdmin):
     list_display = ("name", "email", "phone", "company")
+    # joins the Company so the changelist does not run one query per row
+    list_select_related = ("company",)
+    # avoids rendering every Company in a <select> on the change form
+    raw_id_fields = ("company",)
 
     # enables seach on the Admin portal
     search_fields = ["name", "email", "company__name"]
 
 
 # Harbour
-class Harbour(models.Model):
+class Harbour(ChangeLoggedModel):
     id = models.BigAutoField(primary_key=True)
     name = models.CharField(max_length=256, null=True, blank=True)
     max_berth_depth = models.PositiveIntegerField(null=True, blank=True)
@@ -63,6 +226,8 @@ class Harbour(models.Model):
     harbour_master = models.CharField(max_length=256, null=True, blank=True)
     city = models.CharField(max_length=256, null=True, blank=True)
     country = models.CharField(max_length=256, null=True, blank=True)
+    # number of ships the harbour can berth at once, used by the forecasts
+    berths = models.PositiveIntegerField(null=True, blank=True)
 
     class Meta:
         db_table = "HARBOUR"
@@ -79,6 +244,7 @@ class HarbourAdmin(admin.ModelAdmin):
         "harbour_master",
         "city",
         "country",
+        "berths",
     )
 
     # enables seach on the Admin portal
@@ -103,7 +269,81 @@ def validate_year_in_range(value):
         raise ValidationError(f"{value} is not within the range 0 to 9999.")
 
 
-class Ship(models.Model):
+class ShipQuerySet(models.QuerySet):
+    @staticmethod
+    def current_visits(at=None):
+        """
+        Args:
+            at (datetime | None): defaults to vtso.clock.now()
+
+        Returns:
+            QuerySet[Visit]: the Visits of the outer Ship in progress at a
+            given time, as in Visit.objects.current(), latest first
+        """
+        at = at or clock.now()
+        return (
+            Visit.objects.filter(ship=models.OuterRef("pk"), entry_time__lte=at)
+            .filter(models.Q(exit_time__isnull=True) | models.Q(exit_time__gte=at))
+            .order_by("-entry_time", "-id")
+        )
+
+    def with_expected_location(self, at=None):
+        """
+        Annotates each Ship with the expected_visit and expected_harbour its
+        current_visit and current_harbour columns should hold at a given time.
+        """
+        visits = self.current_visits(at)
+        return self.annotate(
+            expected_visit=models.Subquery(visits.values("id")[:1]),
+            expected_harbour=models.Subquery(visits.values("harbour")[:1]),
+        )
+
+    def sync_location(self, at=None) -> int:
+        """
+        Recomputes current_visit and current_harbour of the Ships, reading
+        their Visits from visit_ship_entry_idx, and records a ChangeLog
+        UPDATE for each Ship whose location changed. The Ships are locked
+        before their Visits are read, so concurrent Visit writes of the same
+        Ship are applied one after the other.
+
+        Returns:
+            int: number of Ships updated
+        """
+        locked = self.select_for_update()
+        using = locked.db
+        with transaction.atomic(using=using, savepoint=False):
+            ids = list(locked.values_list("pk", flat=True))
+            if not ids:
+                return 0
+            ships = [
+                ship
+                for ship in Ship.objects.using(using)
+                .filter(pk__in=ids)
+                .with_expected_location(at)
+                if (ship.current_visit_id, ship.current_harbour_id)
+                != (ship.expected_visit, ship.expected_harbour)
+            ]
+            for ship in ships:
+                ship.current_visit_id = ship.expected_visit
+                ship.current_harbour_id = ship.expected_harbour
+            Ship.objects.using(using).bulk_update(ships, Ship.LOCATION_FIELDS)
+            ChangeLog.record_many(ships, ChangeLog.Action.UPDATE, using=using)
+        return len(ships)
+
+
+class Ship(VersionedModel):
+    """
+    current_visit and current_harbour locate the Ship: they point at its
+    latest Visit in progress (see Visit.objects.current()) and the Harbour
+    of that Visit, or are null while the Ship is at sea. They are derived
+    from the Visits and kept in sync in the transaction of every Visit
+    write (see Visit.save() and Visit.sync_ship_location()), so they are
+    never written through the Ship itself. A Visit written with a future
+    entry_time or exit_time only moves the Ship when the
+    sync_ship_locations command runs after that time, which also repairs
+    drift.
+    """
+
     id = models.BigAutoField(primary_key=True)
     # a Company may operate many Ships
     company = models.ForeignKey(to=Company, on_delete=models.CASCADE)
@@ -119,6 +359,11 @@ class Ship(models.Model):
     year_built = models.CharField(
         max_length=4, null=True, blank=True, validators=[validate_year_in_range]
     )
+    # integer copy of year_built, kept in sync on save() so ages can be
+    # filtered and sorted in SQL
+    year_built_int = models.PositiveSmallIntegerField(
+        null=True, blank=True, editable=False, db_index=True
+    )
 
     class ShipType(models.TextChoices):
         BULK_CARRIER = "bulk carrier", "Bulk Carrier"
@@ -128,8 +373,29 @@ class Ship(models.Model):
         CRUISE_SHIP = "cruise ship", "Cruise Ship"
 
     type = models.CharField(
-        max_length=256, choices=ShipType.choices, null=True, blank=True
+        max_length=256, choices=ShipType.choices, null=True, blank=True, db_index=True
+    )
+    current_visit = models.ForeignKey(
+        to="Visit",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name="+",
     )
+    current_harbour = models.ForeignKey(
+        to=Harbour,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name="docked_ships",
+    )
+
+    # columns derived from the Visits, never written by Ship.save()
+    LOCATION_FIELDS = ("current_visit", "current_harbour")
+
+    objects = ShipQuerySet.as_manager()
 
     class Meta:
         db_table = "SHIP"
@@ -146,8 +412,42 @@ class Ship(models.Model):
         if not self.year_built:
             return None
         year_built = int(self.year_built)
-        current_year = datetime.now(tz=get_current_timezone()).year
-        return current_year - year_built
+        return clock.now().year - year_built
+
+    def clean(self):
+        """
+        Override of clean() to derive year_built_int from year_built.
+        Called by bulk loaders that skip save().
+        """
+        if self.year_built and self.year_built.isdigit():
+            self.year_built_int = int(self.year_built)
+        else:
+            self.year_built_int = None
+
+    def save(self, *args, **kwargs):
+        self.clean()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "year_built" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "year_built_int"}
+        elif update_fields is None and not self._state.adding:
+            # an edit of the Ship must not overwrite a location written by a
+            # concurrent Visit write since this instance was loaded
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.LOCATION_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+    def save_base(self, *args, **kwargs):
+        super().save_base(*args, **kwargs)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and set(self.LOCATION_FIELDS).isdisjoint(
+            update_fields
+        ):
+            # the row is locked by the UPDATE: read the location it holds, so
+            # that the ChangeLog entry does not record a stale one
+            self.refresh_from_db(using=self._state.db, fields=self.LOCATION_FIELDS)
 
     def __str__(self):
         return f"Ship: {self.name}"
@@ -166,38 +466,274 @@ class ShipAdmin(admin.ModelAdmin):
         "year_built",
         "type",
         "company",
+        "current_harbour",
     )
+    list_select_related = ("company", "current_harbour")
+    list_filter = ("type",)
+    raw_id_fields = ("company",)
+    paginator = EstimatedCountPaginator
+    # skips the extra unfiltered COUNT(*) shown next to filtered results
+    show_full_result_count = False
 
     # enables seach on the Admin portal
     search_fields = ["name", "tonnage", "flag", "type", "company__name"]
 
 
 # Visit
-class Visit(models.Model):
+class VisitQuerySet(models.QuerySet):
+    def open_at(self, at=None):
+        """
+        Filters the open Visits that started by a given time. exit_time IS
+        NULL is a top-level condition, so a filter on the Harbour is read
+        from the visit_open_harbour_idx partial index.
+
+        Args:
+            at (datetime | None): defaults to vtso.clock.now()
+
+        Returns:
+            QuerySet[Visit]
+        """
+        at = at or clock.now()
+        return self.filter(exit_time__isnull=True, entry_time__lte=at)
+
+    def closing_after(self, at=None):
+        """
+        Filters the closed Visits in progress at a given time. Their ids are
+        read from visit_exit_time_idx, which bounds the read by the Visits
+        ending after at rather than the history of the Harbour or Ship.
+
+        Args:
+            at (datetime | None): defaults to vtso.clock.now()
+
+        Returns:
+            QuerySet[Visit]
+        """
+        at = at or clock.now()
+        ids = self.model._base_manager.filter(exit_time__gte=at, entry_time__lte=at)
+        return self.filter(pk__in=ids.values("pk"))
+
+    def current(self, at=None):
+        """
+        Combines open_at() and closing_after() into the Visits in progress
+        at a given time. The result is a UNION ALL, which cannot be filtered
+        further: filter the queryset before calling current(), e.g.
+        Visit.objects.filter(harbour=harbour).current().
+
+        Args:
+            at (datetime | None): defaults to vtso.clock.now()
+
+        Returns:
+            QuerySet[Visit]
+        """
+        at = at or clock.now()
+        return self.open_at(at).union(self.closing_after(at), all=True)
+
+
+class Visit(VersionedModel):
     """
     Each Visit entry contains a record of
     when a particular Ship arrived and exited a particular Harbour.
-    Assumption: entry_time and exit_time are known when inputting the data.
+    A Visit without exit_time is open: the Ship is still in the Harbour
+    and its departure is not known yet (see POST /vtso/visits/<pk>/close/).
     """
 
     id = models.BigAutoField(primary_key=True)
     ship = models.ForeignKey(to=Ship, on_delete=models.CASCADE)
     harbour = models.ForeignKey(to=Harbour, on_delete=models.CASCADE)
-    entry_time = models.DateTimeField(null=True, blank=True)
+    entry_time = models.DateTimeField(null=True, blank=True, db_index=True)
     exit_time = models.DateTimeField(null=True, blank=True)
+    # when the Visit was recorded as closed, or its exit_time if that is
+    # later: orders the ended Visits for vtso.forecast.learn_dwell_times()
+    closed_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = VisitQuerySet.as_manager()
+
+    # fields that can change where its Ship is
+    LOCATION_FIELDS = {
+        "ship",
+        "ship_id",
+        "harbour",
+        "harbour_id",
+        "entry_time",
+        "exit_time",
+    }
 
     class Meta:
         db_table = "VISIT"
+        indexes = [
+            # "visits at harbour X during a time range"
+            models.Index(
+                fields=["harbour", "entry_time"], name="visit_harbour_entry_idx"
+            ),
+            # "visits of ship X during a time range"
+            models.Index(fields=["ship", "entry_time"], name="visit_ship_entry_idx"),
+            models.Index(fields=["exit_time"], name="visit_exit_time_idx"),
+            # "ships still in harbour X", only holds the open Visits
+            models.Index(
+                fields=["harbour", "entry_time"],
+                condition=models.Q(exit_time__isnull=True),
+                name="visit_open_harbour_idx",
+            ),
+            models.Index(fields=["closed_at"], name="visit_closed_at_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remembered so that moving a Visit to another Ship updates both
+        instance._loaded_ship_id = instance.__dict__.get("ship_id")
+        return instance
+
+    @property
+    def is_open(self) -> bool:
+        return self.exit_time is None
+
+    def stamp_closed_at(self):
+        """
+        Sets closed_at when the Visit gets an exit_time, to the current time
+        or to the exit_time if it is in the future, and clears it when the
+        Visit is reopened.
+        """
+        if self.exit_time is None:
+            self.closed_at = None
+        elif self.closed_at is None:
+            exit_time = self._meta.get_field("exit_time").to_python(self.exit_time)
+            if timezone.is_naive(exit_time):
+                exit_time = timezone.make_aware(exit_time)
+            self.closed_at = max(timezone.now(), exit_time)
+
+    def save(self, *args, **kwargs):
+        self.stamp_closed_at()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "exit_time" in update_fields:
+            update_fields = kwargs["update_fields"] = {*update_fields, "closed_at"}
+        if update_fields is not None and not self.LOCATION_FIELDS & set(update_fields):
+            super().save(*args, **kwargs)
+            return
+
+        using = kwargs.get("using") or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+            ship_ids = {self.ship_id, getattr(self, "_loaded_ship_id", None)}
+            Ship.objects.using(using).filter(pk__in=ship_ids - {None}).sync_location()
+            self._loaded_ship_id = self.ship_id
+
+    @staticmethod
+    def collect_ship_location(sender, instance, origin=None, **kwargs):
+        """
+        pre_delete receiver of Visit, connected in VtsoConfig.ready().
+        Gathers the Ships of all the Visits removed by one delete() call,
+        cascades included, so that sync_ship_location() syncs them at once.
+        """
+        if origin is not None:
+            _deleted_visit_ships.setdefault(id(origin), set()).add(instance.ship_id)
+
+    @staticmethod
+    def sync_ship_location(sender, instance, using, origin=None, **kwargs):
+        """
+        post_delete receiver of Visit, connected in VtsoConfig.ready().
+        Only the Visit a Ship points at can move it, and the delete already
+        set that pointer to null with ON DELETE SET NULL, leaving
+        current_harbour behind: only such a Ship is synced. The Ships
+        gathered by collect_ship_location() are synced by the first
+        post_delete of the delete() call, the following ones have nothing
+        left to do.
+        """
+        if origin is None:
+            ship_ids = {instance.ship_id}
+        else:
+            ship_ids = _deleted_visit_ships.pop(id(origin), set())
+        if not ship_ids:
+            return
+        Ship.objects.using(using).filter(
+            pk__in=ship_ids,
+            current_visit__isnull=True,
+            current_harbour__isnull=False,
+        ).sync_location()
 
     def clean(self):
         """
-        Override of clean() to validate that exit_time happens after entry_time.
+        Override of clean() to validate that exit_time happens after entry_time,
+        and to stamp closed_at for the bulk loaders that skip save().
 
         Raises:
             ValidationError
         """
         if self.entry_time and self.exit_time and self.exit_time < self.entry_time:
             raise ValidationError("Exit time cannot be before entry time.")
+        self.stamp_closed_at()
+
+
+# {id(origin of a delete() call): ids of the Ships of its deleted Visits}
+_deleted_visit_ships: dict[int, set[int]] = {}
+
+
+# ArchivedVisit
+class ArchivedVisit(models.Model):
+    """
+    Cold storage for Visits that ended before the archive horizon
+    (see vtso/archive.py). Rows keep the id they had in VISIT so
+    archived and hot Visits can be merged in id order.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    ship = models.ForeignKey(to=Ship, on_delete=models.CASCADE)
+    harbour = models.ForeignKey(to=Harbour, on_delete=models.CASCADE)
+    entry_time = models.DateTimeField(null=True, blank=True, db_index=True)
+    exit_time = models.DateTimeField(null=True, blank=True)
+    version = models.PositiveIntegerField(default=1, editable=False)
+    closed_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        db_table = "VISIT_ARCHIVE"
+        indexes = [
+            models.Index(fields=["ship", "entry_time"], name="archive_ship_entry_idx"),
+        ]
+
+
+# DwellHistogram
+class DwellHistogram(models.Model):
+    """
+    Distribution of how long Ships of a type stay at a Harbour, learned from
+    the closed Visits by vtso.forecast.learn_dwell_times(). counts[h] is the
+    number of Visits that lasted h hours (rounded down); the last bin holds
+    every Visit of VTSO_DWELL_MAX_HOURS or more.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    harbour = models.ForeignKey(to=Harbour, on_delete=models.CASCADE)
+    # "" for Ships without a type
+    ship_type = models.CharField(max_length=256, blank=True)
+    counts = models.JSONField(default=list)
+    total = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = "DWELL_HISTOGRAM"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["harbour", "ship_type"], name="dwell_harbour_type_unique"
+            )
+        ]
+
+
+class DwellWatermark(models.Model):
+    """
+    Single row recording up to which Visit.closed_at the closed Visits have
+    been learned into the DwellHistograms.
+    """
+
+    id = models.PositiveSmallIntegerField(primary_key=True, default=1)
+    learned_until = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "DWELL_WATERMARK"
+
+
+class DwellHistogramAdmin(admin.ModelAdmin):
+    list_display = ("harbour", "ship_type", "total")
+    list_select_related = ("harbour",)
+    list_filter = ("ship_type",)
+    raw_id_fields = ("harbour",)
 
 
 class VisitAdmin(admin.ModelAdmin):
@@ -207,6 +743,185 @@ class VisitAdmin(admin.ModelAdmin):
         "entry_time",
         "exit_time",
     )
+    list_select_related = ("ship", "harbour")
+    list_filter = ("harbour",)
+    raw_id_fields = ("ship", "harbour")
+    date_hierarchy = "entry_time"
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     # enables seach on the Admin portal
     search_fields = ["ship__name", "harbour__name", "entry_time", "exit_time"]
+
+
+class ArchivedVisitAdmin(VisitAdmin):
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+# IdempotencyKey
+class IdempotencyKeyQuerySet(models.QuerySet):
+    def claim(self, user, key: str, fingerprint: str, ttl: float):
+        """
+        Looks up the Idempotency-Key of a user, or records it if it is new
+        or expired. Must be called in the transaction that performs the
+        request, so a failed request releases its key. A concurrent request
+        with the same key waits on the unique index until the first one
+        commits, then finds its key.
+
+        Returns:
+            tuple[IdempotencyKey, bool]: the key and whether it was recorded
+        """
+        now = clock.now()
+        record = self.filter(user=user, key=key).first()
+        if record is not None and record.expires_at > now:
+            return record, False
+        if record is not None:
+            record.delete()
+        try:
+            with transaction.atomic(using=self.db):
+                record = self.create(
+                    user=user,
+                    key=key,
+                    fingerprint=fingerprint,
+                    expires_at=now + timedelta(seconds=ttl),
+                )
+        except IntegrityError:
+            return self.get(user=user, key=key), False
+        return record, True
+
+
+class IdempotencyKey(models.Model):
+    """
+    Response of a POST request sent with an Idempotency-Key header, replayed
+    when the request is retried with the same key instead of creating the
+    object again. The key is recorded in the transaction of the request, so
+    only successful requests keep it. Rows expire after
+    VTSO_IDEMPOTENCY_KEY_TTL seconds and are deleted by the
+    prune_idempotency_keys command.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(to=User, on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    # sha256 of the method, path and body of the request
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    objects = IdempotencyKeyQuerySet.as_manager()
+
+    class Meta:
+        db_table = "IDEMPOTENCY_KEY"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "key"], name="idempotency_user_key_unique"
+            )
+        ]
+
+    def store(self, status_code: int, response):
+        self.status_code = status_code
+        self.response = response
+        self.save(update_fields=["status_code", "response"])
+
+
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ("key", "user", "status_code", "created_at", "expires_at")
+    list_select_related = ("user",)
+    raw_id_fields = ("user",)
+    search_fields = ["key"]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+# AccessToken
+class AccessToken(models.Model):
+    """
+    Expiring API token, sent as "Authorization: Bearer <token>".
+
+    Only the sha256 digest of a token is stored, so a leaked table does not
+    leak usable tokens. Tokens are random enough for a fast hash to be safe,
+    unlike passwords. The first PREFIX_LENGTH characters of a token are
+    stored in clear and looked up through a unique index, then the digests
+    are compared in constant time (see vtso.authentication).
+    """
+
+    PREFIX_LENGTH = 12
+
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(to=User, on_delete=models.CASCADE)
+    prefix = models.CharField(max_length=PREFIX_LENGTH, unique=True)
+    digest = models.CharField(max_length=64)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        db_table = "ACCESS_TOKEN"
+
+    @staticmethod
+    def hash(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    @classmethod
+    def issue(cls, user, ttl: float | None = None):
+        """
+        Creates a token for a user, valid for ttl seconds
+        (VTSO_TOKEN_TTL by default).
+
+        Returns:
+            tuple[AccessToken, str]: the stored token and the token itself,
+            which cannot be recovered later
+        """
+        if ttl is None:
+            ttl = getattr(settings, "VTSO_TOKEN_TTL", 86_400)
+        expires_at = clock.now() + timedelta(seconds=ttl)
+        while True:
+            token = secrets.token_hex(cls.PREFIX_LENGTH // 2) + secrets.token_urlsafe(
+                32
+            )
+            try:
+                with transaction.atomic():
+                    access_token = cls.objects.create(
+                        user=user,
+                        prefix=token[: cls.PREFIX_LENGTH],
+                        digest=cls.hash(token),
+                        expires_at=expires_at,
+                    )
+            except IntegrityError:
+                # prefix collision, draw another token
+                continue
+            return access_token, token
+
+    def matches(self, token: str) -> bool:
+        return hmac.compare_digest(self.digest, self.hash(token))
+
+    @property
+    def is_expired(self) -> bool:
+        return self.expires_at <= clock.now()
+
+
+class AccessTokenAdmin(admin.ModelAdmin):
+    list_display = ("prefix", "user", "created_at", "expires_at")
+    list_select_related = ("user",)
+    raw_id_fields = ("user",)
+    search_fields = ["prefix", "user__username"]
+    exclude = ("digest",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,60 @@
+"""
+Read-replica routing.
+
+Reads issued while serving a safe (GET/HEAD/OPTIONS) request go to one of
+the VTSO_READ_REPLICAS database aliases; everything else uses "default".
+ReplicaRoutingMiddleware decides per request, and keeps a client on the
+primary for VTSO_REPLICA_STICKY_SECONDS after it writes so it always reads
+its own writes even when the replicas lag behind.
+"""
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# reads only go to a replica when a request explicitly allows it, so
+# management commands, shells and tests read from the primary
+_replica_reads_allowed: ContextVar[bool] = ContextVar(
+    "vtso_replica_reads_allowed", default=False
+)
+
+
+@contextmanager
+def replica_reads(allowed: bool = True):
+    """
+    Allows (or forbids) routing reads to a replica for the duration of the block.
+    """
+    token = _replica_reads_allowed.set(allowed)
+    try:
+        yield
+    finally:
+        _replica_reads_allowed.reset(token)
+
+
+class ReadReplicaRouter:
+    """
+    Database router sending reads to a random replica when allowed,
+    and all writes and migrations to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, "VTSO_READ_REPLICAS", [])
+        if not replicas or not _replica_reads_allowed.get():
+            return DEFAULT_DB_ALIAS
+        # reads inside a transaction must see its uncommitted writes
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold copies of the primary, so objects may be related
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in getattr(settings, "VTSO_READ_REPLICAS", [])
@@ -1,10 +1,7 @@
-from datetime import datetime
-
-from django.utils.timezone import get_current_timezone
 from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 
-from vtso.models import Company, Harbour, Person, Ship, Visit
+from vtso.models import ChangeLog, Company, Harbour, Person, Ship, Visit
 
 
 class CompanySerializer(serializers.ModelSerializer):
@@ -13,6 +10,52 @@ class CompanySerializer(serializers.ModelSerializer):
         fields = ["id", "name"]
 
 
+class CompanySummarySerializer(CompanySerializer):
+    """
+    Used on GET /companies/<pk>/ and GET /companies/?summary=true.
+    The figures are read from the "summaries" context key, as computed
+    by vtso.analytics.company_summaries().
+    """
+
+    ship_count = serializers.SerializerMethodField()
+    total_tonnage = serializers.SerializerMethodField()
+    ship_types = serializers.SerializerMethodField()
+    person_count = serializers.SerializerMethodField()
+    active_visits = serializers.SerializerMethodField()
+
+    class Meta(CompanySerializer.Meta):
+        fields = CompanySerializer.Meta.fields + [
+            "ship_count",
+            "total_tonnage",
+            "ship_types",
+            "person_count",
+            "active_visits",
+        ]
+
+    def summary(self, obj) -> dict:
+        return self.context["summaries"][obj.id]
+
+    def get_ship_count(self, obj) -> int:
+        return self.summary(obj)["ship_count"]
+
+    def get_total_tonnage(self, obj) -> int:
+        return self.summary(obj)["total_tonnage"]
+
+    @extend_schema_field(
+        serializers.DictField(
+            child=serializers.IntegerField(), help_text="Number of Ships per type."
+        )
+    )
+    def get_ship_types(self, obj):
+        return self.summary(obj)["ship_types"]
+
+    def get_person_count(self, obj) -> int:
+        return self.summary(obj)["person_count"]
+
+    def get_active_visits(self, obj) -> int:
+        return self.summary(obj)["active_visits"]
+
+
 class PersonSerializer(serializers.ModelSerializer):
     company = serializers.PrimaryKeyRelatedField(queryset=Company.objects.all())
 
@@ -28,7 +71,7 @@ class ShipSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Ship
-        fields = "__all__"
+        exclude = ["year_built_int"]
 
     def get_age(self, obj: Ship) -> int | None:
         """
@@ -65,7 +108,15 @@ class HarbourListSerializer(serializers.ModelSerializer):
 class HarbourCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Harbour
-        fields = ["id", "name", "max_berth_depth", "harbour_master", "city", "country"]
+        fields = [
+            "id",
+            "name",
+            "max_berth_depth",
+            "harbour_master",
+            "city",
+            "country",
+            "berths",
+        ]
 
 
 class HarbourDetailsSerializer(serializers.ModelSerializer):
@@ -82,6 +133,7 @@ class HarbourDetailsSerializer(serializers.ModelSerializer):
             "harbour_master",
             "city",
             "country",
+            "berths",
             "current_ships",
         ]
 
@@ -91,17 +143,24 @@ class HarbourDetailsSerializer(serializers.ModelSerializer):
     def get_current_ships(self, obj):
         """
         Computes the Ships currently docked at the harbour.
+        Callers that already fetched them (e.g. the async views) can pass
+        a {harbour id: [Ship]} mapping as the "current_ships" context key,
+        and the Ships already serialized as a {ship id: dict} mapping as
+        the "ship_data" context key.
+
         Args:
             obj (Harbour): Harbour being processed by HarbourDetailView
 
         Returns:
             list[dict]: list of serialized Ship objects
         """
-        current_time = datetime.now(tz=get_current_timezone())
-        logs = Visit.objects.filter(
-            harbour=obj, entry_time__lte=current_time, exit_time__gte=current_time
-        ).select_related("ship")
-        ships = [log.ship for log in logs]
+        if "current_ships" in self.context:
+            ships = self.context["current_ships"].get(obj.id, [])
+        else:
+            logs = Visit.objects.filter(harbour=obj).select_related("ship").current()
+            ships = [log.ship for log in logs]
+        if "ship_data" in self.context:
+            return [self.context["ship_data"][ship.id] for ship in ships]
         return ShipSerializer(ships, many=True).data
 
 
@@ -128,3 +187,116 @@ class VisitSerializer(serializers.ModelSerializer):
         instance = Visit(**data)
         instance.clean()
         return data
+
+
+class VisitCloseSerializer(serializers.Serializer):
+    """
+    Used on POST /visits/<pk>/close/.
+    """
+
+    exit_time = serializers.DateTimeField(
+        required=False, help_text="When the Ship left. Defaults to now."
+    )
+
+
+class ChangeLogSerializer(serializers.ModelSerializer):
+    """
+    Used on GET /changes/.
+    """
+
+    class Meta:
+        model = ChangeLog
+        fields = ["seq", "model", "object_id", "action", "payload", "created_at"]
+
+
+class OccupancyBucketSerializer(serializers.Serializer):
+    """
+    Used on GET /harbours/<pk>/occupancy/.
+    """
+
+    start = serializers.DateTimeField()
+    end = serializers.DateTimeField()
+    peak = serializers.IntegerField(help_text="Most ships at the Harbour at once.")
+    average = serializers.FloatField(
+        help_text="Time weighted average number of ships at the Harbour."
+    )
+
+
+class PortCallSerializer(serializers.Serializer):
+    """
+    Used on GET /ships/<pk>/itinerary/. Serializes the port calls
+    annotated by vtso.analytics.ship_itinerary().
+    """
+
+    id = serializers.IntegerField()
+    harbour = serializers.IntegerField(source="harbour_id")
+    harbour_name = serializers.CharField(source="harbour.name")
+    entry_time = serializers.DateTimeField()
+    exit_time = serializers.DateTimeField()
+    time_in_port = serializers.SerializerMethodField()
+    previous_harbour = serializers.IntegerField(source="previous_harbour_id")
+    previous_harbour_name = serializers.CharField()
+    time_at_sea_before = serializers.SerializerMethodField()
+    next_harbour = serializers.IntegerField(source="next_harbour_id")
+    next_harbour_name = serializers.CharField()
+    time_at_sea_after = serializers.SerializerMethodField()
+
+    @staticmethod
+    def elapsed(start, end):
+        if start is None or end is None:
+            return None
+        return serializers.DurationField().to_representation(end - start)
+
+    @extend_schema_field(serializers.DurationField(allow_null=True))
+    def get_time_in_port(self, obj):
+        return self.elapsed(obj.entry_time, obj.exit_time)
+
+    @extend_schema_field(serializers.DurationField(allow_null=True))
+    def get_time_at_sea_before(self, obj):
+        return self.elapsed(obj.previous_exit_time, obj.entry_time)
+
+    @extend_schema_field(serializers.DurationField(allow_null=True))
+    def get_time_at_sea_after(self, obj):
+        return self.elapsed(obj.exit_time, obj.next_entry_time)
+
+
+class OdPairSerializer(serializers.Serializer):
+    """
+    Used on GET /harbours/od-matrix/. Serializes the pairs computed by
+    vtso.analytics.od_matrix().
+    """
+
+    from_harbour = serializers.IntegerField()
+    from_harbour_name = serializers.CharField(allow_null=True)
+    to_harbour = serializers.IntegerField()
+    to_harbour_name = serializers.CharField(allow_null=True)
+    count = serializers.IntegerField(help_text="Number of passages.")
+    median_passage = serializers.DurationField(
+        allow_null=True, help_text="Median time at sea between the two Harbours."
+    )
+
+
+class BerthForecastSerializer(serializers.Serializer):
+    """
+    Used on GET /harbours/<pk>/forecast/.
+    """
+
+    time = serializers.DateTimeField()
+    expected_occupied = serializers.FloatField(
+        help_text="Expected number of ships at the Harbour."
+    )
+    expected_free = serializers.FloatField(
+        allow_null=True,
+        help_text="Expected number of free berths, null if berths is unknown.",
+    )
+
+
+class AccessTokenSerializer(serializers.Serializer):
+    """
+    Used on POST /tokens/ and POST /tokens/refresh/.
+    """
+
+    token = serializers.CharField(
+        help_text='Send as "Authorization: Bearer <token>". It is only shown once.'
+    )
+    expires_at = serializers.DateTimeField()
@@ -0,0 +1,132 @@
+from unittest.mock import patch
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from vtso.models import User, Visit
+from vtso.paginators import EstimatedCountPaginator, estimate_row_count
+from vtso.tests.factories import VisitFactory
+
+
+@pytest.mark.django_db
+class TestVisitAdmin:
+    """
+    Unit tests for the Visit changelist on the Admin portal.
+    """
+
+    @pytest.fixture
+    def admin_client_logged_in(self, client):
+        user = User.objects.create_superuser(username="admin", password="admin")
+        client.force_login(user)
+        return client
+
+    def test_visit_changelist_query_count_does_not_grow_with_rows(
+        self, admin_client_logged_in
+    ):
+        """
+        The changelist should join Ship and Harbour instead of
+        running one query per row per foreign key.
+        """
+        # Arrange
+        url = reverse("admin:vtso_visit_changelist")
+        VisitFactory.create_batch(2)
+        with CaptureQueriesContext(connection) as few_rows:
+            admin_client_logged_in.get(url)
+        VisitFactory.create_batch(10)
+
+        # Act
+        with CaptureQueriesContext(connection) as many_rows:
+            response = admin_client_logged_in.get(url)
+
+        # Assert
+        assert response.status_code == 200
+        assert len(many_rows) == len(few_rows)
+
+
+@pytest.mark.django_db
+class TestEstimatedCountPaginator:
+    """
+    Unit tests for EstimatedCountPaginator.
+    """
+
+    def test_exact_count_without_statistics(self):
+        # Arrange
+        VisitFactory.create_batch(3)
+        paginator = EstimatedCountPaginator(Visit.objects.order_by("-id"), 100)
+
+        # Act and Assert
+        assert estimate_row_count(Visit) is None
+        assert paginator.count == 3
+
+    def test_estimate_ignores_partial_indexes(self):
+        """
+        The estimate is the table size, not the size of a partial index
+        such as visit_open_harbour_idx.
+        """
+        if connection.vendor != "sqlite":
+            pytest.skip("sqlite_stat1 is SQLite specific")
+
+        # Arrange
+        VisitFactory.create_batch(5)
+        VisitFactory(exit_time=None)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+            # put the partial index first, as ANALYZE may write it
+            cursor.execute(
+                "SELECT tbl, idx, stat FROM sqlite_stat1 WHERE tbl = %s "
+                "ORDER BY idx != 'visit_open_harbour_idx'",
+                [Visit._meta.db_table],
+            )
+            stats = cursor.fetchall()
+            cursor.execute(
+                "DELETE FROM sqlite_stat1 WHERE tbl = %s", [Visit._meta.db_table]
+            )
+            cursor.executemany("INSERT INTO sqlite_stat1 VALUES (%s, %s, %s)", stats)
+
+        # Act
+        estimate = estimate_row_count(Visit)
+
+        # Assert
+        assert estimate == 6
+
+    @pytest.mark.parametrize(
+        "estimate, threshold, expected_count, test_id",
+        [
+            (5_000_000, 100_000, 5_000_000, "large_table_uses_estimate"),
+            (50, 100_000, 3, "small_table_uses_exact_count"),
+        ],
+    )
+    def test_unfiltered_count(
+        self, settings, estimate, threshold, expected_count, test_id
+    ):
+        # Arrange
+        settings.VTSO_ADMIN_ESTIMATED_COUNT_THRESHOLD = threshold
+        VisitFactory.create_batch(3)
+        paginator = EstimatedCountPaginator(Visit.objects.order_by("-id"), 100)
+
+        # Act
+        with patch("vtso.paginators.estimate_row_count", return_value=estimate):
+            count = paginator.count
+
+        # Assert
+        assert count == expected_count, f"Test ID {test_id}"
+
+    def test_filtered_queryset_uses_exact_count(self, settings):
+        # Arrange
+        settings.VTSO_ADMIN_ESTIMATED_COUNT_THRESHOLD = 0
+        visit = VisitFactory()
+        VisitFactory.create_batch(2)
+        queryset = Visit.objects.filter(harbour=visit.harbour).order_by("-id")
+        paginator = EstimatedCountPaginator(queryset, 100)
+
+        # Act
+        with patch(
+            "vtso.paginators.estimate_row_count", return_value=5_000_000
+        ) as estimate:
+            count = paginator.count
+
+        # Assert
+        assert count == 1
+        estimate.assert_not_called()
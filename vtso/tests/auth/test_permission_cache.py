@@ -0,0 +1,116 @@
+import pytest
+from django.contrib.auth.models import Group, Permission
+
+from vtso.models import User
+
+
+@pytest.mark.django_db
+class TestCachedModelBackend:
+    """
+    Unit tests for vtso.backends.CachedModelBackend.
+    Invalidations run on commit, hence django_capture_on_commit_callbacks.
+    """
+
+    @pytest.fixture
+    def user(self):
+        return User.objects.create(username="operator")
+
+    @pytest.fixture
+    def change_ship(self):
+        return Permission.objects.get(codename="change_ship")
+
+    @staticmethod
+    def fresh(user):
+        """
+        Loads the user again, as the next request would.
+        """
+        return User.objects.get(pk=user.pk)
+
+    def test_permissions_are_cached(self, user, change_ship, django_assert_num_queries):
+        # Arrange
+        user.user_permissions.add(change_ship)
+        self.fresh(user).has_perm("vtso.change_ship")
+        user = self.fresh(user)
+
+        # Act
+        with django_assert_num_queries(0):
+            allowed = user.has_perm("vtso.change_ship")
+
+        # Assert
+        assert allowed is True
+
+    def test_user_permission_added(
+        self, user, change_ship, django_capture_on_commit_callbacks
+    ):
+        # Arrange
+        assert not self.fresh(user).has_perm("vtso.change_ship")
+
+        # Act
+        with django_capture_on_commit_callbacks(execute=True):
+            user.user_permissions.add(change_ship)
+
+        # Assert
+        assert self.fresh(user).has_perm("vtso.change_ship")
+
+    @pytest.mark.parametrize(
+        "side, test_id", [("user", "from_user"), ("group", "from_group")]
+    )
+    def test_user_joins_group(
+        self, user, change_ship, django_capture_on_commit_callbacks, side, test_id
+    ):
+        # Arrange
+        group = Group.objects.create(name="operators")
+        group.permissions.add(change_ship)
+        assert not self.fresh(user).has_perm("vtso.change_ship")
+
+        # Act
+        with django_capture_on_commit_callbacks(execute=True):
+            if side == "user":
+                user.groups.add(group)
+            else:
+                group.user_set.add(user)
+
+        # Assert
+        assert self.fresh(user).has_perm("vtso.change_ship"), test_id
+
+    def test_group_permission_removed(
+        self, user, change_ship, django_capture_on_commit_callbacks
+    ):
+        # Arrange
+        group = Group.objects.create(name="operators")
+        with django_capture_on_commit_callbacks(execute=True):
+            group.permissions.add(change_ship)
+            user.groups.add(group)
+        assert self.fresh(user).has_perm("vtso.change_ship")
+
+        # Act
+        with django_capture_on_commit_callbacks(execute=True):
+            group.permissions.remove(change_ship)
+
+        # Assert
+        assert not self.fresh(user).has_perm("vtso.change_ship")
+
+    def test_group_deleted(self, user, change_ship, django_capture_on_commit_callbacks):
+        # Arrange
+        group = Group.objects.create(name="operators")
+        with django_capture_on_commit_callbacks(execute=True):
+            group.permissions.add(change_ship)
+            user.groups.add(group)
+        assert self.fresh(user).has_perm("vtso.change_ship")
+
+        # Act
+        with django_capture_on_commit_callbacks(execute=True):
+            group.delete()
+
+        # Assert
+        assert not self.fresh(user).has_perm("vtso.change_ship")
+
+    def test_superuser_flag(self, user):
+        # Arrange
+        assert not self.fresh(user).has_perm("vtso.change_ship")
+
+        # Act
+        User.objects.filter(pk=user.pk).update(is_superuser=True)
+
+        # Assert
+        assert "vtso.change_ship" in self.fresh(user).get_all_permissions()
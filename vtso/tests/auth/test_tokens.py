@@ -0,0 +1,163 @@
+from datetime import timedelta
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from vtso import clock
+from vtso.authentication import ExpiringTokenAuthentication
+from vtso.models import AccessToken, User
+
+
+@pytest.mark.django_db
+class TestAccessTokens:
+    """
+    Unit tests for the expiring tokens of /vtso/tokens/.
+    """
+
+    @pytest.fixture
+    def user(self):
+        user = User(username="operator")
+        user.set_password("s3cret-pass")
+        user.save()
+        return user
+
+    @staticmethod
+    def bearer(token: str) -> dict:
+        return {"HTTP_AUTHORIZATION": f"Bearer {token}"}
+
+    def test_create_token(self, user):
+        # Act
+        response = APIClient().post(
+            reverse("token_create"),
+            {"username": "operator", "password": "s3cret-pass"},
+        )
+
+        # Assert
+        assert response.status_code == status.HTTP_201_CREATED
+        token = response.data["token"]
+        access_token = AccessToken.objects.get()
+        assert access_token.user == user
+        assert access_token.prefix == token[: AccessToken.PREFIX_LENGTH]
+        # only the digest of the token is stored
+        assert token not in access_token.digest
+        assert access_token.matches(token)
+
+    def test_create_token_wrong_password(self, user):
+        # Act
+        response = APIClient().post(
+            reverse("token_create"), {"username": "operator", "password": "wrong"}
+        )
+
+        # Assert
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert not AccessToken.objects.exists()
+
+    def test_bearer_token_authenticates(self, user, django_assert_num_queries):
+        # Arrange
+        _, token = AccessToken.issue(user)
+
+        # Act
+        with django_assert_num_queries(2):
+            # the token lookup and the ship list
+            response = APIClient().get(reverse("ships"), **self.bearer(token))
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+
+    @pytest.mark.parametrize(
+        "tamper, test_id",
+        [
+            (lambda token: token[:-1] + ("A" if token[-1] != "A" else "B"), "secret"),
+            (lambda token: "0" * AccessToken.PREFIX_LENGTH, "unknown_prefix"),
+        ],
+    )
+    def test_invalid_token(self, user, tamper, test_id):
+        # Arrange
+        _, token = AccessToken.issue(user)
+
+        # Act
+        response = APIClient().get(reverse("ships"), **self.bearer(tamper(token)))
+
+        # Assert
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED, test_id
+
+    def test_expired_token(self, user):
+        # Arrange
+        _, token = AccessToken.issue(user, ttl=-1)
+
+        # Act
+        response = APIClient().get(reverse("ships"), **self.bearer(token))
+
+        # Assert
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+        assert response.data["detail"] == "Token has expired."
+
+    def test_refresh_token(self, user):
+        # Arrange
+        old, old_token = AccessToken.issue(user, ttl=60)
+        client = APIClient()
+
+        # Act
+        response = client.post(reverse("token_refresh"), **self.bearer(old_token))
+
+        # Assert
+        assert response.status_code == status.HTTP_201_CREATED
+        new = AccessToken.objects.get()
+        assert new.pk != old.pk
+        assert new.expires_at > clock.now() + timedelta(seconds=60)
+        ships = reverse("ships")
+        assert client.get(ships, **self.bearer(old_token)).status_code == 401
+        assert (
+            client.get(ships, **self.bearer(response.data["token"])).status_code == 200
+        )
+
+    def test_refresh_token_once(self, user, monkeypatch):
+        """
+        A token refreshed by a concurrent request after this one was
+        authenticated is not refreshed twice.
+        """
+        # Arrange
+        _, token = AccessToken.issue(user, ttl=60)
+        authenticate = ExpiringTokenAuthentication.authenticate_credentials
+
+        def concurrent_refresh(self, key):
+            credentials = authenticate(self, key)
+            AccessToken.objects.filter(pk=credentials[1].pk).delete()
+            return credentials
+
+        monkeypatch.setattr(
+            ExpiringTokenAuthentication, "authenticate_credentials", concurrent_refresh
+        )
+
+        # Act
+        response = APIClient().post(reverse("token_refresh"), **self.bearer(token))
+
+        # Assert
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+        assert not AccessToken.objects.exists()
+
+    def test_refresh_expired_token(self, user):
+        # Arrange
+        _, token = AccessToken.issue(user, ttl=-1)
+
+        # Act
+        response = APIClient().post(reverse("token_refresh"), **self.bearer(token))
+
+        # Assert
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_async_bearer_token(self, user):
+        # Arrange
+        _, token = AccessToken.issue(user)
+
+        # Act
+        response = async_to_sync(AsyncClient().get)(
+            reverse("async_ships"), headers={"Authorization": f"Bearer {token}"}
+        )
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
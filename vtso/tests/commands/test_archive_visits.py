@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+
+import pytest
+from django.core.management import call_command
+from django.utils.timezone import get_current_timezone
+
+from vtso.archive import archive_batch
+from vtso.models import ArchivedVisit, Visit
+from vtso.tests.factories import VisitFactory
+
+
+@pytest.mark.django_db
+class TestArchiveVisits:
+    """
+    Unit tests for the archive_visits management command.
+    """
+
+    @pytest.fixture
+    def visits(self, settings):
+        settings.VTSO_VISIT_ARCHIVE_HORIZON_DAYS = 30
+        now = datetime.now(tz=get_current_timezone())
+        old = [
+            VisitFactory(
+                entry_time=now - timedelta(days=days + 1),
+                exit_time=now - timedelta(days=days),
+            )
+            for days in (400, 200, 31)
+        ]
+        recent = VisitFactory(
+            entry_time=now - timedelta(days=31), exit_time=now - timedelta(days=29)
+        )
+        return old, recent
+
+    def test_archive_visits(self, visits):
+        # Arrange
+        old, recent = visits
+
+        # Act
+        call_command("archive_visits", batch_size=2)
+
+        # Assert
+        assert list(Visit.objects.values_list("id", flat=True)) == [recent.id]
+        archived = ArchivedVisit.objects.order_by("id")
+        assert [visit.id for visit in archived] == [visit.id for visit in old]
+        assert archived[0].ship_id == old[0].ship_id
+        assert archived[0].exit_time == old[0].exit_time
+
+    def test_archive_visits_max_batches(self, visits):
+        """
+        --max-batches bounds a run; the next run continues where it stopped.
+        """
+        # Act
+        call_command("archive_visits", batch_size=1, max_batches=2)
+        archived_first_run = ArchivedVisit.objects.count()
+        call_command("archive_visits", batch_size=1)
+
+        # Assert
+        assert archived_first_run == 2
+        assert ArchivedVisit.objects.count() == 3
+        assert Visit.objects.count() == 1
+
+    @pytest.mark.parametrize("count", [10, 50])
+    def test_archive_batch_query_count(self, count, django_assert_max_num_queries):
+        """
+        Archiving does not run queries per Visit.
+        """
+        # Arrange
+        now = datetime.now(tz=get_current_timezone())
+        VisitFactory.create_batch(
+            count,
+            entry_time=now - timedelta(days=400),
+            exit_time=now - timedelta(days=399),
+        )
+
+        # Act
+        with django_assert_max_num_queries(8):
+            archived = archive_batch(now - timedelta(days=30), batch_size=count)
+
+        # Assert
+        assert archived == count
@@ -0,0 +1,149 @@
+import json
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from vtso.models import ChangeLog, Ship, Visit
+from vtso.tests.factories import CompanyFactory, HarbourFactory, ShipFactory
+
+
+@pytest.mark.django_db
+class TestImportVtso:
+    """
+    Unit tests for the import_vtso management command.
+    """
+
+    def test_import_ships_csv(self, tmp_path):
+        # Arrange
+        CompanyFactory(name="Roxxon")
+        path = tmp_path / "ships.csv"
+        path.write_text(
+            "company,name,tonnage,year_built,type\n"
+            "Roxxon,Sea Master,4000,2012,tanker\n"
+            "Roxxon,Titanic,,1912,cruise ship\n"
+        )
+
+        # Act
+        call_command("import_vtso", "ship", str(path), batch_size=1)
+
+        # Assert
+        assert Ship.objects.count() == 2
+        titanic = Ship.objects.get(name="Titanic")
+        assert titanic.company.name == "Roxxon"
+        assert titanic.tonnage is None
+        assert not path.with_name("ships.csv.checkpoint").exists()
+
+    def test_import_visits_ndjson(self, tmp_path):
+        # Arrange
+        ShipFactory(name="Sea Master")
+        HarbourFactory(name="Sydney Harbour")
+        path = tmp_path / "visits.ndjson"
+        path.write_text(
+            json.dumps(
+                {
+                    "ship": "Sea Master",
+                    "harbour": "Sydney Harbour",
+                    "entry_time": "2023-05-26T10:15:30Z",
+                    "exit_time": "2023-05-26T14:30:00Z",
+                }
+            )
+            + "\n"
+        )
+
+        # Act
+        call_command("import_vtso", "visit", str(path))
+
+        # Assert
+        visit = Visit.objects.get()
+        assert visit.ship.name == "Sea Master"
+        assert visit.harbour.name == "Sydney Harbour"
+        assert ChangeLog.objects.filter(
+            model="visit", object_id=visit.id, action=ChangeLog.Action.CREATE
+        ).exists()
+
+    def test_import_open_visits_locate_ships(self, tmp_path):
+        # Arrange
+        ship = ShipFactory(name="Sea Master")
+        harbour = HarbourFactory(name="Sydney Harbour")
+        path = tmp_path / "visits.csv"
+        path.write_text(
+            "ship,harbour,entry_time,exit_time\n"
+            "Sea Master,Sydney Harbour,2023-05-26T10:15:30Z,\n"
+        )
+
+        # Act
+        call_command("import_vtso", "visit", str(path))
+
+        # Assert
+        ship.refresh_from_db()
+        assert ship.current_visit == Visit.objects.get()
+        assert ship.current_harbour == harbour
+
+    @pytest.mark.parametrize(
+        "row, message, test_id",
+        [
+            ("Roxxon,Bad Year,abcd", "not a valid number", "error_invalid_year"),
+            ("Nobody,Orphan,2000", "unknown company", "error_unknown_company"),
+            ("Acme,Twin,2000", "ambiguous", "error_ambiguous_company"),
+        ],
+    )
+    def test_import_invalid_row(self, tmp_path, row, message, test_id):
+        # Arrange
+        CompanyFactory(name="Roxxon")
+        CompanyFactory.create_batch(2, name="Acme")
+        path = tmp_path / "ships.csv"
+        path.write_text(f"company,name,year_built\n{row}\n")
+
+        # Act and Assert
+        with pytest.raises(CommandError, match=message):
+            call_command("import_vtso", "ship", str(path))
+        assert Ship.objects.count() == 0, f"Test ID {test_id}"
+
+    def test_import_visit_exit_before_entry(self, tmp_path):
+        # Arrange
+        ShipFactory(name="Sea Master")
+        HarbourFactory(name="Sydney Harbour")
+        path = tmp_path / "visits.csv"
+        path.write_text(
+            "ship,harbour,entry_time,exit_time\n"
+            "Sea Master,Sydney Harbour,2023-05-26 10:00,2023-05-25 10:00\n"
+        )
+
+        # Act and Assert
+        with pytest.raises(CommandError, match="Exit time cannot be before"):
+            call_command("import_vtso", "visit", str(path))
+
+    def test_import_resumes_after_failure(self, tmp_path):
+        """
+        Chunks committed before a failure are kept and skipped on --resume.
+        """
+        # Arrange
+        CompanyFactory(name="Roxxon")
+        path = tmp_path / "ships.csv"
+        path.write_text(
+            "company,name,year_built\n"
+            "Roxxon,First,2001\n"
+            "Roxxon,Second,2002\n"
+            "Roxxon,Broken,abcd\n"
+        )
+        with pytest.raises(CommandError):
+            call_command("import_vtso", "ship", str(path), batch_size=1, chunk_size=1)
+        path.write_text(
+            "company,name,year_built\n"
+            "Roxxon,First,2001\n"
+            "Roxxon,Second,2002\n"
+            "Roxxon,Fixed,2003\n"
+        )
+
+        # Act
+        call_command(
+            "import_vtso", "ship", str(path), batch_size=1, chunk_size=1, resume=True
+        )
+
+        # Assert
+        assert list(Ship.objects.order_by("id").values_list("name", flat=True)) == [
+            "First",
+            "Second",
+            "Fixed",
+        ]
@@ -0,0 +1,130 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from django.core.management import call_command
+
+from vtso.archive import archive_batch
+from vtso.models import DwellHistogram, DwellWatermark
+from vtso.tests.factories import HarbourFactory, ShipFactory, VisitFactory
+
+
+@pytest.mark.django_db
+class TestLearnDwellTimes:
+    """
+    Unit tests for the learn_dwell_times management command.
+    """
+
+    @pytest.fixture(autouse=True)
+    def no_settle(self, settings):
+        settings.VTSO_DWELL_SETTLE_SECONDS = 0
+
+    @pytest.fixture
+    def harbour(self):
+        return HarbourFactory()
+
+    def visit(self, harbour, ship_type, hours, exit_days_ago):
+        exit_time = datetime.now(tz=timezone.utc) - timedelta(days=exit_days_ago)
+        return VisitFactory(
+            harbour=harbour,
+            ship=ShipFactory(type=ship_type),
+            entry_time=exit_time - timedelta(hours=hours),
+            exit_time=exit_time,
+        )
+
+    def test_learn_dwell_times(self, harbour):
+        # Arrange
+        self.visit(harbour, "tanker", hours=5, exit_days_ago=2)
+        self.visit(harbour, "tanker", hours=5.5, exit_days_ago=1)
+        self.visit(harbour, "fishing", hours=1000, exit_days_ago=1)
+        # still in port
+        self.visit(harbour, "tanker", hours=5, exit_days_ago=-1)
+
+        # Act
+        call_command("learn_dwell_times")
+
+        # Assert
+        tanker = DwellHistogram.objects.get(harbour=harbour, ship_type="tanker")
+        assert tanker.total == 2
+        assert tanker.counts[5] == 2
+        fishing = DwellHistogram.objects.get(harbour=harbour, ship_type="fishing")
+        # longer stays land in the last bin
+        assert fishing.counts[-1] == 1
+        assert DwellWatermark.objects.get().learned_until is not None
+
+    def test_learn_dwell_times_incrementally(self, harbour):
+        # Arrange
+        self.visit(harbour, "tanker", hours=5, exit_days_ago=2)
+        call_command("learn_dwell_times")
+        self.visit(harbour, "tanker", hours=3, exit_days_ago=0)
+
+        # Act
+        call_command("learn_dwell_times")
+        call_command("learn_dwell_times")
+
+        # Assert
+        tanker = DwellHistogram.objects.get(harbour=harbour, ship_type="tanker")
+        assert tanker.total == 2
+        assert (tanker.counts[3], tanker.counts[5]) == (1, 1)
+
+    def test_learn_dwell_times_rebuild(self, harbour):
+        # Arrange
+        visit = self.visit(harbour, "tanker", hours=5, exit_days_ago=2)
+        call_command("learn_dwell_times")
+        visit.exit_time = visit.entry_time + timedelta(hours=8)
+        visit.save()
+
+        # Act
+        call_command("learn_dwell_times", "--rebuild")
+
+        # Assert
+        tanker = DwellHistogram.objects.get(harbour=harbour, ship_type="tanker")
+        assert tanker.total == 1
+        assert tanker.counts[8] == 1
+
+    def test_learn_dwell_times_rebuild_reads_the_archive(self, harbour):
+        # Arrange
+        self.visit(harbour, "tanker", hours=4, exit_days_ago=400)
+        self.visit(harbour, "tanker", hours=6, exit_days_ago=2)
+        call_command("learn_dwell_times")
+        archive_batch(datetime.now(tz=timezone.utc) - timedelta(days=30), 10)
+
+        # Act
+        call_command("learn_dwell_times", "--rebuild")
+
+        # Assert
+        tanker = DwellHistogram.objects.get(harbour=harbour, ship_type="tanker")
+        assert tanker.total == 2
+        assert (tanker.counts[4], tanker.counts[6]) == (1, 1)
+
+    def test_learn_dwell_times_late_closures(self, harbour):
+        """
+        Visits closed or imported after a run with an exit_time before it
+        are learned by the next run.
+        """
+        # Arrange
+        open_visit = self.visit(harbour, "tanker", hours=5, exit_days_ago=2)
+        open_visit.exit_time = None
+        open_visit.save()
+        call_command("learn_dwell_times")
+        open_visit.exit_time = open_visit.entry_time + timedelta(hours=7)
+        open_visit.save(update_fields=["exit_time"])
+        self.visit(harbour, "tanker", hours=3, exit_days_ago=3)
+
+        # Act
+        call_command("learn_dwell_times")
+
+        # Assert
+        tanker = DwellHistogram.objects.get(harbour=harbour, ship_type="tanker")
+        assert tanker.total == 2
+        assert (tanker.counts[3], tanker.counts[7]) == (1, 1)
+
+    def test_learn_dwell_times_settles(self, harbour, settings):
+        # Arrange
+        settings.VTSO_DWELL_SETTLE_SECONDS = 60
+        self.visit(harbour, "tanker", hours=5, exit_days_ago=2)
+
+        # Act
+        call_command("learn_dwell_times")
+
+        # Assert
+        assert not DwellHistogram.objects.exists()
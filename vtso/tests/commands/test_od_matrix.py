@@ -0,0 +1,67 @@
+import csv
+import io
+import json
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from vtso.tests.factories import HarbourFactory, ShipFactory, VisitFactory
+
+
+@pytest.mark.django_db
+class TestOdMatrix:
+    """
+    Unit tests for the od_matrix management command.
+    """
+
+    @pytest.fixture
+    def passage(self):
+        ship = ShipFactory()
+        VisitFactory(
+            ship=ship,
+            harbour=HarbourFactory(name="Sydney"),
+            entry_time="2024-01-01T00:00:00Z",
+            exit_time="2024-01-02T00:00:00Z",
+        )
+        VisitFactory(
+            ship=ship,
+            harbour=HarbourFactory(name="Auckland"),
+            entry_time="2024-01-05T06:00:00Z",
+            exit_time="2024-01-06T00:00:00Z",
+        )
+
+    @pytest.mark.parametrize(
+        "output_format, test_id", [("csv", "csv_output"), ("json", "json_output")]
+    )
+    def test_od_matrix(self, passage, output_format, test_id):
+        # Arrange
+        out = io.StringIO()
+
+        # Act
+        call_command(
+            "od_matrix",
+            "--from=2024-01-01T00:00:00Z",
+            "--to=2024-02-01T00:00:00Z",
+            f"--format={output_format}",
+            stdout=out,
+        )
+
+        # Assert
+        if output_format == "csv":
+            rows = list(csv.DictReader(io.StringIO(out.getvalue())))
+        else:
+            rows = json.loads(out.getvalue())
+        assert len(rows) == 1, f"Test ID {test_id}"
+        assert rows[0]["from_harbour_name"] == "Sydney"
+        assert rows[0]["to_harbour_name"] == "Auckland"
+        assert int(rows[0]["count"]) == 1
+
+    def test_od_matrix_invalid_range(self):
+        # Act and Assert
+        with pytest.raises(CommandError, match="--from must be before --to"):
+            call_command(
+                "od_matrix",
+                "--from=2024-02-01T00:00:00Z",
+                "--to=2024-01-01T00:00:00Z",
+            )
@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+import pytest
+from django.core.management import call_command
+
+from vtso import clock
+from vtso.models import IdempotencyKey, User
+
+
+@pytest.mark.django_db
+class TestPruneIdempotencyKeys:
+    """
+    Unit tests for the prune_idempotency_keys management command.
+    """
+
+    def test_prune_idempotency_keys(self, capsys):
+        # Arrange
+        user = User.objects.create(username="test_user")
+        now = clock.now()
+        for key, expires_in in (("a", -60), ("b", -1), ("c", 60)):
+            IdempotencyKey.objects.create(
+                user=user,
+                key=key,
+                fingerprint="0" * 64,
+                expires_at=now + timedelta(seconds=expires_in),
+            )
+
+        # Act
+        call_command("prune_idempotency_keys", batch_size=1)
+
+        # Assert
+        assert list(IdempotencyKey.objects.values_list("key", flat=True)) == ["c"]
+        assert "Pruned 2 expired keys." in capsys.readouterr().out
@@ -0,0 +1,25 @@
+import pytest
+from django.core.management import call_command
+
+from vtso.models import AccessToken, User
+
+
+@pytest.mark.django_db
+class TestPruneTokens:
+    """
+    Unit tests for the prune_tokens management command.
+    """
+
+    def test_prune_tokens(self, capsys):
+        # Arrange
+        user = User.objects.create(username="test_user")
+        for ttl in (-60, -1):
+            AccessToken.issue(user, ttl=ttl)
+        valid, _ = AccessToken.issue(user, ttl=60)
+
+        # Act
+        call_command("prune_tokens", batch_size=1)
+
+        # Assert
+        assert list(AccessToken.objects.all()) == [valid]
+        assert "Pruned 2 expired tokens." in capsys.readouterr().out
@@ -0,0 +1,86 @@
+from datetime import timedelta
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+
+from vtso import clock
+from vtso.models import ChangeLog, Ship
+from vtso.tests.factories import VisitFactory
+
+
+@pytest.mark.django_db
+class TestSyncShipLocations:
+    """
+    Unit tests for the sync_ship_locations management command.
+    """
+
+    @pytest.fixture
+    def drifted(self):
+        """
+        Ships whose location columns were overwritten behind the ORM's back.
+        """
+        docked = VisitFactory(exit_time=None)
+        at_sea = VisitFactory()
+        in_sync = VisitFactory(exit_time=None)
+        Ship.objects.filter(pk=docked.ship_id).update(
+            current_visit=None, current_harbour=None
+        )
+        Ship.objects.filter(pk=at_sea.ship_id).update(
+            current_visit=at_sea, current_harbour=at_sea.harbour
+        )
+        return docked, at_sea, in_sync
+
+    def test_sync_ship_locations(self, drifted, capsys):
+        # Arrange
+        docked, at_sea, in_sync = drifted
+        since = ChangeLog.objects.latest("seq").seq
+
+        # Act
+        call_command("sync_ship_locations", batch_size=2)
+
+        # Assert
+        ships = Ship.objects.in_bulk()
+        assert ships[docked.ship_id].current_visit_id == docked.id
+        assert ships[docked.ship_id].current_harbour_id == docked.harbour_id
+        assert ships[at_sea.ship_id].current_visit_id is None
+        assert ships[at_sea.ship_id].current_harbour_id is None
+        assert ships[in_sync.ship_id].current_visit_id == in_sync.id
+        assert "Checked 3 ships, repaired 2" in capsys.readouterr().out
+        logged = ChangeLog.objects.filter(seq__gt=since, model="ship")
+        assert {entry.object_id for entry in logged} == {
+            docked.ship_id,
+            at_sea.ship_id,
+        }
+
+    def test_sync_ship_locations_dry_run(self, drifted, capsys):
+        # Arrange
+        docked, _, _ = drifted
+
+        # Act
+        call_command("sync_ship_locations", dry_run=True)
+
+        # Assert
+        assert Ship.objects.get(pk=docked.ship_id).current_visit_id is None
+        assert "Checked 3 ships, found 2" in capsys.readouterr().out
+
+    def test_sync_ship_locations_recent_departures(self, capsys):
+        """
+        A departure scheduled with a future exit_time moves the Ship once
+        the command runs after it.
+        """
+        # Arrange
+        now = timezone.now()
+        departing = VisitFactory(
+            entry_time=now - timedelta(hours=2), exit_time=now + timedelta(hours=1)
+        )
+        VisitFactory(exit_time=None)
+        assert Ship.objects.get(pk=departing.ship_id).current_visit == departing
+
+        # Act
+        with clock.frozen(now + timedelta(hours=1, minutes=5)):
+            call_command("sync_ship_locations", recent_minutes=10)
+
+        # Assert
+        assert Ship.objects.get(pk=departing.ship_id).current_visit is None
+        assert "Checked 1 ships, repaired 1" in capsys.readouterr().out
@@ -0,0 +1,26 @@
+import pytest
+
+from vtso.backends import permission_cache
+from vtso.throttling import counter_store
+
+
+@pytest.fixture(autouse=True)
+def reset_counters():
+    """
+    Throttling and admission counters outlive a test in the process-wide
+    store, so every test starts from empty counters.
+    """
+    counter_store().clear()
+    yield
+    counter_store().clear()
+
+
+@pytest.fixture(autouse=True)
+def reset_permission_cache():
+    """
+    Cached permissions are keyed by user id, and ids are reused once the
+    test transaction is rolled back.
+    """
+    permission_cache().clear()
+    yield
+    permission_cache().clear()
@@ -0,0 +1,127 @@
+import pytest
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from vtso.middleware import AdmissionControlMiddleware
+from vtso.throttling import LocalCounterStore, counter_store
+
+
+class TestAdmissionControl:
+    """
+    Unit tests for AdmissionControlMiddleware.
+    """
+
+    @pytest.fixture(autouse=True)
+    def limits(self, settings):
+        settings.VTSO_MAX_CONCURRENT_REQUESTS = 2
+        settings.VTSO_MAX_CONCURRENT_REQUESTS_PER_CLIENT = 1
+        settings.VTSO_ADMISSION_RETRY_AFTER = 3
+
+    @pytest.fixture
+    def nested(self):
+        """
+        A middleware whose view issues a second request while the first
+        one is in flight, returning the response of the inner request.
+        """
+        factory = RequestFactory()
+
+        def view(request):
+            if "inner" in request.GET:
+                return HttpResponse("inner")
+            inner = factory.get("/vtso/ships/?inner=1", headers=request.inner_headers)
+            return middleware(inner)
+
+        middleware = AdmissionControlMiddleware(view)
+        return middleware
+
+    @pytest.mark.parametrize(
+        "outer_headers, inner_headers, expected_status, test_id",
+        [
+            (
+                {"Authorization": "Token a"},
+                {"Authorization": "Token b"},
+                200,
+                "different_clients_admitted",
+            ),
+            (
+                {"Authorization": "Token a"},
+                {"Authorization": "Token a"},
+                429,
+                "same_client_over_its_limit",
+            ),
+        ],
+    )
+    def test_per_client_limit(
+        self, nested, outer_headers, inner_headers, expected_status, test_id
+    ):
+        # Arrange
+        request = RequestFactory().get("/vtso/ships/", headers=outer_headers)
+        request.inner_headers = inner_headers
+
+        # Act
+        response = nested(request)
+
+        # Assert
+        assert response.status_code == expected_status, f"Test ID {test_id}"
+
+    def test_global_limit_sheds_with_503(self, settings, nested):
+        # Arrange
+        settings.VTSO_MAX_CONCURRENT_REQUESTS = 1
+        settings.VTSO_MAX_CONCURRENT_REQUESTS_PER_CLIENT = None
+        request = RequestFactory().get("/vtso/ships/")
+        request.inner_headers = {}
+
+        # Act
+        response = nested(request)
+
+        # Assert
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "3"
+
+    def test_counters_released_after_response(self):
+        # Arrange
+        middleware = AdmissionControlMiddleware(lambda request: HttpResponse())
+        request = RequestFactory().get("/vtso/ships/")
+
+        # Act
+        responses = [middleware(request) for _ in range(5)]
+
+        # Assert
+        assert all(response.status_code == 200 for response in responses)
+        assert counter_store().incr("vtso:inflight", 0) == 0
+
+    def test_counters_released_after_exception(self):
+        # Arrange
+        def view(request):
+            raise RuntimeError
+
+        middleware = AdmissionControlMiddleware(view)
+        request = RequestFactory().get("/vtso/ships/")
+
+        # Act
+        with pytest.raises(RuntimeError):
+            middleware(request)
+
+        # Assert
+        assert counter_store().incr("vtso:inflight", 0) == 0
+
+
+class TestLocalCounterStore:
+    """
+    Unit tests for LocalCounterStore.
+    """
+
+    def test_incr_and_expiry(self, monkeypatch):
+        # Arrange
+        store = LocalCounterStore()
+        now = [100.0]
+        monkeypatch.setattr("vtso.throttling.time.monotonic", lambda: now[0])
+
+        # Act
+        first = store.incr("key", ttl=10)
+        second = store.incr("key", ttl=10)
+        now[0] += 10
+        after_expiry = store.incr("key", ttl=10)
+
+        # Assert
+        assert (first, second, after_expiry) == (1, 2, 1)
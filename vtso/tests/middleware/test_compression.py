@@ -0,0 +1,106 @@
+import gzip
+
+import pytest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory
+
+from vtso import middleware
+from vtso.middleware import CompressionMiddleware
+
+LARGE_JSON = (
+    b'[{"id": 1, "name": "Ocean Pearl", "type": "tanker"}' + b", {}" * 500 + b"]"
+)
+
+
+class TestCompressionMiddleware:
+    """
+    Unit tests for CompressionMiddleware.
+    """
+
+    @pytest.fixture(autouse=True)
+    def without_brotli(self, monkeypatch):
+        monkeypatch.setattr(middleware, "brotli", None)
+
+    @staticmethod
+    def get(response, accept_encoding="gzip, deflate"):
+        request = RequestFactory().get(
+            "/vtso/ships/", headers={"Accept-Encoding": accept_encoding}
+        )
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_large_json_is_gzipped(self):
+        # Act
+        response = self.get(HttpResponse(LARGE_JSON, content_type="application/json"))
+
+        # Assert
+        assert response["Content-Encoding"] == "gzip"
+        assert response["Vary"] == "Accept-Encoding"
+        assert int(response["Content-Length"]) == len(response.content)
+        assert gzip.decompress(response.content) == LARGE_JSON
+
+    @pytest.mark.parametrize(
+        "content, content_type, accept_encoding, test_id",
+        [
+            (b'{"id": 1}', "application/json", "gzip", "below_min_size"),
+            (LARGE_JSON, "application/json", "identity", "gzip_not_accepted"),
+            (LARGE_JSON, "application/json", "gzip;q=0", "gzip_refused"),
+            (LARGE_JSON, "image/png", "gzip", "not_compressible_type"),
+            # HTML pages carry CSRF tokens next to reflected input (BREACH)
+            (b"<p>" + LARGE_JSON + b"</p>", "text/html", "gzip", "html"),
+        ],
+    )
+    def test_response_is_not_compressed(
+        self, content, content_type, accept_encoding, test_id
+    ):
+        # Act
+        response = self.get(
+            HttpResponse(content, content_type=content_type), accept_encoding
+        )
+
+        # Assert
+        assert not response.has_header("Content-Encoding"), test_id
+        assert response.content == content
+
+    def test_min_size_is_configurable(self, settings):
+        # Arrange
+        settings.VTSO_COMPRESSION_MIN_SIZE = 10_000
+
+        # Act
+        response = self.get(HttpResponse(LARGE_JSON, content_type="application/json"))
+
+        # Assert
+        assert not response.has_header("Content-Encoding")
+
+    def test_streaming_response_is_gzipped(self):
+        # Arrange
+        chunks = [LARGE_JSON[i : i + 100] for i in range(0, len(LARGE_JSON), 100)]
+
+        # Act
+        response = self.get(
+            StreamingHttpResponse(iter(chunks), content_type="application/json")
+        )
+
+        # Assert
+        assert response["Content-Encoding"] == "gzip"
+        assert gzip.decompress(b"".join(response.streaming_content)) == LARGE_JSON
+
+    @pytest.mark.parametrize(
+        "accept_encoding, brotli_installed, expected, test_id",
+        [
+            ("gzip, br", True, "br", "prefers_brotli"),
+            ("gzip, br;q=0.5", True, "gzip", "client_prefers_gzip"),
+            ("gzip, br", False, "gzip", "brotli_not_installed"),
+            ("*", False, "gzip", "wildcard"),
+            ("identity", True, None, "nothing_accepted"),
+        ],
+    )
+    def test_negotiate(
+        self, monkeypatch, accept_encoding, brotli_installed, expected, test_id
+    ):
+        # Arrange
+        monkeypatch.setattr(
+            middleware, "brotli", object() if brotli_installed else None
+        )
+
+        # Act and Assert
+        assert CompressionMiddleware.negotiate(accept_encoding) == expected, test_id
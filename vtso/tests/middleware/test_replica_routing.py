@@ -0,0 +1,126 @@
+import pytest
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from vtso.middleware import ReplicaRoutingMiddleware, pin_credentials
+from vtso.models import Ship
+from vtso.routers import ReadReplicaRouter
+
+
+class TestReplicaRouting:
+    """
+    Unit tests for ReadReplicaRouter and ReplicaRoutingMiddleware.
+    """
+
+    @pytest.fixture(autouse=True)
+    def replicas(self, settings):
+        settings.VTSO_READ_REPLICAS = ["replica"]
+        cache.clear()
+        yield
+        cache.clear()
+
+    @pytest.fixture
+    def middleware(self):
+        def view(request):
+            request.read_db = ReadReplicaRouter().db_for_read(Ship)
+            return HttpResponse(status=201 if request.method == "POST" else 200)
+
+        return ReplicaRoutingMiddleware(view)
+
+    def test_reads_outside_requests_use_primary(self):
+        # Act and Assert
+        assert ReadReplicaRouter().db_for_read(Ship) == "default"
+        assert ReadReplicaRouter().db_for_write(Ship) == "default"
+
+    @pytest.mark.parametrize(
+        "method, expected_db, test_id",
+        [
+            ("get", "replica", "safe_method_reads_replica"),
+            ("post", "default", "unsafe_method_reads_primary"),
+        ],
+    )
+    def test_request_routing(self, middleware, method, expected_db, test_id):
+        # Arrange
+        request = getattr(RequestFactory(), method)("/vtso/ships/")
+
+        # Act
+        middleware(request)
+
+        # Assert
+        assert request.read_db == expected_db, f"Test ID {test_id}"
+
+    def test_reads_stick_to_primary_after_a_write(self, middleware, settings):
+        # Arrange
+        factory = RequestFactory()
+        headers = {"Authorization": "Token abc"}
+        middleware(factory.post("/vtso/ships/", headers=headers))
+        own_read = factory.get("/vtso/ships/", headers=headers)
+        # same address, other credentials: e.g. another client behind a NAT
+        other_read = factory.get("/vtso/ships/", headers={"Authorization": "Token xyz"})
+        anonymous_read = factory.get("/vtso/ships/")
+
+        # Act
+        middleware(own_read)
+        middleware(other_read)
+        middleware(anonymous_read)
+        settings.VTSO_REPLICA_STICKY_SECONDS = 0
+        middleware(factory.post("/vtso/ships/", headers=headers))
+        later_read = factory.get("/vtso/ships/", headers=headers)
+        middleware(later_read)
+
+        # Assert
+        assert own_read.read_db == "default"
+        assert other_read.read_db == "replica"
+        assert anonymous_read.read_db == "replica"
+        assert later_read.read_db == "replica"
+
+    def test_issued_credentials_stick_to_primary(self):
+        """
+        A token or session issued by a write reads its own writes, although
+        the write was sent with other (or no) credentials.
+        """
+
+        # Arrange
+        def view(request):
+            request.read_db = ReadReplicaRouter().db_for_read(Ship)
+            response = HttpResponse()
+            if request.method == "POST":
+                pin_credentials(request, "Bearer new")
+                response.set_cookie(settings.SESSION_COOKIE_NAME, "new-session")
+            return response
+
+        middleware = ReplicaRoutingMiddleware(view)
+        factory = RequestFactory()
+        middleware(factory.post("/vtso/tokens/"))
+        token_read = factory.get(
+            "/vtso/ships/", headers={"Authorization": "Bearer new"}
+        )
+        session_read = factory.get("/vtso/ships/")
+        session_read.COOKIES[settings.SESSION_COOKIE_NAME] = "new-session"
+
+        # Act
+        middleware(token_read)
+        middleware(session_read)
+
+        # Assert
+        assert token_read.read_db == "default"
+        assert session_read.read_db == "default"
+
+    @pytest.mark.django_db
+    def test_reads_inside_a_transaction_use_primary(self, middleware):
+        # Arrange
+        def view(request):
+            with transaction.atomic():
+                request.read_db = ReadReplicaRouter().db_for_read(Ship)
+            return HttpResponse()
+
+        request = RequestFactory().get("/vtso/ships/")
+
+        # Act
+        ReplicaRoutingMiddleware(view)(request)
+
+        # Assert
+        assert request.read_db == "default"
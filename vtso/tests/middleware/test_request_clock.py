@@ -0,0 +1,46 @@
+from datetime import datetime
+from unittest.mock import patch
+
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.utils.timezone import get_current_timezone
+
+from vtso import clock
+from vtso.middleware import RequestClockMiddleware
+
+
+class TestRequestClockMiddleware:
+    """
+    Unit tests for RequestClockMiddleware.
+    """
+
+    def test_clock_is_frozen_for_the_whole_request(self):
+        # Arrange
+        seen = []
+
+        def view(request):
+            seen.extend([clock.now(), clock.now()])
+            return HttpResponse()
+
+        middleware = RequestClockMiddleware(view)
+
+        # Act
+        with patch("vtso.clock.get_current_timezone") as mock_timezone:
+            mock_timezone.return_value = get_current_timezone()
+            middleware(RequestFactory().get("/"))
+
+        # Assert
+        assert seen[0] is seen[1]
+        mock_timezone.assert_called_once()
+
+    def test_frozen_overrides_now(self):
+        # Arrange
+        at = datetime(1912, 4, 10, tzinfo=get_current_timezone())
+
+        # Act
+        with clock.frozen(at):
+            frozen_now = clock.now()
+
+        # Assert
+        assert frozen_now == at
+        assert clock.now() != at
@@ -3,8 +3,10 @@ from unittest.mock import patch
 
 import pytest
 from django.core.exceptions import ValidationError
+from django.utils.timezone import get_current_timezone
 
-from vtso.models import Company, Ship
+from vtso import clock
+from vtso.models import Company, Ship, VersionConflict
 from vtso.tests.factories import ShipFactory
 
 
@@ -194,6 +196,76 @@ class TestShip:
         assert Ship.objects.count() == 1
 
 
+@pytest.mark.django_db
+class TestShipYearBuiltInt:
+    """
+    Unit tests for the integer copy of year_built.
+    """
+
+    @pytest.mark.parametrize(
+        "year_built, expected, test_id",
+        [
+            ("1912", 1912, "happy_path"),
+            ("0000", 0, "edge_case_year_zero"),
+            ("", None, "edge_case_blank_year"),
+            (None, None, "edge_case_null_year"),
+        ],
+    )
+    def test_year_built_int_on_save(self, year_built, expected, test_id):
+        # Arrange
+        ship = ShipFactory(year_built="2000")
+
+        # Act
+        ship.year_built = year_built
+        ship.save(update_fields=["year_built"])
+        ship.refresh_from_db()
+
+        # Assert
+        assert ship.year_built_int == expected, f"Test ID {test_id}"
+
+
+@pytest.mark.django_db
+class TestShipVersion:
+    """
+    Unit tests for the optimistic concurrency control of Ship.save().
+    """
+
+    def test_save_bumps_version(self):
+        # Arrange
+        ship = ShipFactory()
+
+        # Act
+        ship.name = "Renamed"
+        ship.save()
+
+        # Assert
+        ship.refresh_from_db()
+        assert ship.version == 2
+        assert ship.name == "Renamed"
+
+    def test_concurrent_save_conflicts(self):
+        """
+        Of two instances read at the same version, only the first can save.
+        """
+        # Arrange
+        ship = ShipFactory(name="Sea Master")
+        first = Ship.objects.get(pk=ship.pk)
+        second = Ship.objects.get(pk=ship.pk)
+        first.name = "First"
+        first.save()
+
+        # Act
+        second.name = "Second"
+        with pytest.raises(VersionConflict):
+            second.save()
+
+        # Assert
+        ship.refresh_from_db()
+        assert ship.name == "First"
+        assert ship.version == 2
+        assert second.version == 1
+
+
 @pytest.mark.django_db
 class TestShipAgeProperty:
     """
@@ -217,8 +289,7 @@ class TestShipAgeProperty:
         ship = ShipFactory(year_built=year_built)
 
         # Act
-        with patch("vtso.models.datetime") as mock_datetime:
-            mock_datetime.now.return_value = datetime(2023, 1, 1)
+        with clock.frozen(datetime(2023, 1, 1, tzinfo=get_current_timezone())):
             age = ship.age
 
         # Assert
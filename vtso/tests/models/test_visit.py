@@ -3,7 +3,8 @@ from datetime import timedelta
 import pytest
 from django.utils import timezone
 
-from vtso.models import Company, Harbour, Ship, Visit
+from vtso.models import ChangeLog, Company, Harbour, Ship, Visit
+from vtso.tests.factories import ShipFactory, VisitFactory
 
 
 class TestVisit:
@@ -55,3 +56,162 @@ class TestVisit:
         assert visit.entry_time == entry_time
         assert visit.exit_time == exit_time
         assert Visit.objects.count() == 1
+
+
+@pytest.mark.django_db
+class TestShipLocation:
+    """
+    Ship.current_visit and Ship.current_harbour follow the Visit writes.
+    """
+
+    @pytest.fixture
+    def ship(self):
+        return ShipFactory()
+
+    def test_open_visit_locates_ship(self, ship):
+        # Act
+        visit = VisitFactory(ship=ship, exit_time=None)
+
+        # Assert
+        ship.refresh_from_db()
+        assert ship.current_visit == visit
+        assert ship.current_harbour == visit.harbour
+
+    def test_closed_visit_does_not_locate_ship(self, ship):
+        # Act
+        VisitFactory(ship=ship)
+
+        # Assert
+        ship.refresh_from_db()
+        assert ship.current_visit is None
+        assert ship.current_harbour is None
+
+    def test_visit_in_progress_locates_ship(self, ship):
+        # Arrange
+        now = timezone.now()
+
+        # Act
+        visit = VisitFactory(
+            ship=ship,
+            entry_time=now - timedelta(hours=2),
+            exit_time=now + timedelta(hours=5),
+        )
+
+        # Assert
+        ship.refresh_from_db()
+        assert ship.current_visit == visit
+        assert ship.current_harbour == visit.harbour
+
+    def test_future_visit_does_not_locate_ship(self, ship):
+        # Act
+        VisitFactory(
+            ship=ship, entry_time=timezone.now() + timedelta(days=3), exit_time=None
+        )
+
+        # Assert
+        ship.refresh_from_db()
+        assert ship.current_visit is None
+        assert ship.current_harbour is None
+
+    def test_location_change_is_change_logged(self, ship):
+        # Act
+        visit = VisitFactory(ship=ship, exit_time=None)
+
+        # Assert
+        entry = ChangeLog.objects.filter(model="ship", object_id=ship.pk).latest("seq")
+        assert entry.action == ChangeLog.Action.UPDATE
+        assert entry.payload["current_visit_id"] == visit.pk
+        assert entry.payload["current_harbour_id"] == visit.harbour_id
+
+    def test_latest_open_visit_wins(self, ship):
+        # Arrange
+        now = timezone.now()
+        VisitFactory(ship=ship, entry_time=now - timedelta(days=2), exit_time=None)
+
+        # Act
+        latest = VisitFactory(ship=ship, entry_time=now, exit_time=None)
+
+        # Assert
+        ship.refresh_from_db()
+        assert ship.current_visit == latest
+
+    def test_closing_visit_clears_location(self, ship):
+        # Arrange
+        visit = VisitFactory(ship=ship, exit_time=None)
+        visit = Visit.objects.get(pk=visit.pk)
+
+        # Act
+        visit.exit_time = visit.entry_time + timedelta(hours=1)
+        visit.save(update_fields=["exit_time"])
+
+        # Assert
+        ship.refresh_from_db()
+        assert ship.current_visit is None
+        assert ship.current_harbour is None
+
+    def test_moving_visit_updates_both_ships(self, ship):
+        # Arrange
+        other = ShipFactory()
+        visit = Visit.objects.get(pk=VisitFactory(ship=ship, exit_time=None).pk)
+
+        # Act
+        visit.ship = other
+        visit.save()
+
+        # Assert
+        ship.refresh_from_db()
+        other.refresh_from_db()
+        assert ship.current_visit is None
+        assert other.current_visit == visit
+
+    def test_deleting_visit_clears_location(self, ship):
+        # Arrange
+        visit = VisitFactory(ship=ship, exit_time=None)
+
+        # Act
+        visit.delete()
+
+        # Assert
+        ship.refresh_from_db()
+        assert ship.current_visit is None
+        assert ship.current_harbour is None
+
+    def test_bulk_delete_syncs_ships_once(self, ship):
+        """
+        Deleting many Visits syncs their Ships with one locking read,
+        whatever the number of Visits.
+        """
+        # Arrange
+        older = VisitFactory(ship=ship, exit_time=None)
+        current = VisitFactory(ship=ship, exit_time=None)
+        other = ShipFactory()
+        VisitFactory.create_batch(3, ship=other, exit_time=timezone.now())
+
+        # Act
+        deleted, _ = Visit.objects.exclude(pk=older.pk).delete()
+        ship.refresh_from_db()
+
+        # Assert
+        assert deleted == 4
+        assert ship.current_visit == older
+        assert current.pk not in Visit.objects.values_list("pk", flat=True)
+
+    def test_ship_save_keeps_location(self, ship):
+        """
+        Saving a stale Ship instance must not overwrite its location.
+        """
+        # Arrange
+        stale = Ship.objects.get(pk=ship.pk)
+        visit = VisitFactory(ship=ship, exit_time=None)
+
+        # Act
+        stale.name = "Renamed"
+        stale.save()
+
+        # Assert
+        ship.refresh_from_db()
+        assert ship.name == "Renamed"
+        assert ship.current_visit == visit
+        entry = ChangeLog.objects.filter(model="ship", object_id=ship.pk).latest("seq")
+        assert entry.payload["name"] == "Renamed"
+        assert entry.payload["current_visit_id"] == visit.pk
@@ -0,0 +1,221 @@
+from datetime import timedelta
+
+import pytest
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from vtso.archive import archive_batch
+from vtso.models import ChangeLog, Ship, User
+from vtso.tests.factories import CompanyFactory, ShipFactory, VisitFactory
+
+
+@pytest.mark.django_db
+class TestChangeList:
+    """
+    Unit tests for /vtso/changes/
+    """
+
+    @pytest.fixture
+    def api_client_authenticated(self):
+        user = User.objects.create(username="test_user")
+        token = Token.objects.create(user=user)
+        client = APIClient()
+        client.force_authenticate(user=user, token=token)
+        return client
+
+    @pytest.fixture(autouse=True)
+    def no_settle(self, settings):
+        settings.VTSO_CHANGE_FEED_SETTLE_SECONDS = 0
+
+    def test_changes_hold_back_recent_changes(self, api_client_authenticated, settings):
+        """
+        Changes written within the settle window are not served, nor any
+        change after them, until the window has passed.
+        """
+        # Arrange
+        settings.VTSO_CHANGE_FEED_SETTLE_SECONDS = 60
+        CompanyFactory.create_batch(3)
+        changes = list(ChangeLog.objects.order_by("seq"))
+        since = changes[0].seq - 1
+        ChangeLog.objects.filter(seq=changes[0].seq).update(
+            created_at=timezone.now() - timedelta(minutes=5)
+        )
+        url = reverse("changes")
+
+        # Act
+        response = api_client_authenticated.get(url, {"since": since, "limit": 2})
+        settings.VTSO_CHANGE_FEED_SETTLE_SECONDS = 0
+        later = api_client_authenticated.get(url, {"since": response.data["next"]})
+
+        # Assert
+        assert [change["seq"] for change in response.data["results"]] == [
+            changes[0].seq
+        ]
+        assert response.data["has_more"] is False
+        assert [change["seq"] for change in later.data["results"]] == [
+            change.seq for change in changes[1:]
+        ]
+
+    def test_changes_not_authenticated(self):
+        # Arrange
+        client = APIClient()
+        url = reverse("changes")
+
+        # Act
+        response = client.get(url)
+
+        # Assert
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_changes_records_create_update_delete(self, api_client_authenticated):
+        # Arrange
+        company = CompanyFactory(name="Company A")
+        company.name = "Company B"
+        company.save()
+        company_id = company.id
+        company.delete()
+        url = reverse("changes")
+
+        # Act
+        response = api_client_authenticated.get(url)
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+        assert [
+            (change["model"], change["object_id"], change["action"])
+            for change in response.data["results"]
+        ] == [
+            ("company", company_id, "create"),
+            ("company", company_id, "update"),
+            ("company", company_id, "delete"),
+        ]
+        assert response.data["results"][1]["payload"] == {
+            "id": company_id,
+            "name": "Company B",
+        }
+        assert response.data["results"][2]["payload"] is None
+        assert response.data["has_more"] is False
+
+    def test_changes_records_cascaded_deletes(self, api_client_authenticated):
+        # Arrange
+        visit = VisitFactory()
+        ship = visit.ship
+        since = ChangeLog.objects.latest("seq").seq
+        url = reverse("changes")
+
+        # Act
+        ship.company.delete()
+        response = api_client_authenticated.get(url, {"since": since})
+
+        # Assert
+        deleted = {
+            (change["model"], change["object_id"])
+            for change in response.data["results"]
+        }
+        assert deleted == {
+            ("company", ship.company_id),
+            ("ship", ship.id),
+            ("visit", visit.id),
+        }
+
+    @pytest.mark.parametrize(
+        "since, limit, expected_count, expected_has_more, test_id",
+        [
+            (0, 2, 2, True, "first_batch"),
+            (2, 2, 2, True, "second_batch"),
+            (4, 2, 1, False, "last_batch"),
+            (5, 2, 0, False, "up_to_date"),
+        ],
+    )
+    def test_changes_batches(
+        self,
+        api_client_authenticated,
+        since,
+        limit,
+        expected_count,
+        expected_has_more,
+        test_id,
+    ):
+        # Arrange
+        CompanyFactory.create_batch(5)
+        first_seq = ChangeLog.objects.earliest("seq").seq - 1
+        url = reverse("changes")
+
+        # Act
+        response = api_client_authenticated.get(
+            url, {"since": first_seq + since, "limit": limit}
+        )
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data["results"]) == expected_count
+        assert response.data["has_more"] is expected_has_more
+        assert response.data["next"] == first_seq + since + expected_count
+
+    @pytest.mark.parametrize(
+        "params, test_id",
+        [
+            ({"since": "abc"}, "since_not_a_number"),
+            ({"since": "-1"}, "negative_since"),
+            ({"limit": "0"}, "zero_limit"),
+        ],
+    )
+    def test_changes_invalid_params(self, api_client_authenticated, params, test_id):
+        # Arrange
+        url = reverse("changes")
+
+        # Act
+        response = api_client_authenticated.get(url, params)
+
+        # Assert
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_changes_rolled_back_with_the_write(self):
+        # Arrange
+        company = CompanyFactory()
+        changes_before = ChangeLog.objects.count()
+
+        # Act
+        with pytest.raises(RuntimeError):
+            with transaction.atomic():
+                ShipFactory(company=company)
+                raise RuntimeError
+
+        # Assert
+        assert ChangeLog.objects.count() == changes_before
+
+    def test_changes_records_bulk_update(self, api_client_authenticated):
+        # Arrange
+        ship = ShipFactory(name="Old name")
+        since = ChangeLog.objects.latest("seq").seq
+        url = reverse("ships_bulk")
+
+        # Act
+        api_client_authenticated.patch(
+            url, [{"id": ship.id, "name": "New name"}], format="json"
+        )
+
+        # Assert
+        change = ChangeLog.objects.get(seq__gt=since)
+        assert change.action == ChangeLog.Action.UPDATE
+        assert change.payload["name"] == "New name"
+
+    def test_changes_ignore_archived_visits(self):
+        # Arrange
+        now = timezone.now()
+        VisitFactory(
+            entry_time=now - timedelta(days=20), exit_time=now - timedelta(days=10)
+        )
+        since = ChangeLog.objects.latest("seq").seq
+
+        # Act
+        archived = archive_batch(now, batch_size=10)
+
+        # Assert
+        assert archived == 1
+        assert not ChangeLog.objects.filter(seq__gt=since).exists()
+        assert Ship.objects.count() == 1
@@ -1,11 +1,21 @@
+from datetime import timedelta
+
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 
 from vtso.models import User
-from vtso.tests.factories import CompanyFactory
+from vtso.tests.factories import (
+    CompanyFactory,
+    PersonFactory,
+    ShipFactory,
+    VisitFactory,
+)
 
 
 @pytest.mark.django_db
@@ -80,3 +90,114 @@ class TestCompanyList:
         # Assert
         assert response.status_code == status.HTTP_201_CREATED
         assert response.data["name"] == name
+
+    def test_list_companies_summary_get(self, api_client_authenticated):
+        """
+        GET /companies?summary=true should add the fleet summary of every
+        Company with a query count that does not grow with the list.
+        """
+        # Arrange
+        for _ in range(3):
+            company = CompanyFactory()
+            ShipFactory.create_batch(2, company=company)
+            PersonFactory(company=company)
+        url = reverse("companies")
+
+        # Act
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client_authenticated.get(url, {"summary": "true"})
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data) == 3
+        assert all(company["ship_count"] == 2 for company in response.data)
+        assert all(company["person_count"] == 1 for company in response.data)
+        # companies, ships, persons and visits
+        assert len(queries) == 4
+
+
+@pytest.mark.django_db
+class TestCompanyDetail:
+    """
+    Unit tests for /vtso/companies/<int:pk>/
+    """
+
+    @pytest.fixture
+    def api_client_authenticated(self):
+        user = User.objects.create(username="test_user")
+        token = Token.objects.create(user=user)
+        client = APIClient()
+        client.force_authenticate(user=user, token=token)
+        return client
+
+    def test_company_detail_not_authenticated(self):
+        # Arrange
+        client = APIClient()
+        company = CompanyFactory()
+        url = reverse("company_detail", kwargs={"pk": company.id})
+
+        # Act
+        response = client.get(url)
+
+        # Assert
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_company_detail_not_found(self, api_client_authenticated):
+        # Arrange
+        url = reverse("company_detail", kwargs={"pk": 999})
+
+        # Act
+        response = api_client_authenticated.get(url)
+
+        # Assert
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_company_detail_summary(self, api_client_authenticated):
+        # Arrange
+        now = timezone.now()
+        company = CompanyFactory(name="Company A")
+        tanker = ShipFactory(company=company, type="tanker", tonnage=1000)
+        ShipFactory(company=company, type="tanker", tonnage=2000)
+        ShipFactory(company=company, type="fishing", tonnage=None)
+        ShipFactory(type="tanker", tonnage=5000)
+        PersonFactory.create_batch(2, company=company)
+        VisitFactory(
+            ship=tanker,
+            entry_time=now - timedelta(days=1),
+            exit_time=now + timedelta(days=1),
+        )
+        VisitFactory(
+            ship=tanker,
+            entry_time=now - timedelta(days=10),
+            exit_time=now - timedelta(days=9),
+        )
+        url = reverse("company_detail", kwargs={"pk": company.id})
+
+        # Act
+        response = api_client_authenticated.get(url)
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {
+            "id": company.id,
+            "name": "Company A",
+            "ship_count": 3,
+            "total_tonnage": 3000,
+            "ship_types": {"tanker": 2, "fishing": 1},
+            "person_count": 2,
+            "active_visits": 1,
+        }
+
+    def test_company_detail_empty_company(self, api_client_authenticated):
+        # Arrange
+        company = CompanyFactory()
+        url = reverse("company_detail", kwargs={"pk": company.id})
+
+        # Act
+        response = api_client_authenticated.get(url)
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["ship_count"] == 0
+        assert response.data["total_tonnage"] == 0
+        assert response.data["ship_types"] == {}
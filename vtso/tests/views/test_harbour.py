@@ -1,14 +1,19 @@
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
 import pytest
+from django.core.cache import cache
+from django.db import connection
 from django.urls import reverse
 from django.utils.timezone import get_current_timezone
 from rest_framework import status
 from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 
+from vtso.analytics import bucket_start
+from vtso.forecast import forecast_visits, learn_dwell_times
 from vtso.models import User
 from vtso.tests.factories import HarbourFactory, ShipFactory, VisitFactory
+from vtso.views import OCCUPANCY_BUCKETS
 
 
 @pytest.mark.django_db
@@ -112,6 +117,32 @@ class TestHarbourList:
         # Assert
         assert response.status_code == expected_status_code
 
+    def test_harbour_list_by_ids(self, api_client_authenticated):
+        """
+        GET /harbours/?ids= should return the requested Harbours with
+        one query, in the requested order.
+        """
+        # Arrange
+        harbours = HarbourFactory.create_batch(3)
+        url = reverse("harbours")
+
+        # Act
+        response = api_client_authenticated.get(
+            url, {"ids": f"{harbours[1].id},{harbours[0].id},0"}
+        )
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["results"] == [
+            {
+                "id": harbour.id,
+                "name": harbour.name,
+                "max_berth_depth": harbour.max_berth_depth,
+            }
+            for harbour in (harbours[1], harbours[0])
+        ]
+        assert response.data["missing"] == [0]
+
     @pytest.mark.django_db
     def test_create_harbour(self, api_client_authenticated):
         """
@@ -180,6 +211,66 @@ class TestHarbourDetails:
         assert response.status_code == status.HTTP_200_OK
         assert len(response.data["current_ships"]) == 1
 
+    @pytest.mark.django_db
+    @pytest.mark.parametrize(
+        "days_ago, expected_ship, test_id",
+        [
+            (4.5, 0, "as_of_first_visit"),
+            (1, 1, "as_of_second_visit"),
+        ],
+    )
+    def test_harbour_details_view_as_of(
+        self, api_client_authenticated, days_ago, expected_ship, test_id
+    ):
+        """
+        GET /harbours/pk/details?as_of= should list the ships docked
+        at the given time, with their age computed at that time.
+        """
+        # Arrange
+        harbour = HarbourFactory()
+        ships = ShipFactory.create_batch(2, year_built="2000")
+        current_time = datetime.now(tz=get_current_timezone())
+        _ = VisitFactory(
+            ship=ships[0],
+            harbour=harbour,
+            entry_time=current_time - timedelta(days=5),
+            exit_time=current_time - timedelta(days=4),
+        )
+        _ = VisitFactory(
+            ship=ships[1],
+            harbour=harbour,
+            entry_time=current_time - timedelta(days=2),
+            exit_time=current_time,
+        )
+        as_of = current_time - timedelta(days=days_ago)
+        url = reverse("harbour_details", kwargs={"pk": harbour.id})
+
+        # Act
+        response = api_client_authenticated.get(url, {"as_of": as_of.isoformat()})
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+        current_ships = response.data["current_ships"]
+        assert [ship["id"] for ship in current_ships] == [
+            ships[expected_ship].id
+        ], f"Test ID {test_id}"
+        assert current_ships[0]["age"] == as_of.year - 2000
+
+    @pytest.mark.django_db
+    def test_harbour_details_view_invalid_as_of(self, api_client_authenticated):
+        """
+        GET /harbours/pk/details?as_of= should return 400 for invalid dates.
+        """
+        # Arrange
+        harbour = HarbourFactory()
+        url = reverse("harbour_details", kwargs={"pk": harbour.id})
+
+        # Act
+        response = api_client_authenticated.get(url, {"as_of": "yesterday"})
+
+        # Assert
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
     @pytest.mark.django_db
     def test_harbour_details_view_non_existent_harbour(self, api_client_authenticated):
         """
@@ -212,3 +303,553 @@ class TestHarbourDetails:
         assert (
             response.data["detail"] == "Authentication credentials were not provided."
         )
+
+
+@pytest.mark.django_db
+class TestHarbourDetailsBatch:
+    """
+    Unit tests for /harbours/details/
+    """
+
+    @pytest.fixture
+    def api_client_authenticated(self):
+        user = User.objects.create(username="test_user")
+        token = Token.objects.create(user=user)
+        client = APIClient()
+        client.force_authenticate(user=user, token=token)
+        return client
+
+    @pytest.fixture
+    def harbours(self):
+        """
+        Three Norwegian Harbours with a docked Ship each and a Harbour
+        elsewhere, plus a Ship that already left.
+        """
+        now = datetime.now(tz=get_current_timezone())
+        harbours = HarbourFactory.create_batch(3, country="Norway")
+        harbours.append(HarbourFactory(country="Chile"))
+        for harbour in harbours:
+            VisitFactory(
+                harbour=harbour,
+                entry_time=now - timedelta(days=1),
+                exit_time=now + timedelta(days=1),
+            )
+        VisitFactory(
+            harbour=harbours[0],
+            entry_time=now - timedelta(days=3),
+            exit_time=now - timedelta(days=2),
+        )
+        return harbours
+
+    def test_harbour_details_batch_by_ids(self, api_client_authenticated, harbours):
+        # Arrange
+        url = reverse("harbour_details_batch")
+        ids = f"{harbours[2].id},999,{harbours[0].id}"
+
+        # Act
+        response = api_client_authenticated.get(url, {"ids": ids})
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+        assert [harbour["id"] for harbour in response.data["results"]] == [
+            harbours[2].id,
+            harbours[0].id,
+        ]
+        assert response.data["missing"] == [999]
+        single = api_client_authenticated.get(
+            reverse("harbour_details", kwargs={"pk": harbours[0].id})
+        )
+        assert response.data["results"][1] == single.data
+
+    @pytest.mark.parametrize(
+        "params, expected, test_id",
+        [
+            ({"country": "Norway"}, [0, 1, 2], "country"),
+            ({"country": "Chile"}, [3], "other_country"),
+            ({"country": "Norway", "ids": "IDS"}, [1], "country_and_ids"),
+        ],
+    )
+    def test_harbour_details_batch_by_country(
+        self, api_client_authenticated, harbours, params, expected, test_id
+    ):
+        # Arrange
+        if "ids" in params:
+            params["ids"] = f"{harbours[1].id},{harbours[3].id}"
+        url = reverse("harbour_details_batch")
+
+        # Act
+        response = api_client_authenticated.get(url, params)
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+        assert [harbour["id"] for harbour in response.data["results"]] == [
+            harbours[i].id for i in expected
+        ], f"Test ID {test_id}"
+        for harbour in response.data["results"]:
+            assert len(harbour["current_ships"]) == 1
+
+    def test_harbour_details_batch_query_count(
+        self, api_client_authenticated, harbours, django_assert_num_queries
+    ):
+        """
+        The number of queries does not depend on the number of Harbours.
+        """
+        # Arrange
+        url = reverse("harbour_details_batch")
+
+        # Act
+        with django_assert_num_queries(2):
+            response = api_client_authenticated.get(url, {"country": "Norway"})
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+
+    @pytest.mark.parametrize(
+        "params, test_id",
+        [({}, "no_selection"), ({"country": "Norway", "as_of": "x"}, "invalid_as_of")],
+    )
+    def test_harbour_details_batch_invalid_params(
+        self, api_client_authenticated, params, test_id
+    ):
+        # Act
+        response = api_client_authenticated.get(
+            reverse("harbour_details_batch"), params
+        )
+
+        # Assert
+        assert response.status_code == status.HTTP_400_BAD_REQUEST, test_id
+
+
+@pytest.mark.django_db
+class TestHarbourOccupancy:
+    """
+    Unit tests for /harbours/<int:pk>/occupancy/
+    """
+
+    @pytest.fixture
+    def api_client_authenticated(self):
+        user = User.objects.create(username="test_user")
+        token = Token.objects.create(user=user)
+        client = APIClient()
+        client.force_authenticate(user=user, token=token)
+        return client
+
+    @pytest.fixture
+    def start(self):
+        return datetime(2024, 3, 1, tzinfo=get_current_timezone())
+
+    def test_harbour_occupancy(self, api_client_authenticated, start):
+        """
+        Two ships overlap during the second hour, the first one leaves
+        exactly when a third one arrives.
+        """
+        # Arrange
+        harbour = HarbourFactory()
+        VisitFactory(
+            harbour=harbour,
+            entry_time=start - timedelta(hours=5),
+            exit_time=start + timedelta(hours=1, minutes=30),
+        )
+        VisitFactory(
+            harbour=harbour,
+            entry_time=start + timedelta(hours=1),
+            exit_time=start + timedelta(hours=5),
+        )
+        VisitFactory(
+            harbour=harbour,
+            entry_time=start + timedelta(hours=1, minutes=30),
+            exit_time=start + timedelta(hours=2),
+        )
+        # another harbour
+        VisitFactory(entry_time=start, exit_time=start + timedelta(hours=3))
+        url = reverse("harbour_occupancy", kwargs={"pk": harbour.id})
+
+        # Act
+        response = api_client_authenticated.get(
+            url,
+            {
+                "from": start.isoformat(),
+                "to": (start + timedelta(hours=3)).isoformat(),
+                "bucket": "hour",
+            },
+        )
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+        assert [(b["peak"], b["average"]) for b in response.data] == [
+            (1, 1.0),
+            (2, 2.0),
+            (1, 1.0),
+        ]
+        assert response.data[0]["start"] == start.isoformat()
+
+    def test_harbour_occupancy_partial_last_bucket(
+        self, api_client_authenticated, start
+    ):
+        # Arrange
+        harbour = HarbourFactory()
+        VisitFactory(
+            harbour=harbour,
+            entry_time=start + timedelta(hours=12),
+            exit_time=start + timedelta(days=2),
+        )
+        url = reverse("harbour_occupancy", kwargs={"pk": harbour.id})
+
+        # Act
+        response = api_client_authenticated.get(
+            url,
+            {
+                "from": start.isoformat(),
+                "to": (start + timedelta(days=1, hours=6)).isoformat(),
+                "bucket": "day",
+            },
+        )
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+        assert [(b["peak"], b["average"]) for b in response.data] == [
+            (1, 0.5),
+            (1, 1.0),
+        ]
+
+    @pytest.mark.parametrize("bucket", ["15min", "hour", "day", "week"])
+    def test_harbour_occupancy_default_range_is_aligned(
+        self, api_client_authenticated, bucket
+    ):
+        # Arrange
+        harbour = HarbourFactory()
+        url = reverse("harbour_occupancy", kwargs={"pk": harbour.id})
+        before = datetime.now(tz=get_current_timezone())
+
+        # Act
+        response = api_client_authenticated.get(url, {"bucket": bucket})
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+        first = datetime.fromisoformat(response.data[0]["start"])
+        last = datetime.fromisoformat(response.data[-1]["end"])
+        length = OCCUPANCY_BUCKETS[bucket]
+        assert bucket_start(first, length) == first
+        assert bucket_start(last, length) == last
+        assert last - length <= before < last
+
+    @pytest.mark.parametrize(
+        "time, bucket, expected",
+        [
+            ("2024-03-06T13:47:12.345678", "15min", "2024-03-06T13:45:00"),
+            ("2024-03-06T13:47:12.345678", "hour", "2024-03-06T13:00:00"),
+            ("2024-03-06T13:47:12.345678", "day", "2024-03-06T00:00:00"),
+            ("2024-03-06T13:47:12.345678", "week", "2024-03-04T00:00:00"),
+        ],
+    )
+    def test_bucket_start(self, time, bucket, expected):
+        # Arrange
+        tz = get_current_timezone()
+
+        # Act
+        start = bucket_start(
+            datetime.fromisoformat(time).replace(tzinfo=tz), OCCUPANCY_BUCKETS[bucket]
+        )
+
+        # Assert
+        assert start == datetime.fromisoformat(expected).replace(tzinfo=tz)
+
+    @pytest.mark.parametrize(
+        "params, test_id",
+        [
+            ({"bucket": "fortnight"}, "unknown_bucket"),
+            (
+                {"from": "2024-03-02T00:00:00Z", "to": "2024-03-01T00:00:00Z"},
+                "from_after_to",
+            ),
+            ({"from": "soon"}, "invalid_from"),
+            ({"from": "2000-01-01T00:00:00Z", "bucket": "15min"}, "too_many_buckets"),
+        ],
+    )
+    def test_harbour_occupancy_invalid_params(
+        self, api_client_authenticated, params, test_id
+    ):
+        # Arrange
+        harbour = HarbourFactory()
+        url = reverse("harbour_occupancy", kwargs={"pk": harbour.id})
+
+        # Act
+        response = api_client_authenticated.get(url, params)
+
+        # Assert
+        assert response.status_code == status.HTTP_400_BAD_REQUEST, test_id
+
+    def test_harbour_occupancy_non_existent_harbour(self, api_client_authenticated):
+        # Arrange
+        url = reverse("harbour_occupancy", kwargs={"pk": 999})
+
+        # Act
+        response = api_client_authenticated.get(url)
+
+        # Assert
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+class TestOdMatrix:
+    """
+    Unit tests for /harbours/od-matrix/
+    """
+
+    @pytest.fixture
+    def api_client_authenticated(self):
+        user = User.objects.create(username="test_user")
+        token = Token.objects.create(user=user)
+        client = APIClient()
+        client.force_authenticate(user=user, token=token)
+        return client
+
+    @pytest.fixture(autouse=True)
+    def empty_cache(self):
+        cache.clear()
+        yield
+        cache.clear()
+
+    @pytest.fixture
+    def harbours(self):
+        return [HarbourFactory(name=name) for name in ("A", "B", "C")]
+
+    def sail(self, ship, harbours, route, first_day=1):
+        """
+        Visits route (indexes of harbours) one call every three days,
+        each call lasting one day.
+        """
+        for day, harbour in enumerate(route):
+            VisitFactory(
+                ship=ship,
+                harbour=harbours[harbour],
+                entry_time=f"2024-01-{first_day + 3 * day:02d}T00:00:00Z",
+                exit_time=f"2024-01-{first_day + 1 + 3 * day:02d}T00:00:00Z",
+            )
+
+    def test_od_matrix(self, api_client_authenticated, harbours):
+        # Arrange
+        self.sail(ShipFactory(type="tanker"), harbours, [0, 1, 2])
+        self.sail(ShipFactory(type="fishing"), harbours, [0, 1], first_day=2)
+        url = reverse("od_matrix")
+
+        # Act
+        response = api_client_authenticated.get(
+            url, {"from": "2024-01-01T00:00:00Z", "to": "2024-02-01T00:00:00Z"}
+        )
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+        assert [
+            (
+                pair["from_harbour_name"],
+                pair["to_harbour_name"],
+                pair["count"],
+                pair["median_passage"],
+            )
+            for pair in response.data
+        ] == [("A", "B", 2, "2 00:00:00"), ("B", "C", 1, "2 00:00:00")]
+
+    @pytest.mark.parametrize(
+        "params, expected_pairs, test_id",
+        [
+            ({"ship_type": "fishing"}, [("A", "B")], "ship_type"),
+            # the passage to C arrives on the 7th, its origin is before from
+            ({"from": "2024-01-06T00:00:00Z"}, [("B", "C")], "arrivals_in_range"),
+        ],
+    )
+    def test_od_matrix_filters(
+        self, api_client_authenticated, harbours, params, expected_pairs, test_id
+    ):
+        # Arrange
+        self.sail(ShipFactory(type="tanker"), harbours, [0, 1, 2])
+        self.sail(ShipFactory(type="fishing"), harbours, [0, 1], first_day=2)
+        url = reverse("od_matrix")
+        query = {"from": "2024-01-01T00:00:00Z", "to": "2024-02-01T00:00:00Z"}
+
+        # Act
+        response = api_client_authenticated.get(url, {**query, **params})
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+        assert [
+            (pair["from_harbour_name"], pair["to_harbour_name"])
+            for pair in response.data
+        ] == expected_pairs, f"Test ID {test_id}"
+
+    def test_od_matrix_closed_period_cached(self, api_client_authenticated, harbours):
+        # Arrange
+        ship = ShipFactory()
+        self.sail(ship, harbours, [0, 1])
+        url = reverse("od_matrix")
+        query = {"from": "2024-01-01T00:00:00Z", "to": "2024-02-01T00:00:00Z"}
+        first = api_client_authenticated.get(url, query)
+        self.sail(ship, harbours, [2], first_day=20)
+
+        # Act
+        second = api_client_authenticated.get(url, query)
+
+        # Assert
+        assert second.data == first.data
+
+    @pytest.mark.parametrize(
+        "params, test_id",
+        [
+            ({}, "default_period"),
+            ({"from": "2024-01-01T00:00:00Z"}, "open_ended"),
+            ({"to": "2999-01-01T00:00:00Z"}, "future_to"),
+        ],
+    )
+    def test_od_matrix_open_period_not_cached(
+        self, api_client_authenticated, monkeypatch, params, test_id
+    ):
+        # Arrange
+        stored = []
+        monkeypatch.setattr(
+            cache, "set", lambda key, *args, **kwargs: stored.append(key)
+        )
+
+        # Act
+        response = api_client_authenticated.get(reverse("od_matrix"), params)
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+        assert not [key for key in stored if key.startswith("vtso:od-matrix")], test_id
+
+    @pytest.mark.parametrize(
+        "params, test_id",
+        [
+            ({"ship_type": "yacht"}, "unknown_ship_type"),
+            (
+                {"from": "2024-02-01T00:00:00Z", "to": "2024-01-01T00:00:00Z"},
+                "from_after_to",
+            ),
+        ],
+    )
+    def test_od_matrix_invalid_params(self, api_client_authenticated, params, test_id):
+        # Act
+        response = api_client_authenticated.get(reverse("od_matrix"), params)
+
+        # Assert
+        assert response.status_code == status.HTTP_400_BAD_REQUEST, test_id
+
+
+@pytest.mark.django_db
+class TestHarbourForecast:
+    """
+    Unit tests for /harbours/<int:pk>/forecast/
+    """
+
+    @pytest.fixture
+    def api_client_authenticated(self):
+        user = User.objects.create(username="test_user")
+        token = Token.objects.create(user=user)
+        client = APIClient()
+        client.force_authenticate(user=user, token=token)
+        return client
+
+    def test_harbour_forecast(self, api_client_authenticated, settings):
+        """
+        Tankers always stayed exactly 10 hours: a tanker docked 4 hours ago
+        with no known exit leaves in 6 hours, a ship with a known exit time
+        leaves at that time and a scheduled arrival takes a berth.
+        """
+        # Arrange
+        # UTC keeps the 10 hour stays 10 hours long across DST changes
+        now = datetime.now(tz=timezone.utc)
+        harbour = HarbourFactory(berths=3)
+        tanker = ShipFactory(type="tanker")
+        for day in range(1, 21):
+            VisitFactory(
+                harbour=harbour,
+                ship=tanker,
+                entry_time=now - timedelta(days=day, hours=10),
+                exit_time=now - timedelta(days=day),
+            )
+        settings.VTSO_DWELL_SETTLE_SECONDS = 0
+        learn_dwell_times()
+        VisitFactory(
+            harbour=harbour,
+            ship=tanker,
+            entry_time=now - timedelta(hours=4),
+            exit_time=None,
+        )
+        VisitFactory(
+            harbour=harbour,
+            entry_time=now - timedelta(hours=1),
+            exit_time=now + timedelta(hours=2, minutes=30),
+        )
+        VisitFactory(
+            harbour=harbour,
+            entry_time=now + timedelta(hours=7, minutes=30),
+            exit_time=now + timedelta(hours=20),
+        )
+        url = reverse("harbour_forecast", kwargs={"pk": harbour.id})
+
+        # Act
+        response = api_client_authenticated.get(url, {"hours": 8})
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["berths"] == 3
+        occupied = [point["expected_occupied"] for point in response.data["forecast"]]
+        assert occupied[:3] == [2.0, 2.0, 2.0]
+        assert occupied[3:7] == [1.0, 1.0, 1.0, 1.0]
+        # past 11 hours the smoothing keeps a 1/21 chance that the tanker stays
+        assert occupied[7] == pytest.approx(1 / 21, abs=0.01)
+        assert occupied[8] == pytest.approx(1 + 1 / 21, abs=0.01)
+        assert response.data["forecast"][0]["expected_free"] == 1.0
+
+    @pytest.mark.parametrize("analyze", [False, True])
+    def test_forecast_visits_skip_the_history(self, analyze):
+        if connection.vendor != "sqlite":
+            pytest.skip("EXPLAIN QUERY PLAN output is SQLite specific")
+
+        # Arrange
+        harbour = HarbourFactory()
+        VisitFactory.create_batch(
+            30,
+            harbour=harbour,
+            entry_time="2023-05-01T10:00:00Z",
+            exit_time="2023-05-02T10:00:00Z",
+        )
+        VisitFactory(harbour=harbour, exit_time=None)
+        if analyze:
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+        now = datetime.now(tz=timezone.utc)
+
+        # Act
+        plan = forecast_visits(harbour, now, now + timedelta(hours=8)).explain()
+
+        # Assert
+        assert "visit_open_harbour_idx" in plan, plan
+        assert "visit_exit_time_idx" in plan, plan
+        assert "visit_harbour_entry_idx" not in plan, plan
+
+    @pytest.mark.parametrize(
+        "hours, test_id", [(0, "zero_hours"), (1000, "too_many_hours"), ("x", "nan")]
+    )
+    def test_harbour_forecast_invalid_hours(
+        self, api_client_authenticated, hours, test_id
+    ):
+        # Arrange
+        url = reverse("harbour_forecast", kwargs={"pk": HarbourFactory().id})
+
+        # Act
+        response = api_client_authenticated.get(url, {"hours": hours})
+
+        # Assert
+        assert response.status_code == status.HTTP_400_BAD_REQUEST, test_id
+
+    def test_harbour_forecast_without_berths(self, api_client_authenticated):
+        # Arrange
+        url = reverse("harbour_forecast", kwargs={"pk": HarbourFactory().id})
+
+        # Act
+        response = api_client_authenticated.get(url)
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data["forecast"]) == 25
+        assert response.data["forecast"][0]["expected_free"] is None
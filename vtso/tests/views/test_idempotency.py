@@ -0,0 +1,145 @@
+from datetime import timedelta
+
+import pytest
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from vtso import clock
+from vtso.models import IdempotencyKey, Person, User, Visit
+from vtso.tests.factories import CompanyFactory, HarbourFactory, ShipFactory
+
+
+@pytest.mark.django_db
+class TestIdempotencyKey:
+    """
+    Unit tests for the Idempotency-Key header of the POST endpoints.
+    """
+
+    @pytest.fixture
+    def user(self):
+        return User.objects.create(username="test_user")
+
+    @pytest.fixture
+    def api_client_authenticated(self, user):
+        token = Token.objects.create(user=user)
+        client = APIClient()
+        client.force_authenticate(user=user, token=token)
+        return client
+
+    @pytest.fixture
+    def visit_data(self):
+        return {
+            "ship": ShipFactory().id,
+            "harbour": HarbourFactory().id,
+            "entry_time": "2023-05-26T10:00:00Z",
+        }
+
+    def post_visit(self, client, data, key="retry-1"):
+        return client.post(
+            reverse("visits"), data, format="json", HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def test_retry_replays_response(self, api_client_authenticated, visit_data):
+        # Arrange
+        first = self.post_visit(api_client_authenticated, visit_data)
+
+        # Act
+        retry = self.post_visit(api_client_authenticated, visit_data)
+
+        # Assert
+        assert first.status_code == status.HTTP_201_CREATED
+        assert retry.status_code == status.HTTP_201_CREATED
+        assert retry.data == first.data
+        assert retry["Idempotent-Replayed"] == "true"
+        assert "Idempotent-Replayed" not in first
+        assert Visit.objects.count() == 1
+
+    def test_retry_is_a_key_lookup(
+        self, api_client_authenticated, visit_data, django_assert_max_num_queries
+    ):
+        # Arrange
+        self.post_visit(api_client_authenticated, visit_data)
+
+        # Act
+        with django_assert_max_num_queries(3):
+            # the lookup, plus the savepoint of the request's transaction
+            response = self.post_visit(api_client_authenticated, visit_data)
+
+        # Assert
+        assert response.status_code == status.HTTP_201_CREATED
+
+    def test_key_reused_for_another_request(self, api_client_authenticated, visit_data):
+        # Arrange
+        self.post_visit(api_client_authenticated, visit_data)
+
+        # Act
+        response = self.post_visit(
+            api_client_authenticated,
+            {**visit_data, "entry_time": "2023-05-27T10:00:00Z"},
+        )
+
+        # Assert
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        assert Visit.objects.count() == 1
+
+    def test_keys_are_per_user(self, api_client_authenticated, visit_data):
+        # Arrange
+        other = User.objects.create(username="other_user")
+        other_client = APIClient()
+        other_client.force_authenticate(user=other)
+        self.post_visit(api_client_authenticated, visit_data)
+
+        # Act
+        response = self.post_visit(other_client, visit_data)
+
+        # Assert
+        assert response.status_code == status.HTTP_201_CREATED
+        assert "Idempotent-Replayed" not in response
+        assert Visit.objects.count() == 2
+
+    def test_expired_key_is_reused(self, api_client_authenticated, visit_data):
+        # Arrange
+        self.post_visit(api_client_authenticated, visit_data)
+        IdempotencyKey.objects.update(expires_at=clock.now() - timedelta(seconds=1))
+
+        # Act
+        response = self.post_visit(api_client_authenticated, visit_data)
+
+        # Assert
+        assert response.status_code == status.HTTP_201_CREATED
+        assert "Idempotent-Replayed" not in response
+        assert Visit.objects.count() == 2
+        assert IdempotencyKey.objects.count() == 1
+
+    def test_failed_request_releases_key(self, api_client_authenticated):
+        """
+        A rejected request does not keep its key, so the fixed request
+        can be sent with the same key.
+        """
+        # Arrange
+        url = reverse("persons")
+        headers = {"HTTP_IDEMPOTENCY_KEY": "person-1"}
+        data = {"name": "Jane Doe", "email": "not an email"}
+        rejected = api_client_authenticated.post(url, data, format="json", **headers)
+
+        # Act
+        data = {"name": "Jane Doe", "company": CompanyFactory().id}
+        response = api_client_authenticated.post(url, data, format="json", **headers)
+
+        # Assert
+        assert rejected.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.status_code == status.HTTP_201_CREATED
+        assert Person.objects.count() == 1
+
+    @pytest.mark.parametrize(
+        "key, test_id", [("", "empty_key"), ("k" * 256, "key_too_long")]
+    )
+    def test_invalid_key(self, api_client_authenticated, visit_data, key, test_id):
+        # Act
+        response = self.post_visit(api_client_authenticated, visit_data, key=key)
+
+        # Assert
+        assert response.status_code == status.HTTP_400_BAD_REQUEST, test_id
+        assert not Visit.objects.exists()
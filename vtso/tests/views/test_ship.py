@@ -1,11 +1,31 @@
+from datetime import datetime, timedelta
+
 import pytest
+from django.db.models import F
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.timezone import get_current_timezone
 from rest_framework import status
 from rest_framework.authtoken.models import Token
+from rest_framework.fields import DateTimeField
 from rest_framework.test import APIClient
 
-from vtso.models import User
-from vtso.tests.factories import CompanyFactory, ShipFactory, VisitFactory
+from vtso.archive import archive_batch
+from vtso.models import Ship, User
+from vtso.tests.factories import (
+    CompanyFactory,
+    HarbourFactory,
+    ShipFactory,
+    VisitFactory,
+)
+from vtso.views import ShipDetail
+
+
+def response_time(value: str) -> str:
+    """
+    Formats a "YYYY-MM-DDTHH:MM:SSZ" string like the API renders datetimes.
+    """
+    return DateTimeField().to_representation(DateTimeField().to_internal_value(value))
 
 
 class TestShipList:
@@ -77,6 +97,154 @@ class TestShipList:
         assert response.status_code == status.HTTP_200_OK
         assert len(response.data) == 2
 
+    @pytest.mark.django_db
+    @pytest.mark.parametrize(
+        "query, expected_names, test_id",
+        [
+            ({"age_min": 30}, ["Titanic", "Ocean Pearl"], "age_min"),
+            ({"age_max": 30}, ["Sea Master"], "age_max"),
+            ({"age_min": 10, "age_max": 50}, ["Ocean Pearl"], "age_range"),
+            ({"year_built": 1912}, ["Titanic"], "year_built"),
+            ({"ordering": "age"}, ["Sea Master", "Ocean Pearl", "Titanic"], "age_asc"),
+            (
+                {"ordering": "-age"},
+                ["Titanic", "Ocean Pearl", "Sea Master"],
+                "age_desc",
+            ),
+        ],
+    )
+    def test_ship_list_age_filters(
+        self, api_client_authenticated, query, expected_names, test_id
+    ):
+        """
+        GET /ships/ should filter and sort by age using year_built.
+        """
+        # Arrange
+        current_year = datetime.now(tz=get_current_timezone()).year
+        ShipFactory(name="Titanic", year_built="1912")
+        ShipFactory(name="Ocean Pearl", year_built=str(current_year - 40))
+        ShipFactory(name="Sea Master", year_built=str(current_year - 2))
+        url = reverse("ships")
+
+        # Act
+        response = api_client_authenticated.get(url, query)
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+        names = [ship["name"] for ship in response.data]
+        if "ordering" not in query:
+            names = sorted(names, key=expected_names.index)
+        assert names == expected_names, f"Test ID {test_id}"
+        assert "year_built_int" not in response.data[0]
+
+    @pytest.mark.django_db
+    def test_ship_list_current_harbour(self, api_client_authenticated):
+        """
+        GET /ships/?current_harbour= should list the Ships in port there.
+        """
+        # Arrange
+        harbour = HarbourFactory()
+        docked = ShipFactory(name="Ocean Pearl")
+        visit = VisitFactory(ship=docked, harbour=harbour, exit_time=None)
+        VisitFactory(harbour=harbour)
+        ShipFactory(name="Titanic")
+        url = reverse("ships")
+
+        # Act
+        response = api_client_authenticated.get(url, {"current_harbour": harbour.id})
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+        assert [ship["name"] for ship in response.data] == ["Ocean Pearl"]
+        assert response.data[0]["current_harbour"] == harbour.id
+        assert response.data[0]["current_visit"] == visit.id
+
+    @pytest.mark.django_db
+    def test_ship_list_current_harbour_matches_harbour_details(
+        self, api_client_authenticated
+    ):
+        """
+        ?current_harbour= should list the Ships docked in the harbour details:
+        a Visit in progress with a known exit_time counts, a Visit that has
+        not started yet does not.
+        """
+        # Arrange
+        harbour = HarbourFactory()
+        now = timezone.now()
+        VisitFactory(
+            ship=ShipFactory(name="Ocean Pearl"),
+            harbour=harbour,
+            entry_time=now - timedelta(hours=2),
+            exit_time=now + timedelta(hours=5),
+        )
+        VisitFactory(
+            ship=ShipFactory(name="Titanic"),
+            harbour=harbour,
+            entry_time=now + timedelta(days=3),
+            exit_time=None,
+        )
+
+        # Act
+        ships = api_client_authenticated.get(
+            reverse("ships"), {"current_harbour": harbour.id}
+        )
+        details = api_client_authenticated.get(
+            reverse("harbour_details", kwargs={"pk": harbour.id})
+        )
+
+        # Assert
+        assert [ship["name"] for ship in ships.data] == ["Ocean Pearl"]
+        assert [ship["name"] for ship in details.data["current_ships"]] == [
+            "Ocean Pearl"
+        ]
+
+    @pytest.mark.django_db
+    def test_ship_list_by_ids(self, api_client_authenticated):
+        """
+        GET /ships/?ids= should return the requested Ships in the
+        requested order and report the missing ids.
+        """
+        # Arrange
+        ships = ShipFactory.create_batch(3)
+        ids = [ships[2].id, 999, ships[0].id, ships[2].id]
+        url = reverse("ships")
+
+        # Act
+        response = api_client_authenticated.get(url, {"ids": ",".join(map(str, ids))})
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+        assert [ship["id"] for ship in response.data["results"]] == [
+            ships[2].id,
+            ships[0].id,
+        ]
+        assert response.data["missing"] == [999]
+
+    @pytest.mark.django_db
+    @pytest.mark.parametrize(
+        "ids, test_id",
+        [
+            ("1,two", "error_not_an_integer"),
+            ("1,2,3", "error_too_many_ids"),
+        ],
+    )
+    def test_ship_list_by_ids_invalid(
+        self, api_client_authenticated, settings, ids, test_id
+    ):
+        """
+        GET /ships/?ids= should return 400 for invalid or too many ids.
+        """
+        # Arrange
+        settings.VTSO_MULTI_GET_MAX_IDS = 2
+        url = reverse("ships")
+
+        # Act
+        response = api_client_authenticated.get(url, {"ids": ids})
+
+        # Assert
+        assert response.status_code == status.HTTP_400_BAD_REQUEST, test_id
+        assert "ids" in response.data
+
     @pytest.mark.django_db
     def test_create_ship(self, api_client_authenticated):
         """
@@ -281,6 +449,263 @@ class TestShipDetail:
         assert response.data["name"] == data["name"]
 
 
+@pytest.mark.django_db
+class TestShipDetailConcurrency:
+    """
+    Unit tests for the If-Match handling of /ships/pk/.
+    """
+
+    @pytest.fixture
+    def api_client_authenticated(self):
+        user = User.objects.create(username="test_user")
+        token = Token.objects.create(user=user)
+        client = APIClient()
+        client.force_authenticate(user=user, token=token)
+        return client
+
+    def test_ship_detail_etag(self, api_client_authenticated):
+        # Arrange
+        ship = ShipFactory()
+        url = reverse("ship_detail", kwargs={"pk": ship.id})
+
+        # Act
+        response = api_client_authenticated.get(url)
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+        assert response["ETag"] == '"1"'
+        assert response.data["version"] == 1
+
+    @pytest.mark.parametrize(
+        "if_match, test_id",
+        [('"1"', "current_etag"), ('"0", "1"', "etag_list"), ("*", "any")],
+    )
+    def test_ship_update_if_match(self, api_client_authenticated, if_match, test_id):
+        # Arrange
+        ship = ShipFactory()
+        url = reverse("ship_detail", kwargs={"pk": ship.id})
+
+        # Act
+        response = api_client_authenticated.patch(
+            url, {"name": "Titanic"}, format="json", HTTP_IF_MATCH=if_match
+        )
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK, test_id
+        assert response["ETag"] == '"2"'
+        assert response.data["version"] == 2
+
+    def test_ship_update_if_match_compressed(self, api_client_authenticated, settings):
+        """
+        The weak ETag of a compressed response is accepted as If-Match.
+        """
+        # Arrange
+        settings.VTSO_COMPRESSION_MIN_SIZE = 0
+        ship = ShipFactory()
+        url = reverse("ship_detail", kwargs={"pk": ship.id})
+        etag = api_client_authenticated.get(url, HTTP_ACCEPT_ENCODING="gzip")["ETag"]
+
+        # Act
+        response = api_client_authenticated.patch(
+            url,
+            {"name": "Titanic"},
+            format="json",
+            HTTP_IF_MATCH=etag,
+            HTTP_ACCEPT_ENCODING="gzip",
+        )
+        stale = api_client_authenticated.patch(
+            url, {"name": "Olympic"}, format="json", HTTP_IF_MATCH=etag
+        )
+
+        # Assert
+        assert etag == 'W/"1"'
+        assert response.status_code == status.HTTP_200_OK
+        assert response["ETag"] == 'W/"2"'
+        assert stale.status_code == status.HTTP_412_PRECONDITION_FAILED
+
+    def test_ship_update_stale_if_match(self, api_client_authenticated):
+        """
+        An update based on an outdated read should return 412 and not write.
+        """
+        # Arrange
+        ship = ShipFactory(name="Sea Master")
+        url = reverse("ship_detail", kwargs={"pk": ship.id})
+        api_client_authenticated.patch(
+            url, {"flag": "NZ"}, format="json", HTTP_IF_MATCH='"1"'
+        )
+
+        # Act
+        response = api_client_authenticated.patch(
+            url, {"name": "Titanic"}, format="json", HTTP_IF_MATCH='"1"'
+        )
+
+        # Assert
+        assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+        ship.refresh_from_db()
+        assert ship.name == "Sea Master"
+        assert ship.version == 2
+
+    def test_ship_update_racing_write(self, api_client_authenticated, monkeypatch):
+        """
+        A write landing between the read and the write of an update
+        should make the update fail with 412, even without If-Match.
+        """
+        # Arrange
+        ship = ShipFactory(name="Sea Master")
+        url = reverse("ship_detail", kwargs={"pk": ship.id})
+        check_if_match = ShipDetail.check_if_match
+
+        def racing_write(view, instance):
+            Ship.objects.filter(pk=instance.pk).update(version=F("version") + 1)
+            check_if_match(view, instance)
+
+        monkeypatch.setattr(ShipDetail, "check_if_match", racing_write)
+
+        # Act
+        response = api_client_authenticated.put(
+            url, {"name": "Titanic", "company": ship.company_id}, format="json"
+        )
+
+        # Assert
+        assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+        ship.refresh_from_db()
+        assert ship.name == "Sea Master"
+
+    def test_ship_bulk_update_bumps_version(self, api_client_authenticated):
+        # Arrange
+        ship = ShipFactory()
+
+        # Act
+        response = api_client_authenticated.patch(
+            reverse("ships_bulk"), [{"id": ship.id, "flag": "NZ"}], format="json"
+        )
+
+        # Assert
+        assert response.data[0]["data"]["version"] == 2
+        ship.refresh_from_db()
+        assert ship.version == 2
+
+
+class TestShipBulkUpdate:
+    """
+    Unit tests for /ships/bulk/
+    """
+
+    @pytest.fixture
+    def api_client_authenticated(self):
+        user = User.objects.create(username="test_user")
+        token = Token.objects.create(user=user)
+        client = APIClient()
+        client.force_authenticate(user=user, token=token)
+        return client
+
+    @pytest.mark.django_db
+    def test_ship_bulk_update(self, api_client_authenticated):
+        """
+        PATCH /ships/bulk/ should update the valid items and report
+        per-item results for the invalid and unknown ones.
+        """
+        # Arrange
+        ships = ShipFactory.create_batch(3, flag="AU", tonnage=1000)
+        data = [
+            {"id": ships[0].id, "flag": "NZ", "year_built": "1999"},
+            {"id": ships[1].id, "tonnage": -5},
+            {"id": 999, "flag": "NZ"},
+            {"id": ships[2].id, "type": "tanker", "tonnage": 2000},
+        ]
+        url = reverse("ships_bulk")
+
+        # Act
+        response = api_client_authenticated.patch(url, data, format="json")
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+        assert [(r["id"], r["status"]) for r in response.data] == [
+            (ships[0].id, 200),
+            (ships[1].id, 400),
+            (999, 404),
+            (ships[2].id, 200),
+        ]
+        assert response.data[0]["data"]["flag"] == "NZ"
+        assert "tonnage" in response.data[1]["errors"]
+        for ship in ships:
+            ship.refresh_from_db()
+        assert (ships[0].flag, ships[0].year_built_int) == ("NZ", 1999)
+        assert ships[1].tonnage == 1000
+        assert (ships[2].type, ships[2].tonnage) == ("tanker", 2000)
+
+    @pytest.mark.django_db
+    def test_ship_bulk_update_versions(self, api_client_authenticated):
+        """
+        Items carrying a version are only applied if the Ship was not
+        modified since, the other items go through.
+        """
+        # Arrange
+        ships = ShipFactory.create_batch(4, flag="AU")
+        Ship.objects.filter(pk=ships[1].pk).update(version=F("version") + 1)
+        data = [
+            {"id": ships[0].id, "version": 1, "flag": "NZ"},
+            {"id": ships[1].id, "version": 1, "flag": "NZ"},
+            {"id": ships[2].id, "version": "1", "flag": "NZ"},
+            {"id": ships[3].id, "flag": "NZ"},
+        ]
+
+        # Act
+        response = api_client_authenticated.patch(
+            reverse("ships_bulk"), data, format="json"
+        )
+
+        # Assert
+        assert [(r["id"], r["status"]) for r in response.data] == [
+            (ships[0].id, 200),
+            (ships[1].id, 412),
+            (ships[2].id, 400),
+            (ships[3].id, 200),
+        ]
+        assert response.data[0]["data"]["version"] == 2
+        assert "version" in response.data[2]["errors"]
+        flags = dict(Ship.objects.values_list("id", "flag"))
+        assert [flags[ship.id] for ship in ships] == ["NZ", "AU", "AU", "NZ"]
+
+    @pytest.mark.django_db
+    def test_ship_bulk_update_query_count(
+        self, api_client_authenticated, django_assert_max_num_queries
+    ):
+        """
+        PATCH /ships/bulk/ should not run queries per Ship.
+        """
+        # Arrange
+        ships = ShipFactory.create_batch(20)
+        data = [{"id": ship.id, "flag": "NZ"} for ship in ships]
+        url = reverse("ships_bulk")
+
+        # Act
+        with django_assert_max_num_queries(5):
+            response = api_client_authenticated.patch(url, data, format="json")
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+
+    @pytest.mark.django_db
+    @pytest.mark.parametrize(
+        "data, test_id",
+        [
+            ({"id": 1, "flag": "NZ"}, "error_not_a_list"),
+            ([], "error_empty_list"),
+        ],
+    )
+    def test_ship_bulk_update_invalid_body(
+        self, api_client_authenticated, data, test_id
+    ):
+        # Act
+        response = api_client_authenticated.patch(
+            reverse("ships_bulk"), data, format="json"
+        )
+
+        # Assert
+        assert response.status_code == status.HTTP_400_BAD_REQUEST, test_id
+
+
 class TestShipVisits:
     """
     Unit tests for /ships/pk/visits/
@@ -330,6 +755,47 @@ class TestShipVisits:
         assert response.status_code == status.HTTP_200_OK
         assert len(response.data) == 2
 
+    @pytest.mark.django_db
+    @pytest.mark.parametrize(
+        "query, expected, test_id",
+        [
+            ({}, [0, 1, 2], "all_visits"),
+            ({"entry_time_after": "2020-01-01T00:00:00Z"}, [1, 2], "after_2020"),
+            ({"entry_time_after": "2023-01-01T00:00:00Z"}, [2], "hot_only"),
+            ({"entry_time_before": "2020-01-01T00:00:00Z"}, [0], "before_2020"),
+        ],
+    )
+    def test_ship_visits_include_archive(
+        self, api_client_authenticated, query, expected, test_id
+    ):
+        """
+        GET /ships/<int:pk>/visits should list archived Visits
+        when the requested range reaches into archived history.
+        """
+        # Arrange
+        ship = ShipFactory()
+        visits = [
+            VisitFactory(
+                ship=ship,
+                entry_time=f"{year}-01-01T00:00:00Z",
+                exit_time=f"{year}-01-02T00:00:00Z",
+            )
+            for year in (2010, 2021, 2024)
+        ]
+        archive_batch(
+            before=datetime(2022, 1, 1, tzinfo=get_current_timezone()), batch_size=10
+        )
+        url = reverse("ship_visits", kwargs={"pk": ship.pk})
+
+        # Act
+        response = api_client_authenticated.get(url, query)
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+        assert [visit["entry_time"] for visit in response.data] == [
+            response_time(visits[i].entry_time) for i in expected
+        ], f"Test ID {test_id}"
+
     @pytest.mark.django_db
     def test_ship_visits_no_visits(self, api_client_authenticated):
         """
@@ -356,3 +822,133 @@ class TestShipVisits:
 
         assert response.status_code == status.HTTP_404_NOT_FOUND
         assert "Ship not found" in response.data["detail"]
+
+
+class TestShipItinerary:
+    """
+    Unit tests for /ships/pk/itinerary/
+    """
+
+    @pytest.fixture
+    def api_client_authenticated(self):
+        user = User.objects.create(username="test_user")
+        token = Token.objects.create(user=user)
+        client = APIClient()
+        client.force_authenticate(user=user, token=token)
+        return client
+
+    @pytest.fixture
+    def voyage(self):
+        """
+        A Ship calling at harbours A, B, C and A again,
+        one day in port and two days at sea each time.
+        """
+        ship = ShipFactory()
+        harbours = [HarbourFactory(name=name) for name in ("A", "B", "C")]
+        calls = [
+            VisitFactory(
+                ship=ship,
+                harbour=harbours[harbour],
+                entry_time=f"2024-01-{1 + 3 * day:02d}T00:00:00Z",
+                exit_time=f"2024-01-{2 + 3 * day:02d}T00:00:00Z",
+            )
+            for day, harbour in enumerate([0, 1, 2, 0])
+        ]
+        # another ship
+        VisitFactory(harbour=harbours[1], entry_time="2024-01-05T00:00:00Z")
+        return ship, calls
+
+    @pytest.mark.django_db
+    def test_ship_itinerary(self, api_client_authenticated, voyage):
+        # Arrange
+        ship, calls = voyage
+        url = reverse("ship_itinerary", kwargs={"pk": ship.pk})
+
+        # Act
+        response = api_client_authenticated.get(url)
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+        assert [
+            (
+                call["previous_harbour_name"],
+                call["harbour_name"],
+                call["next_harbour_name"],
+            )
+            for call in response.data
+        ] == [(None, "A", "B"), ("A", "B", "C"), ("B", "C", "A"), ("C", "A", None)]
+        second = response.data[1]
+        assert second["id"] == calls[1].id
+        assert second["time_in_port"] == "1 00:00:00"
+        assert second["time_at_sea_before"] == "2 00:00:00"
+        assert second["time_at_sea_after"] == "2 00:00:00"
+        assert response.data[0]["time_at_sea_before"] is None
+
+    @pytest.mark.django_db
+    def test_ship_itinerary_range_keeps_neighbours(
+        self, api_client_authenticated, voyage
+    ):
+        """
+        The calls at the edges of the range keep their previous and next
+        harbours even though those calls are outside the range.
+        """
+        # Arrange
+        ship, calls = voyage
+        url = reverse("ship_itinerary", kwargs={"pk": ship.pk})
+
+        # Act
+        response = api_client_authenticated.get(
+            url,
+            {
+                "entry_time_after": "2024-01-03T00:00:00Z",
+                "entry_time_before": "2024-01-08T00:00:00Z",
+            },
+        )
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+        assert [call["id"] for call in response.data] == [calls[1].id, calls[2].id]
+        assert response.data[0]["previous_harbour_name"] == "A"
+        assert response.data[-1]["next_harbour_name"] == "A"
+
+    @pytest.mark.django_db
+    @pytest.mark.parametrize(
+        "query, test_id",
+        [
+            ({}, "whole_history"),
+            ({"entry_time_after": "2024-01-06T00:00:00Z"}, "previous_call_archived"),
+        ],
+    )
+    def test_ship_itinerary_with_archive(
+        self, api_client_authenticated, voyage, query, test_id
+    ):
+        # Arrange
+        ship, calls = voyage
+        archive_batch(
+            before=datetime(2024, 1, 6, tzinfo=get_current_timezone()), batch_size=10
+        )
+        url = reverse("ship_itinerary", kwargs={"pk": ship.pk})
+
+        # Act
+        response = api_client_authenticated.get(url, query)
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data[0]["previous_harbour_name"] == (
+            None if not query else "B"
+        ), f"Test ID {test_id}"
+        assert [call["next_harbour_name"] for call in response.data][-2:] == [
+            "A",
+            None,
+        ]
+
+    @pytest.mark.django_db
+    def test_ship_itinerary_not_found(self, api_client_authenticated):
+        # Arrange
+        url = reverse("ship_itinerary", kwargs={"pk": 999})
+
+        # Act
+        response = api_client_authenticated.get(url)
+
+        # Assert
+        assert response.status_code == status.HTTP_404_NOT_FOUND
@@ -0,0 +1,83 @@
+import pytest
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from vtso.models import User
+from vtso.tests.factories import ShipFactory
+from vtso.throttling import ClientRateThrottle
+
+
+@pytest.mark.django_db
+class TestClientRateThrottle:
+    """
+    Unit tests for the per client and endpoint rate limits.
+    """
+
+    @pytest.fixture(autouse=True)
+    def rates(self, monkeypatch):
+        monkeypatch.setattr(
+            ClientRateThrottle,
+            "THROTTLE_RATES",
+            {"expensive": "2/minute", "cheap": "4/minute"},
+        )
+        # pinned mid-window, so the requests of a test never straddle two
+        monkeypatch.setattr(ClientRateThrottle, "timer", staticmethod(lambda: 90.0))
+
+    def authenticated_client(self, username):
+        user = User.objects.create(username=username)
+        token = Token.objects.create(user=user)
+        client = APIClient()
+        client.force_authenticate(user=user, token=token)
+        return client
+
+    @pytest.mark.parametrize(
+        "url_name, budget, test_id",
+        [
+            ("ships", 2, "expensive_list"),
+            ("ship_detail", 4, "cheap_detail"),
+        ],
+    )
+    def test_budget_per_scope(self, url_name, budget, test_id):
+        # Arrange
+        ship = ShipFactory()
+        client = self.authenticated_client("test_user")
+        kwargs = {"pk": ship.id} if url_name == "ship_detail" else {}
+        url = reverse(url_name, kwargs=kwargs)
+
+        # Act
+        statuses = [client.get(url).status_code for _ in range(budget + 1)]
+
+        # Assert
+        assert statuses[:budget] == [status.HTTP_200_OK] * budget, f"Test ID {test_id}"
+        assert statuses[budget] == status.HTTP_429_TOO_MANY_REQUESTS
+
+    def test_throttled_response_has_retry_after(self):
+        # Arrange
+        client = self.authenticated_client("test_user")
+        url = reverse("visits")
+        client.get(url)
+        client.get(url)
+
+        # Act
+        response = client.get(url)
+
+        # Assert
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert 0 < int(response.headers["Retry-After"]) <= 60
+
+    def test_budgets_are_per_client_and_endpoint(self):
+        # Arrange
+        hammering = self.authenticated_client("hammering")
+        other = self.authenticated_client("other")
+        for _ in range(3):
+            hammering.get(reverse("visits"))
+
+        # Act
+        other_response = other.get(reverse("visits"))
+        other_endpoint_response = hammering.get(reverse("harbours"))
+
+        # Assert
+        assert other_response.status_code == status.HTTP_200_OK
+        assert other_endpoint_response.status_code == status.HTTP_200_OK
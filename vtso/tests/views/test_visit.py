@@ -1,10 +1,16 @@
+from datetime import datetime
+
 import pytest
+from django.db import connection
 from django.urls import reverse
+from django.utils.timezone import get_current_timezone
 from rest_framework import status
 from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 
-from vtso.models import User
+from vtso.archive import archive_batch
+from vtso.filters import VisitFilter
+from vtso.models import ArchivedVisit, User, Visit
 from vtso.tests.factories import (
     CompanyFactory,
     HarbourFactory,
@@ -156,3 +162,342 @@ class TestVisitList:
 
         # Assert
         assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+class TestVisitListFilters:
+    """
+    Unit tests for the filters of /visits/
+    """
+
+    @pytest.fixture
+    def api_client_authenticated(self):
+        user = User.objects.create(username="test_user")
+        token = Token.objects.create(user=user)
+        client = APIClient()
+        client.force_authenticate(user=user, token=token)
+        return client
+
+    @pytest.fixture
+    def visits(self):
+        harbours = HarbourFactory.create_batch(2)
+        ship = ShipFactory()
+        return [
+            VisitFactory(
+                ship=ship,
+                harbour=harbours[0],
+                entry_time="2023-05-26T10:00:00Z",
+                exit_time="2023-05-26T14:00:00Z",
+            ),
+            VisitFactory(
+                harbour=harbours[0],
+                entry_time="2023-05-27T10:00:00Z",
+                exit_time="2023-05-28T10:00:00Z",
+            ),
+            VisitFactory(
+                ship=ship,
+                harbour=harbours[1],
+                entry_time="2023-05-28T10:00:00Z",
+                exit_time="2023-05-29T10:00:00Z",
+            ),
+        ]
+
+    @pytest.mark.parametrize(
+        "query, expected, test_id",
+        [
+            ({"entry_time_after": "2023-05-27T00:00:00Z"}, [1, 2], "entry_after"),
+            ({"entry_time_before": "2023-05-27T10:00:00Z"}, [0, 1], "entry_before"),
+            ({"exit_time_after": "2023-05-28T10:00:00Z"}, [1, 2], "exit_after"),
+            (
+                {
+                    "harbour": "harbour0",
+                    "entry_time_after": "2023-05-27T00:00:00Z",
+                    "entry_time_before": "2023-06-01T00:00:00Z",
+                },
+                [1],
+                "harbour_week",
+            ),
+            ({"ship": "ship0"}, [0, 2], "ship"),
+            ({"ordering": "-entry_time"}, [2, 1, 0], "ordering"),
+        ],
+    )
+    @pytest.mark.parametrize("archived", [False, True])
+    def test_visit_list_filters(
+        self, api_client_authenticated, visits, query, expected, test_id, archived
+    ):
+        # Arrange
+        if archived:
+            archive_batch(datetime.fromisoformat("2023-05-27T00:00:00Z"), 10)
+        ids = {
+            "harbour0": visits[0].harbour_id,
+            "ship0": visits[0].ship_id,
+        }
+        query = {key: ids.get(value, value) for key, value in query.items()}
+        url = reverse("visits")
+
+        # Act
+        response = api_client_authenticated.get(url, query)
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+        ids = [visit["id"] for visit in response.data]
+        if "ordering" not in query:
+            ids = sorted(ids)
+        assert ids == [visits[i].id for i in expected], f"Test ID {test_id}"
+
+    def test_visit_list_serves_archived_visits(self, api_client_authenticated, visits):
+        """
+        Archived Visits are listed like the hot ones, and the archive is not
+        read when the filters cannot match it.
+        """
+        # Arrange
+        url = reverse("visits")
+        before = api_client_authenticated.get(url, {"ordering": "id"}).data
+
+        # Act
+        archive_batch(datetime.fromisoformat("2023-05-29T00:00:00Z"), 10)
+        after = api_client_authenticated.get(url, {"ordering": "id"}).data
+        recent = api_client_authenticated.get(
+            url, {"entry_time_after": "2023-05-28T00:00:00Z"}
+        ).data
+
+        # Assert
+        assert ArchivedVisit.objects.count() == 2
+        assert after == before
+        assert [visit["id"] for visit in recent] == [visits[2].id]
+
+    def test_visit_list_invalid_filter(self, api_client_authenticated):
+        # Act
+        response = api_client_authenticated.get(
+            reverse("visits"), {"entry_time_after": "last hour"}
+        )
+
+        # Assert
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    @pytest.mark.parametrize(
+        "query, test_id",
+        [
+            ({"entry_time_after": "2023-05-27T00:00:00Z"}, "entry_range"),
+            ({"exit_time_after": "2023-05-27T00:00:00Z"}, "exit_range"),
+            (
+                {"harbour": 1, "entry_time_after": "2023-05-27T00:00:00Z"},
+                "harbour_entry_range",
+            ),
+            (
+                {"ship": 1, "entry_time_after": "2023-05-27T00:00:00Z"},
+                "ship_entry_range",
+            ),
+        ],
+    )
+    def test_visit_filters_use_an_index(self, visits, query, test_id):
+        """
+        EXPLAIN should show that the common filter combinations
+        are answered from an index rather than a table scan.
+        """
+        if connection.vendor != "sqlite":
+            pytest.skip("EXPLAIN QUERY PLAN output is SQLite specific")
+
+        # Arrange
+        filterset = VisitFilter(query, queryset=Visit.objects.all())
+
+        # Act
+        plan = filterset.qs.explain()
+
+        # Assert
+        assert "USING INDEX" in plan or "USING COVERING INDEX" in plan, test_id
+        assert "SCAN VISIT" not in plan, f"Test ID {test_id}: {plan}"
+
+
+@pytest.mark.django_db
+class TestOpenVisits:
+    """
+    Unit tests for open Visits: ?open= on /visits/ and /visits/<pk>/close/
+    """
+
+    @pytest.fixture
+    def api_client_authenticated(self):
+        user = User.objects.create(username="test_user")
+        token = Token.objects.create(user=user)
+        client = APIClient()
+        client.force_authenticate(user=user, token=token)
+        return client
+
+    @pytest.fixture
+    def open_visit(self):
+        return VisitFactory(entry_time="2023-05-26T10:00:00Z", exit_time=None)
+
+    @pytest.mark.parametrize(
+        "value, expected_open, test_id",
+        [("true", True, "open_only"), ("false", False, "closed_only")],
+    )
+    def test_visit_list_open_filter(
+        self, api_client_authenticated, open_visit, value, expected_open, test_id
+    ):
+        # Arrange
+        closed_visit = VisitFactory()
+
+        # Act
+        response = api_client_authenticated.get(reverse("visits"), {"open": value})
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+        assert [visit["id"] for visit in response.data] == [
+            open_visit.id if expected_open else closed_visit.id
+        ], f"Test ID {test_id}"
+
+    def test_create_open_visit(self, api_client_authenticated):
+        # Arrange
+        data = {
+            "ship": ShipFactory().id,
+            "harbour": HarbourFactory().id,
+            "entry_time": "2023-05-26T10:00:00Z",
+        }
+
+        # Act
+        response = api_client_authenticated.post(reverse("visits"), data)
+
+        # Assert
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data["exit_time"] is None
+
+    def test_close_visit(self, api_client_authenticated, open_visit):
+        # Arrange
+        url = reverse("visit_close", kwargs={"pk": open_visit.id})
+
+        # Act
+        response = api_client_authenticated.post(
+            url, {"exit_time": "2023-05-27T10:00:00Z"}
+        )
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+        open_visit.refresh_from_db()
+        assert open_visit.exit_time.isoformat() == "2023-05-27T10:00:00+00:00"
+        assert response.data["id"] == open_visit.id
+
+    def test_close_visit_defaults_to_now(self, api_client_authenticated, open_visit):
+        # Arrange
+        url = reverse("visit_close", kwargs={"pk": open_visit.id})
+
+        # Act
+        response = api_client_authenticated.post(url)
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+        open_visit.refresh_from_db()
+        assert not open_visit.is_open
+
+    @pytest.mark.parametrize(
+        "exit_time, test_id",
+        [("2023-05-25T10:00:00Z", "exit_before_entry"), ("tomorrow", "invalid_time")],
+    )
+    def test_close_visit_invalid_exit_time(
+        self, api_client_authenticated, open_visit, exit_time, test_id
+    ):
+        # Arrange
+        url = reverse("visit_close", kwargs={"pk": open_visit.id})
+
+        # Act
+        response = api_client_authenticated.post(url, {"exit_time": exit_time})
+
+        # Assert
+        assert response.status_code == status.HTTP_400_BAD_REQUEST, test_id
+        open_visit.refresh_from_db()
+        assert open_visit.is_open
+
+    @pytest.mark.parametrize(
+        "pk, expected_status, test_id",
+        [
+            ("closed", status.HTTP_400_BAD_REQUEST, "already_closed"),
+            (999, status.HTTP_404_NOT_FOUND, "not_found"),
+        ],
+    )
+    def test_close_visit_errors(
+        self, api_client_authenticated, pk, expected_status, test_id
+    ):
+        # Arrange
+        if pk == "closed":
+            pk = VisitFactory().id
+        url = reverse("visit_close", kwargs={"pk": pk})
+
+        # Act
+        response = api_client_authenticated.post(url)
+
+        # Assert
+        assert response.status_code == expected_status, test_id
+
+    def test_close_visit_stale_if_match(self, api_client_authenticated, open_visit):
+        # Arrange
+        url = reverse("visit_close", kwargs={"pk": open_visit.id})
+
+        # Act
+        response = api_client_authenticated.post(url, HTTP_IF_MATCH='"0"')
+
+        # Assert
+        assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+        open_visit.refresh_from_db()
+        assert open_visit.is_open
+
+    def test_close_visit_etag(self, api_client_authenticated, open_visit):
+        # Arrange
+        url = reverse("visit_close", kwargs={"pk": open_visit.id})
+
+        # Act
+        response = api_client_authenticated.post(url, HTTP_IF_MATCH='"1"')
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+        assert response["ETag"] == '"2"'
+
+    @pytest.mark.parametrize("analyze", [False, True])
+    def test_current_visits_use_bounded_indexes(self, open_visit, analyze):
+        """
+        The query behind the docked Ships of /harbours/<pk>/details/ reads
+        the open Visits from the partial index and the closed ones from
+        visit_exit_time_idx, never the history of the Harbour.
+        """
+        if connection.vendor != "sqlite":
+            pytest.skip("EXPLAIN QUERY PLAN output is SQLite specific")
+
+        # Arrange
+        VisitFactory.create_batch(
+            30,
+            ship=open_visit.ship,
+            harbour=open_visit.harbour,
+            entry_time="2023-05-01T10:00:00Z",
+            exit_time="2023-05-02T10:00:00Z",
+        )
+        if analyze:
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+        # Act
+        plan = Visit.objects.filter(harbour=open_visit.harbour_id).current().explain()
+
+        # Assert
+        assert "visit_open_harbour_idx" in plan, plan
+        assert "visit_exit_time_idx" in plan, plan
+        assert "visit_harbour_entry_idx" not in plan, plan
+
+    def test_current_visits(self, open_visit):
+        # Arrange
+        harbour = open_visit.harbour
+        closing = VisitFactory(
+            harbour=harbour,
+            entry_time="2023-05-26T08:00:00Z",
+            exit_time="2023-05-27T08:00:00Z",
+        )
+        VisitFactory(
+            harbour=harbour,
+            entry_time="2023-05-25T08:00:00Z",
+            exit_time="2023-05-26T08:00:00Z",
+        )
+        VisitFactory(harbour=harbour, entry_time="2023-05-27T08:00:00Z")
+        at = datetime(2023, 5, 26, 22, tzinfo=get_current_timezone())
+
+        # Act
+        visits = Visit.objects.filter(harbour=harbour).current(at)
+
+        # Assert
+        assert sorted(visit.id for visit in visits) == [open_visit.id, closing.id]
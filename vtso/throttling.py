@@ -0,0 +1,150 @@
+"""
+Per-client rate limiting and admission control.
+
+ClientRateThrottle gives every client (user, or address for anonymous
+requests) a budget per endpoint. Views that list or aggregate whole tables
+set throttle_scope = "expensive" and get a smaller budget than the others,
+which use the "cheap" scope. The rates are the DEFAULT_THROTTLE_RATES of
+REST_FRAMEWORK.
+
+AdmissionControlMiddleware (vtso/middleware.py) caps the requests in
+flight, so load is shed with 503/429 before the workers run out of database
+connections.
+
+Both count in the store named by VTSO_COUNTER_STORE. LocalCounterStore keeps
+the counters in the memory of each worker process, CacheCounterStore shares
+them through a Django cache.
+"""
+
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.throttling import ScopedRateThrottle
+
+
+class LocalCounterStore:
+    """
+    Thread-safe counters in the memory of the current process.
+    Expired counters are dropped lazily.
+    """
+
+    # expired counters are purged after this many increments
+    purge_every = 1000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # {key: [value, expires_at or None]}
+        self._counters: dict[str, list] = {}
+        self._increments = 0
+
+    def incr(self, key: str, delta: int = 1, ttl: float | None = None) -> int:
+        """
+        Adds delta to a counter, creating it with a time to live of ttl
+        seconds if it does not exist or has expired.
+
+        Returns:
+            int: the new value of the counter
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._increments += 1
+            if self._increments % self.purge_every == 0:
+                self._purge(now)
+            counter = self._counters.get(key)
+            if counter is None or (counter[1] is not None and counter[1] <= now):
+                counter = self._counters[key] = [
+                    0,
+                    None if ttl is None else now + ttl,
+                ]
+            counter[0] += delta
+            return counter[0]
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+
+    def _purge(self, now: float):
+        expired = [
+            key
+            for key, (_, expires_at) in self._counters.items()
+            if expires_at is not None and expires_at <= now
+        ]
+        for key in expired:
+            del self._counters[key]
+
+
+class CacheCounterStore:
+    """
+    Counters kept in the Django cache named by VTSO_COUNTER_CACHE, for
+    deployments where the limits must hold across worker processes.
+    The cache must support atomic incr() (e.g. Redis or Memcached).
+    """
+
+    def __init__(self):
+        self.cache = caches[getattr(settings, "VTSO_COUNTER_CACHE", "default")]
+
+    def incr(self, key: str, delta: int = 1, ttl: float | None = None) -> int:
+        timeout = None if ttl is None else max(1, int(ttl))
+        self.cache.add(key, 0, timeout=timeout)
+        try:
+            return self.cache.incr(key, delta)
+        except ValueError:
+            # the counter expired between add() and incr()
+            self.cache.add(key, 0, timeout=timeout)
+            return self.cache.incr(key, delta)
+
+    def clear(self):
+        self.cache.clear()
+
+
+@lru_cache(maxsize=None)
+def counter_store():
+    """
+    Returns:
+        LocalCounterStore | CacheCounterStore: the store named by
+        VTSO_COUNTER_STORE, shared by the whole process
+    """
+    path = getattr(settings, "VTSO_COUNTER_STORE", "vtso.throttling.LocalCounterStore")
+    return import_string(path)()
+
+
+class ClientRateThrottle(ScopedRateThrottle):
+    """
+    Fixed window rate limit per client, endpoint and scope.
+
+    The scope is the throttle_scope of the view, "cheap" if it has none.
+    Clients are identified by their user, or by their address when they are
+    not authenticated. Throttled requests get a 429 with a Retry-After
+    header telling when the current window ends.
+    """
+
+    default_scope = "cheap"
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, self.scope_attr, None) or self.default_scope
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        if self.rate is None:
+            return True
+
+        self.now = self.timer()
+        window = int(self.now // self.duration)
+        self.window_end = (window + 1) * self.duration
+        key = f"{self.get_cache_key(request, view)}:{window}"
+        return counter_store().incr(key, ttl=self.duration) <= self.num_requests
+
+    def wait(self):
+        return self.window_end - self.now
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            client = f"user:{request.user.pk}"
+        else:
+            client = f"ip:{self.get_ident(request)}"
+        resolver_match = getattr(request, "resolver_match", None)
+        endpoint = resolver_match.view_name if resolver_match else type(view).__name__
+        return f"vtso:rate:{self.scope}:{endpoint}:{client}"
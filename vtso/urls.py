@@ -2,25 +2,82 @@ from django.urls import path
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 from rest_framework.authtoken import views as auth_token_views
 
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     path("companies/", views.CompanyList.as_view(), name="companies"),
+    # retrieve a company with its fleet summary
+    path("companies/<int:pk>/", views.CompanyDetail.as_view(), name="company_detail"),
     path("persons/", views.PersonList.as_view(), name="persons"),
     # list or create a ship
     path("ships/", views.ShipList.as_view(), name="ships"),
+    # partially update many ships at once
+    path("ships/bulk/", views.ShipBulkUpdate.as_view(), name="ships_bulk"),
     # retrieve or update a ship
     path("ships/<int:pk>/", views.ShipDetail.as_view(), name="ship_detail"),
     # retrieve the harbours a ship has visited
     path("ships/<int:pk>/visits/", views.ShipVisits.as_view(), name="ship_visits"),
+    # ordered port calls of a ship with sea passages between them
+    path(
+        "ships/<int:pk>/itinerary/",
+        views.ShipItinerary.as_view(),
+        name="ship_itinerary",
+    ),
     path("harbours/", views.HarbourList.as_view(), name="harbours"),
+    # passages between every pair of harbours
+    path("harbours/od-matrix/", views.OdMatrix.as_view(), name="od_matrix"),
+    # many harbours with their docked ships, by ids and/or country
+    path(
+        "harbours/details/",
+        views.HarbourDetailsBatch.as_view(),
+        name="harbour_details_batch",
+    ),
     # retrieve a harbour with docked ships
     path(
         "harbours/<int:pk>/details/",
         views.HarbourDetails.as_view(),
         name="harbour_details",
     ),
+    # expected free berths over the next hours
+    path(
+        "harbours/<int:pk>/forecast/",
+        views.HarbourForecast.as_view(),
+        name="harbour_forecast",
+    ),
+    # ships at a harbour over time
+    path(
+        "harbours/<int:pk>/occupancy/",
+        views.HarbourOccupancy.as_view(),
+        name="harbour_occupancy",
+    ),
     path("visits/", views.VisitList.as_view(), name="visits"),
+    # record the departure of a ship still in port
+    path("visits/<int:pk>/close/", views.VisitClose.as_view(), name="visit_close"),
+    # creates, updates and deletes after a given seq, for incremental sync
+    path("changes/", views.ChangeList.as_view(), name="changes"),
+    # async, read-only versions of the endpoints above for ASGI deployments
+    path("async/ships/", async_views.AsyncShipList.as_view(), name="async_ships"),
+    path(
+        "async/ships/<int:pk>/",
+        async_views.AsyncShipDetail.as_view(),
+        name="async_ship_detail",
+    ),
+    path(
+        "async/ships/<int:pk>/visits/",
+        async_views.AsyncShipVisits.as_view(),
+        name="async_ship_visits",
+    ),
+    path(
+        "async/harbours/",
+        async_views.AsyncHarbourList.as_view(),
+        name="async_harbours",
+    ),
+    path(
+        "async/harbours/<int:pk>/details/",
+        async_views.AsyncHarbourDetails.as_view(),
+        name="async_harbour_details",
+    ),
+    path("async/visits/", async_views.AsyncVisitList.as_view(), name="async_visits"),
     # generates and downloads an OpenAPI yaml schema
     path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
     # OpenAPI Swagger UI
@@ -29,5 +86,9 @@ urlpatterns = [
         SpectacularSwaggerView.as_view(url_name="schema"),
         name="swagger-ui",
     ),
+    # legacy tokens that never expire
     path("tokens/obtain/", auth_token_views.obtain_auth_token),
+    # expiring tokens
+    path("tokens/", views.TokenCreate.as_view(), name="token_create"),
+    path("tokens/refresh/", views.TokenRefresh.as_view(), name="token_refresh"),
 ]
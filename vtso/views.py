@@ -1,3 +1,16 @@
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.http import parse_etags
+from django.utils.timezone import is_naive, make_aware
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_spectacular.utils import (
     OpenApiParameter,
@@ -5,29 +18,363 @@ from drf_spectacular.utils import (
     extend_schema,
     extend_schema_view,
 )
-from rest_framework import generics
-from rest_framework.exceptions import NotFound
+from rest_framework import generics, status
+from rest_framework.authtoken.serializers import AuthTokenSerializer
+from rest_framework.exceptions import (
+    APIException,
+    AuthenticationFailed,
+    NotFound,
+    ValidationError,
+)
 from rest_framework.filters import SearchFilter
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.response import Response
 
-from vtso.models import Company, Harbour, Person, Ship, Visit
+from vtso import clock
+from vtso.analytics import (
+    bucket_start,
+    company_summaries,
+    current_ships,
+    harbour_stays,
+    occupancy_timeline,
+    od_matrix,
+    ship_itinerary,
+)
+from vtso.archive import (
+    archive_needed,
+    as_visits,
+    merge_by_id,
+    ship_visit_querysets,
+    visit_filters_need_archive,
+    with_archive,
+)
+from vtso.authentication import ExpiringTokenAuthentication
+from vtso.filters import ShipFilter, VisitFilter
+from vtso.forecast import forecast_berths
+from vtso.middleware import pin_credentials
+from vtso.models import (
+    AccessToken,
+    ArchivedVisit,
+    ChangeLog,
+    Company,
+    DwellWatermark,
+    Harbour,
+    IdempotencyKey,
+    Person,
+    Ship,
+    VersionConflict,
+    Visit,
+)
 from vtso.serializers import (
+    AccessTokenSerializer,
+    BerthForecastSerializer,
+    ChangeLogSerializer,
     CompanySerializer,
+    CompanySummarySerializer,
     HarbourCreateSerializer,
     HarbourDetailsSerializer,
     HarbourListSerializer,
+    OccupancyBucketSerializer,
+    OdPairSerializer,
     PersonSerializer,
+    PortCallSerializer,
     ShipSerializer,
     ShipVisitSerializer,
+    VisitCloseSerializer,
     VisitSerializer,
 )
 
+TRUE_VALUES = ("true", "1", "yes")
+
+
+def parse_datetime_param(query_params, name: str) -> datetime | None:
+    """
+    Parses an optional ISO 8601 date/time query parameter, such as ?as_of=.
+
+    Raises:
+        ValidationError: the parameter is not an ISO 8601 date/time.
+
+    Returns:
+        datetime | None: an aware datetime, or None if the parameter was not given
+    """
+    value = query_params.get(name)
+    if value is None:
+        return None
+    at = parse_datetime(value)
+    if at is None:
+        raise ValidationError({name: "Enter a valid ISO 8601 date/time."})
+    return make_aware(at) if is_naive(at) else at
+
+
+def parse_int_param(query_params, name: str, default: int, minimum: int = 0) -> int:
+    """
+    Parses an optional integer query parameter, such as ?since=.
+
+    Raises:
+        ValidationError: the parameter is not an integer or is below minimum.
+
+    Returns:
+        int: the parameter, or default if it was not given
+    """
+    value = query_params.get(name)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except ValueError as e:
+        raise ValidationError({name: "Enter a whole number."}) from e
+    if number < minimum:
+        raise ValidationError({name: f"Ensure this value is at least {minimum}."})
+    return number
+
+
+def parse_ids(query_params) -> list[int] | None:
+    """
+    Parses the optional ?ids=1,2,3 query parameter used by MultiGetMixin.
+    Duplicated ids are dropped, keeping the order of first appearance.
+
+    Raises:
+        ValidationError: ids are not integers or exceed VTSO_MULTI_GET_MAX_IDS.
+
+    Returns:
+        list[int] | None: the requested ids, or None if ids was not given
+    """
+    raw_ids = query_params.get("ids")
+    if raw_ids is None:
+        return None
+    try:
+        ids = list(dict.fromkeys(int(pk) for pk in raw_ids.split(",") if pk.strip()))
+    except ValueError as e:
+        raise ValidationError({"ids": "Enter a comma separated list of ids."}) from e
+    max_ids = getattr(settings, "VTSO_MULTI_GET_MAX_IDS", 100)
+    if len(ids) > max_ids:
+        raise ValidationError({"ids": f"Ensure at most {max_ids} ids are requested."})
+    return ids
+
+
+class MultiGetMixin:
+    """
+    Lets a list view fetch a batch of objects with ?ids=1,2,3 using a single
+    IN query. Filters and search do not apply to batch lookups.
+
+    The response keeps the order of the requested ids and reports
+    the ids that do not exist:
+        {"results": [...], "missing": [...]}
+    """
+
+    def list(self, request, *args, **kwargs):
+        ids = parse_ids(request.query_params)
+        if ids is None:
+            return super().list(request, *args, **kwargs)
+
+        objects = self.get_queryset().in_bulk(ids)
+        serializer = self.get_serializer(
+            [objects[pk] for pk in ids if pk in objects], many=True
+        )
+        return Response(
+            {
+                "results": serializer.data,
+                "missing": [pk for pk in ids if pk not in objects],
+            }
+        )
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = "The resource was modified since it was read."
+    default_code = "precondition_failed"
+
+
+def version_etag(version: int) -> str:
+    """
+    Returns:
+        str: the ETag of a VersionedModel row, e.g. '"3"'
+    """
+    return f'"{version}"'
+
+
+class IfMatchMixin:
+    """
+    Optimistic concurrency control for the views updating a VersionedModel.
+
+    Responses carry the version of the object as their ETag. Clients send it
+    back in an If-Match header and the update is refused with a 412 if the
+    object changed since: either the header no longer matches, or another
+    write landed between this request's read and its write. Without
+    If-Match, the request is still protected against writes racing it.
+    """
+
+    def check_if_match(self, instance):
+        """
+        Compares the opaque tags only: CompressionMiddleware weakens the
+        ETag of compressed responses to W/"<version>", which still names
+        the version the client read.
+
+        Raises:
+            PreconditionFailed: If-Match does not match the version of instance.
+        """
+        header = self.request.headers.get("If-Match")
+        if header is None:
+            return
+        etags = {etag.removeprefix("W/") for etag in parse_etags(header)}
+        if "*" not in etags and version_etag(instance.version) not in etags:
+            raise PreconditionFailed()
+
+    def save_versioned(self, save, *args, **kwargs):
+        """
+        Calls save(), translating version conflicts into 412 responses.
+        """
+        try:
+            return save(*args, **kwargs)
+        except VersionConflict as e:
+            raise PreconditionFailed() from e
+
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        response["ETag"] = version_etag(response.data["version"])
+        return response
+
+    def update(self, request, *args, **kwargs):
+        response = super().update(request, *args, **kwargs)
+        response["ETag"] = version_etag(response.data["version"])
+        return response
+
+    def perform_update(self, serializer):
+        self.check_if_match(serializer.instance)
+        self.save_versioned(serializer.save)
+
+
+IF_MATCH_PARAMETER = OpenApiParameter(
+    name="If-Match",
+    description=(
+        "ETag of the object as last read. The request fails with 412 if the "
+        "object was modified since."
+    ),
+    required=False,
+    type=str,
+    location=OpenApiParameter.HEADER,
+)
+
+PRECONDITION_FAILED_RESPONSE = OpenApiResponse(
+    description="The object was modified since it was read. Read it again."
+)
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = "This Idempotency-Key was already used for another request."
+    default_code = "idempotency_key_reused"
+
+
+def request_fingerprint(request) -> str:
+    """
+    Returns:
+        str: sha256 of the method, path and parsed body of a request
+    """
+    data = request.data
+    if hasattr(data, "lists"):
+        data = dict(data.lists())
+    payload = json.dumps(
+        [request.method, request.path, data], sort_keys=True, cls=DjangoJSONEncoder
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class IdempotentCreateMixin:
+    """
+    Makes POST requests safe to retry with an Idempotency-Key header.
+
+    The key is recorded with the fingerprint of the request in the
+    transaction creating the object, and the response is stored with it.
+    A retry with the same key and body gets the stored response back, with
+    an Idempotent-Replayed header, for the cost of one indexed lookup.
+    Reusing a key for a different request is refused with a 422. Requests
+    that fail do not keep their key and can be retried as new ones.
+    """
+
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get("Idempotency-Key")
+        if key is None:
+            return super().create(request, *args, **kwargs)
+        if not key or len(key) > IdempotencyKey._meta.get_field("key").max_length:
+            raise ValidationError(
+                {"Idempotency-Key": "Send between 1 and 255 characters."}
+            )
+
+        fingerprint = request_fingerprint(request)
+        ttl = getattr(settings, "VTSO_IDEMPOTENCY_KEY_TTL", 86_400)
+        with transaction.atomic():
+            record, claimed = IdempotencyKey.objects.claim(
+                request.user, key, fingerprint, ttl
+            )
+            if not claimed:
+                if record.fingerprint != fingerprint:
+                    raise IdempotencyKeyReused()
+                return Response(
+                    record.response,
+                    status=record.status_code,
+                    headers={"Idempotent-Replayed": "true"},
+                )
+            response = super().create(request, *args, **kwargs)
+            record.store(response.status_code, response.data)
+        return response
+
+
+IDEMPOTENCY_KEY_PARAMETER = OpenApiParameter(
+    name="Idempotency-Key",
+    description=(
+        "Unique key of this request, e.g. a UUID. Retrying with the same key "
+        "within VTSO_IDEMPOTENCY_KEY_TTL seconds returns the response of the "
+        "first attempt instead of creating the object again."
+    ),
+    required=False,
+    type=str,
+    location=OpenApiParameter.HEADER,
+)
+
+
+IDS_PARAMETER = OpenApiParameter(
+    name="ids",
+    description=(
+        "Comma separated ids to fetch in one request. The response becomes "
+        '{"results": [...], "missing": [...]} in the order of the ids.'
+    ),
+    required=False,
+    type=str,
+    location=OpenApiParameter.QUERY,
+)
+
 
-class CompanyList(generics.ListCreateAPIView):
+@extend_schema_view(
+    get=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="summary",
+                description="Set to true to include the fleet summary of each Company.",
+                required=False,
+                type=bool,
+                location=OpenApiParameter.QUERY,
+            )
+        ],
+        responses={200: CompanySummarySerializer(many=True)},
+    ),
+    post=extend_schema(
+        parameters=[IDEMPOTENCY_KEY_PARAMETER],
+        responses={
+            201: CompanySerializer,
+            422: OpenApiResponse(
+                description="The Idempotency-Key was used for another request."
+            ),
+        },
+    ),
+)
+class CompanyList(IdempotentCreateMixin, generics.ListCreateAPIView):
     """
     View for the /vtso/companies/ endpoint.
 
     A GET request will list all the Companies in the system.
+    With ?summary=true each Company also carries its fleet summary,
+    computed for the whole list with a fixed number of grouped queries.
 
     A POST request will create a new Company.
 
@@ -37,9 +384,76 @@ class CompanyList(generics.ListCreateAPIView):
     queryset = Company.objects.all()
     serializer_class = CompanySerializer
     permission_classes = [IsAuthenticated]
+    throttle_scope = "expensive"
+
+    def summary_requested(self) -> bool:
+        return (
+            self.request.method == "GET"
+            and self.request.query_params.get("summary", "").lower() in TRUE_VALUES
+        )
+
+    def get_serializer_class(self):
+        if self.summary_requested():
+            return CompanySummarySerializer
+        return CompanySerializer
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.summary_requested():
+            context["summaries"] = company_summaries(self.get_queryset())
+        return context
+
+
+@extend_schema_view(
+    get=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="id",
+                description="The ID of the Company to retrieve.",
+                required=True,
+                type=int,
+                location=OpenApiParameter.PATH,
+            )
+        ],
+        responses={
+            200: CompanySummarySerializer,
+            404: OpenApiResponse(description="Company not found."),
+        },
+    ),
+)
+class CompanyDetail(generics.RetrieveAPIView):
+    """
+    View for the /vtso/companies/<int:pk>/ endpoint.
+
+    A GET request will retrieve a Company with its fleet summary: ship
+    count, total tonnage, ship types breakdown, person count and active
+    visits (see vtso.analytics.company_summaries).
+    """
+
+    queryset = Company.objects.all()
+    serializer_class = CompanySummarySerializer
+    permission_classes = [IsAuthenticated]
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["summaries"] = company_summaries(
+            self.get_queryset().filter(pk=self.kwargs["pk"])
+        )
+        return context
 
-class PersonList(generics.ListCreateAPIView):
+
+@extend_schema_view(
+    post=extend_schema(
+        parameters=[IDEMPOTENCY_KEY_PARAMETER],
+        responses={
+            201: PersonSerializer,
+            422: OpenApiResponse(
+                description="The Idempotency-Key was used for another request."
+            ),
+        },
+    ),
+)
+class PersonList(IdempotentCreateMixin, generics.ListCreateAPIView):
     """
     View for the /vtso/persons/ endpoint.
 
@@ -51,27 +465,45 @@ class PersonList(generics.ListCreateAPIView):
     queryset = Person.objects.select_related("company").all()
     serializer_class = PersonSerializer
     permission_classes = [IsAuthenticated]
+    throttle_scope = "expensive"
 
 
-class ShipList(generics.ListCreateAPIView):
+@extend_schema_view(
+    get=extend_schema(parameters=[IDS_PARAMETER]),
+    post=extend_schema(
+        parameters=[IDEMPOTENCY_KEY_PARAMETER],
+        responses={
+            201: ShipSerializer,
+            422: OpenApiResponse(
+                description="The Idempotency-Key was used for another request."
+            ),
+        },
+    ),
+)
+class ShipList(IdempotentCreateMixin, MultiGetMixin, generics.ListCreateAPIView):
     """
     View for /vtso/ships/ endpoint.
 
     A GET request will list all the Ships in the system, including their age.
+    With ?ids=1,2,3 it returns only the given Ships (see MultiGetMixin).
 
     A POST request will create a new Ship.
 
     Here we leverage DRF filtering and search to implement
     the bonus requirement.
 
+    Ships can also be filtered by ?year_built=, ?age_min= and ?age_max=
+    and sorted with ?ordering=age, all computed in SQL (see ShipFilter).
+
     """
 
     queryset = Ship.objects.select_related("company").all()
     serializer_class = ShipSerializer
     permission_classes = [IsAuthenticated]
+    throttle_scope = "expensive"
     filter_backends = [SearchFilter, DjangoFilterBackend]
-    filterset_fields = ["type"]
-    search_fields = ["name", "type", "year_built"]
+    filterset_class = ShipFilter
+    search_fields = ["name", "type"]
 
 
 @extend_schema_view(
@@ -95,10 +527,11 @@ class ShipList(generics.ListCreateAPIView):
                 required=True,
                 type=int,
                 location=OpenApiParameter.PATH,
-            )
+            ),
+            IF_MATCH_PARAMETER,
         ],
         request=ShipSerializer,
-        responses={200: ShipSerializer},
+        responses={200: ShipSerializer, 412: PRECONDITION_FAILED_RESPONSE},
     ),
     patch=extend_schema(
         parameters=[
@@ -108,18 +541,20 @@ class ShipList(generics.ListCreateAPIView):
                 required=True,
                 type=int,
                 location=OpenApiParameter.PATH,
-            )
+            ),
+            IF_MATCH_PARAMETER,
         ],
         request=ShipSerializer,
-        responses={200: ShipSerializer},
+        responses={200: ShipSerializer, 412: PRECONDITION_FAILED_RESPONSE},
     ),
 )
-class ShipDetail(generics.RetrieveUpdateAPIView):
+class ShipDetail(IfMatchMixin, generics.RetrieveUpdateAPIView):
     """
     View for the /vtso/ships/<int:pk>/ endpoint.
 
     A GET request will retrieve the details of a given Ship, while
-    a PUT or PATCH request will update a given Ship.
+    a PUT or PATCH request will update a given Ship. Updates are
+    conditional on the If-Match header, see IfMatchMixin.
 
     """
 
@@ -128,6 +563,136 @@ class ShipDetail(generics.RetrieveUpdateAPIView):
     permission_classes = [IsAuthenticated]
 
 
+@extend_schema_view(
+    patch=extend_schema(
+        description=(
+            "Partially update many Ships at once. The body is a list of "
+            '{"id": <ship id>, "version": <optional>, ...fields} objects and '
+            'the response lists one {"id", "status", "data" | "errors"} result '
+            "per item. Items whose version is not the current one fail with 412."
+        ),
+        request=ShipSerializer(many=True, partial=True),
+        responses={
+            200: OpenApiResponse(description="Per-item results."),
+            400: OpenApiResponse(description="The body is not a list of items."),
+        },
+    ),
+)
+class ShipBulkUpdate(generics.GenericAPIView):
+    """
+    View for the /vtso/ships/bulk/ endpoint.
+
+    A PATCH request partially updates a list of Ships. Every item is
+    validated with ShipSerializer, all the Ships are fetched and locked with
+    one query and the valid items are written with a single bulk_update()
+    in the same transaction, so no write can land between the read and the
+    update. An item may carry the "version" of the Ship as last read by the
+    client, like If-Match on ShipDetail: the item fails with 412 if the
+    Ship was modified since. Invalid, unknown or stale items are reported
+    without blocking the others.
+    """
+
+    queryset = Ship.objects.select_related("company").all()
+    serializer_class = ShipSerializer
+    permission_classes = [IsAuthenticated]
+    throttle_scope = "expensive"
+
+    def patch(self, request, *args, **kwargs):
+        items = request.data
+        if not isinstance(items, list) or not items:
+            raise ValidationError({"detail": "Expected a non-empty list of items."})
+        max_items = getattr(settings, "VTSO_BULK_UPDATE_MAX_ITEMS", 500)
+        if len(items) > max_items:
+            raise ValidationError(
+                {"detail": f"Ensure at most {max_items} items are sent."}
+            )
+
+        # "type(...) is int" also rejects booleans
+        ids = [item.get("id") if isinstance(item, dict) else None for item in items]
+        with transaction.atomic():
+            ships = (
+                self.get_queryset()
+                .select_for_update(of=("self",))
+                .in_bulk([pk for pk in ids if type(pk) is int])
+            )
+            results = self.update_ships(ships, ids, items)
+        for result in results:
+            if "ship" in result:
+                result["data"] = self.get_serializer(result.pop("ship")).data
+        return Response(results)
+
+    def update_ships(self, ships: dict[int, Ship], ids: list, items: list) -> list:
+        """
+        Validates the items against the locked Ships and writes the valid
+        ones with one bulk_update(), bumping their versions.
+
+        Returns:
+            list[dict]: one result per item, with the updated Ship under
+            "ship" for the successful ones
+        """
+        results = []
+        updated: dict[int, Ship] = {}
+        fields: set[str] = set()
+        for pk, item in zip(ids, items):
+            ship = ships.get(pk) if type(pk) is int else None
+            if ship is None:
+                results.append(
+                    {"id": pk, "status": 404, "errors": {"detail": "Ship not found."}}
+                )
+                continue
+
+            version = item.get("version")
+            if version is not None and type(version) is not int:
+                results.append(
+                    {
+                        "id": pk,
+                        "status": 400,
+                        "errors": {"version": ["A valid integer is required."]},
+                    }
+                )
+                continue
+            if version is not None and version != ship.version:
+                results.append(
+                    {
+                        "id": pk,
+                        "status": 412,
+                        "errors": {"detail": PreconditionFailed.default_detail},
+                    }
+                )
+                continue
+
+            data = {
+                key: value
+                for key, value in item.items()
+                if key not in ("id", "version")
+            }
+            serializer = self.get_serializer(ship, data=data, partial=True)
+            if not serializer.is_valid():
+                results.append({"id": pk, "status": 400, "errors": serializer.errors})
+                continue
+
+            for attr, value in serializer.validated_data.items():
+                setattr(ship, attr, value)
+            fields.update(serializer.validated_data)
+            updated[pk] = ship
+            results.append({"id": pk, "status": 200, "ship": ship})
+
+        if "year_built" in fields:
+            # bulk_update() skips save(), so derive year_built_int here
+            for ship in updated.values():
+                ship.clean()
+            fields.add("year_built_int")
+        if fields:
+            # the rows are locked, so the versions read above are current;
+            # bumping them makes clients holding an older ETag get a 412
+            # instead of overwriting this update
+            for ship in updated.values():
+                ship.version += 1
+            Ship.objects.bulk_update(updated.values(), sorted(fields | {"version"}))
+            ChangeLog.record_many(updated.values(), ChangeLog.Action.UPDATE)
+        return results
+
+
 @extend_schema_view(
     get=extend_schema(
         parameters=[
@@ -137,7 +702,21 @@ class ShipDetail(generics.RetrieveUpdateAPIView):
                 required=True,
                 type=int,
                 location=OpenApiParameter.PATH,
-            )
+            ),
+            OpenApiParameter(
+                name="entry_time_after",
+                description="Only list Visits that started at or after this time.",
+                required=False,
+                type=str,
+                location=OpenApiParameter.QUERY,
+            ),
+            OpenApiParameter(
+                name="entry_time_before",
+                description="Only list Visits that started at or before this time.",
+                required=False,
+                type=str,
+                location=OpenApiParameter.QUERY,
+            ),
         ],
         responses={
             200: ShipSerializer,
@@ -150,56 +729,142 @@ class ShipVisits(generics.ListAPIView):
     View for /vtso/ships/<int:pk>/visits/ endpoint.
 
     A GET request will list all the Harbours a Ship has visited.
+    Visits moved to the archive are included whenever the requested
+    entry_time range reaches back into archived history.
     """
 
     serializer_class = ShipVisitSerializer
     permission_classes = [IsAuthenticated]
+    throttle_scope = "expensive"
 
     def get_queryset(self):
         """
-        Returns all the Visits of the Ship specified by pk.
+        Returns all the Visits of the Ship specified by pk,
+        hot and archived, in id order.
 
         Raises:
             NotFound: theres no Ship with the given pk in the database.
 
         Returns:
-            QuerySet[Visit]:
+            list[Visit | ArchivedVisit]:
         """
         ship_id = self.kwargs["pk"]
-        try:
-            ship = Ship.objects.get(pk=ship_id)
-            return Visit.objects.filter(ship=ship)
-        except Ship.DoesNotExist as e:
-            raise NotFound("Ship not found") from e
+        if not Ship.objects.filter(pk=ship_id).exists():
+            raise NotFound("Ship not found")
+
+        entry_time_after = parse_datetime_param(
+            self.request.query_params, "entry_time_after"
+        )
+        querysets = ship_visit_querysets(
+            ship_id,
+            entry_time_after=entry_time_after,
+            entry_time_before=parse_datetime_param(
+                self.request.query_params, "entry_time_before"
+            ),
+            include_archive=archive_needed(entry_time_after),
+        )
+        return merge_by_id(*querysets)
+
+
+@extend_schema_view(
+    get=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="id",
+                description="The ID of the Ship.",
+                required=True,
+                type=int,
+                location=OpenApiParameter.PATH,
+            ),
+            OpenApiParameter(
+                name="entry_time_after",
+                description="Only list port calls that started at or after this time.",
+                required=False,
+                type=str,
+                location=OpenApiParameter.QUERY,
+            ),
+            OpenApiParameter(
+                name="entry_time_before",
+                description="Only list port calls that started at or before this time.",
+                required=False,
+                type=str,
+                location=OpenApiParameter.QUERY,
+            ),
+        ],
+        responses={
+            200: PortCallSerializer(many=True),
+            400: OpenApiResponse(description="Invalid entry time."),
+            404: OpenApiResponse(description="Ship not found."),
+        },
+    ),
+)
+class ShipItinerary(generics.ListAPIView):
+    """
+    View for /vtso/ships/<int:pk>/itinerary/ endpoint.
+
+    A GET request will list the port calls of a Ship in order, each with the
+    previous and next Harbour, the time spent in port and the time at sea
+    before and after it. The neighbours are computed by window functions in
+    the query (see vtso.analytics.ship_itinerary), so only the requested
+    range is read.
+    """
+
+    serializer_class = PortCallSerializer
+    permission_classes = [IsAuthenticated]
+    throttle_scope = "expensive"
+
+    def get_queryset(self):
+        """
+        Raises:
+            NotFound: theres no Ship with the given pk in the database.
+
+        Returns:
+            list[Visit | ArchivedVisit]:
+        """
+        ship_id = self.kwargs["pk"]
+        if not Ship.objects.filter(pk=ship_id).exists():
+            raise NotFound("Ship not found")
+        return ship_itinerary(
+            ship_id,
+            start=parse_datetime_param(self.request.query_params, "entry_time_after"),
+            end=parse_datetime_param(self.request.query_params, "entry_time_before"),
+        )
 
 
 @extend_schema_view(
     get=extend_schema(
         description="List all the Harbours in the system",
+        parameters=[IDS_PARAMETER],
         responses={200: HarbourListSerializer(many=True)},
     ),
     post=extend_schema(
         description="Create a new harbour",
+        parameters=[IDEMPOTENCY_KEY_PARAMETER],
         request=HarbourCreateSerializer,
         responses={
             201: OpenApiResponse(
                 response=HarbourCreateSerializer, description="Created harbour"
             ),
             400: OpenApiResponse(description="Validation error"),
+            422: OpenApiResponse(
+                description="The Idempotency-Key was used for another request."
+            ),
         },
     ),
 )
-class HarbourList(generics.ListCreateAPIView):
+class HarbourList(IdempotentCreateMixin, MultiGetMixin, generics.ListCreateAPIView):
     """
     View for the /vtso/harbours/ endpoint.
 
     A GET request will list all the Harbours in the system.
+    With ?ids=1,2,3 it returns only the given Harbours (see MultiGetMixin).
 
     A POST request will create a new Harbour.
     """
 
     queryset = Harbour.objects.all()
     permission_classes = [IsAuthenticated]
+    throttle_scope = "expensive"
 
     def get_serializer_class(self):
         """
@@ -224,10 +889,18 @@ class HarbourList(generics.ListCreateAPIView):
                 required=True,
                 type=int,
                 location=OpenApiParameter.PATH,
-            )
+            ),
+            OpenApiParameter(
+                name="as_of",
+                description="List the Ships docked at this ISO 8601 time instead of now.",
+                required=False,
+                type=str,
+                location=OpenApiParameter.QUERY,
+            ),
         ],
         responses={
             200: ShipSerializer,
+            400: OpenApiResponse(description="Invalid as_of."),
             404: OpenApiResponse(description="Harbour not found."),
         },
     ),
@@ -239,18 +912,389 @@ class HarbourDetails(generics.RetrieveAPIView):
     A GET request will retrieve the details of a given Harbour, including
     a list of Ships currently docked at it.
 
+    An optional ?as_of= query parameter freezes the clock at a past
+    (or future) time, so docked Ships and their ages are computed as of then.
+
+    """
+
+    queryset = Harbour.objects.all()
+    serializer_class = HarbourDetailsSerializer
+    permission_classes = [IsAuthenticated]
+
+    def retrieve(self, request, *args, **kwargs):
+        as_of = parse_datetime_param(request.query_params, "as_of")
+        if as_of is None:
+            return super().retrieve(request, *args, **kwargs)
+        with clock.frozen(as_of):
+            return super().retrieve(request, *args, **kwargs)
+
+
+@extend_schema_view(
+    get=extend_schema(
+        parameters=[
+            IDS_PARAMETER,
+            OpenApiParameter(
+                name="country",
+                description="Return every Harbour of this country.",
+                required=False,
+                type=str,
+                location=OpenApiParameter.QUERY,
+            ),
+            OpenApiParameter(
+                name="as_of",
+                description="List the Ships docked at this ISO 8601 time instead of now.",
+                required=False,
+                type=str,
+                location=OpenApiParameter.QUERY,
+            ),
+        ],
+        responses={
+            200: OpenApiResponse(
+                response=HarbourDetailsSerializer(many=True),
+                description='{"results": [...], "missing": [...]}',
+            ),
+            400: OpenApiResponse(
+                description="Neither ids nor country given, or invalid as_of."
+            ),
+        },
+    ),
+)
+class HarbourDetailsBatch(generics.GenericAPIView):
+    """
+    View for the /vtso/harbours/details/ endpoint.
+
+    A GET request returns the details of many Harbours, selected with
+    ?ids=1,2,3 and/or ?country=, in the format of /harbours/<pk>/details/.
+    The docked Ships of all the Harbours are fetched with one query and
+    each Ship is serialized once, so a whole region costs two queries.
+
+    The response keeps the order of the requested ids and reports the ids
+    that do not exist: {"results": [...], "missing": [...]}. Without ids,
+    the Harbours are sorted by id.
     """
 
     queryset = Harbour.objects.all()
     serializer_class = HarbourDetailsSerializer
     permission_classes = [IsAuthenticated]
+    throttle_scope = "expensive"
+
+    def get(self, request, *args, **kwargs):
+        ids = parse_ids(request.query_params)
+        country = request.query_params.get("country")
+        if ids is None and country is None:
+            raise ValidationError({"detail": "Pass ids, country or both."})
+        as_of = parse_datetime_param(request.query_params, "as_of")
+
+        with clock.frozen(as_of or clock.now()):
+            queryset = self.get_queryset()
+            if country is not None:
+                queryset = queryset.filter(country=country)
+            if ids is None:
+                harbours = list(queryset.order_by("id"))
+                missing = []
+            else:
+                found = queryset.in_bulk(ids)
+                harbours = [found[pk] for pk in ids if pk in found]
+                missing = [pk for pk in ids if pk not in found]
+
+            ships_by_harbour = current_ships([harbour.id for harbour in harbours])
+            ships = {
+                ship.id: ship for docked in ships_by_harbour.values() for ship in docked
+            }
+            ship_data = {
+                data["id"]: data
+                for data in ShipSerializer(list(ships.values()), many=True).data
+            }
+            serializer = self.get_serializer(
+                harbours,
+                many=True,
+                context={
+                    **self.get_serializer_context(),
+                    "current_ships": ships_by_harbour,
+                    "ship_data": ship_data,
+                },
+            )
+            return Response({"results": serializer.data, "missing": missing})
+
+
+@extend_schema_view(
+    get=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="id",
+                description="The ID of the Harbour.",
+                required=True,
+                type=int,
+                location=OpenApiParameter.PATH,
+            ),
+            OpenApiParameter(
+                name="hours",
+                description=(
+                    "Number of hours to forecast. Defaults to 24, "
+                    "at most VTSO_FORECAST_MAX_HOURS."
+                ),
+                required=False,
+                type=int,
+                location=OpenApiParameter.QUERY,
+            ),
+        ],
+        responses={
+            200: OpenApiResponse(
+                description=(
+                    '{"harbour": <id>, "berths": <int | null>, '
+                    '"learned_until": <datetime | null>, "forecast": [...]}'
+                )
+            ),
+            400: OpenApiResponse(description="Invalid hours."),
+            404: OpenApiResponse(description="Harbour not found."),
+        },
+    ),
+)
+class HarbourForecast(generics.GenericAPIView):
+    """
+    View for the /vtso/harbours/<int:pk>/forecast/ endpoint.
+
+    A GET request will return the expected number of occupied and free
+    berths of the Harbour at every hour from now, estimated from the docked
+    and scheduled Ships and the dwell times learned from past Visits
+    (see vtso/forecast.py). learned_until tells how recent the learned
+    history is.
+    """
+
+    queryset = Harbour.objects.all()
+    serializer_class = BerthForecastSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        harbour = self.get_object()
+        max_hours = getattr(settings, "VTSO_FORECAST_MAX_HOURS", 168)
+        hours = parse_int_param(request.query_params, "hours", 24, minimum=1)
+        if hours > max_hours:
+            raise ValidationError(
+                {"hours": f"Ensure this value is at most {max_hours}."}
+            )
+
+        watermark = DwellWatermark.objects.filter(pk=1).first()
+        forecast = forecast_berths(harbour, hours)
+        return Response(
+            {
+                "harbour": harbour.id,
+                "berths": harbour.berths,
+                "learned_until": watermark and watermark.learned_until,
+                "forecast": self.get_serializer(forecast, many=True).data,
+            }
+        )
+
+
+OCCUPANCY_BUCKETS = {
+    "15min": timedelta(minutes=15),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+    "week": timedelta(weeks=1),
+}
+
+
+@extend_schema_view(
+    get=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="id",
+                description="The ID of the Harbour.",
+                required=True,
+                type=int,
+                location=OpenApiParameter.PATH,
+            ),
+            OpenApiParameter(
+                name="from",
+                description=(
+                    "Start of the timeline (ISO 8601). Defaults to the start "
+                    "of the bucket 30 days before to."
+                ),
+                required=False,
+                type=str,
+                location=OpenApiParameter.QUERY,
+            ),
+            OpenApiParameter(
+                name="to",
+                description=(
+                    "End of the timeline (ISO 8601). Defaults to the end of "
+                    "the current bucket."
+                ),
+                required=False,
+                type=str,
+                location=OpenApiParameter.QUERY,
+            ),
+            OpenApiParameter(
+                name="bucket",
+                description="Length of the buckets. Defaults to hour.",
+                required=False,
+                type=str,
+                enum=list(OCCUPANCY_BUCKETS),
+                location=OpenApiParameter.QUERY,
+            ),
+        ],
+        responses={
+            200: OccupancyBucketSerializer(many=True),
+            400: OpenApiResponse(description="Invalid from, to or bucket."),
+            404: OpenApiResponse(description="Harbour not found."),
+        },
+    ),
+)
+class HarbourOccupancy(generics.GenericAPIView):
+    """
+    View for the /vtso/harbours/<int:pk>/occupancy/ endpoint.
 
+    A GET request will return the peak and average number of Ships at the
+    Harbour in each bucket between ?from= and ?to=. The Visits overlapping
+    the range are read with one query and swept once
+    (see vtso.analytics.occupancy_timeline).
 
-class VisitList(generics.ListCreateAPIView):
+    Without ?to=, the timeline ends with the bucket holding the current
+    time, and without ?from= it starts on a bucket boundary 30 days before
+    its end, so that the default buckets are whole quarter hours, hours,
+    days or weeks of the local clock (see vtso.analytics.bucket_start).
+    Buckets have a fixed length, so day and week buckets following a
+    daylight saving change start an hour off midnight.
+    """
+
+    queryset = Harbour.objects.all()
+    serializer_class = OccupancyBucketSerializer
+    permission_classes = [IsAuthenticated]
+    throttle_scope = "expensive"
+
+    def get(self, request, *args, **kwargs):
+        harbour = self.get_object()
+        bucket_name = request.query_params.get("bucket", "hour")
+        if bucket_name not in OCCUPANCY_BUCKETS:
+            raise ValidationError(
+                {"bucket": f"Choose one of {', '.join(OCCUPANCY_BUCKETS)}."}
+            )
+        bucket = OCCUPANCY_BUCKETS[bucket_name]
+        end = parse_datetime_param(request.query_params, "to")
+        if end is None:
+            now = clock.now()
+            end = bucket_start(now, bucket)
+            if end < now:
+                end += bucket
+        start = parse_datetime_param(request.query_params, "from") or bucket_start(
+            end - timedelta(days=30), bucket
+        )
+        if start >= end:
+            raise ValidationError({"from": "from must be before to."})
+        max_buckets = getattr(settings, "VTSO_OCCUPANCY_MAX_BUCKETS", 5000)
+        if (end - start) / bucket > max_buckets:
+            raise ValidationError(
+                {"bucket": f"Ensure the range spans at most {max_buckets} buckets."}
+            )
+
+        timeline = occupancy_timeline(
+            harbour_stays(harbour.id, start, end), start, end, bucket
+        )
+        return Response(self.get_serializer(timeline, many=True).data)
+
+
+@extend_schema_view(
+    get=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="from",
+                description=(
+                    "Count passages arriving at or after this time (ISO 8601). "
+                    "Defaults to 30 days before to."
+                ),
+                required=False,
+                type=str,
+                location=OpenApiParameter.QUERY,
+            ),
+            OpenApiParameter(
+                name="to",
+                description=(
+                    "Count passages arriving before this time (ISO 8601). "
+                    "Defaults to now."
+                ),
+                required=False,
+                type=str,
+                location=OpenApiParameter.QUERY,
+            ),
+            OpenApiParameter(
+                name="ship_type",
+                description="Only count Ships of this type.",
+                required=False,
+                type=str,
+                enum=Ship.ShipType.values,
+                location=OpenApiParameter.QUERY,
+            ),
+        ],
+        responses={
+            200: OdPairSerializer(many=True),
+            400: OpenApiResponse(description="Invalid from, to or ship_type."),
+        },
+    ),
+)
+class OdMatrix(generics.GenericAPIView):
+    """
+    View for the /vtso/harbours/od-matrix/ endpoint.
+
+    A GET request will return, for every pair of Harbours, the number of
+    passages between them and their median duration, most travelled first
+    (see vtso.analytics.od_matrix).
+
+    Periods with an explicit ?to= that ended before the request are cached
+    for VTSO_OD_CACHE_SECONDS, as their passages no longer change. The
+    default period ends now and is never cached.
+    """
+
+    serializer_class = OdPairSerializer
+    permission_classes = [IsAuthenticated]
+    throttle_scope = "expensive"
+
+    def get(self, request, *args, **kwargs):
+        now = clock.now()
+        to = parse_datetime_param(request.query_params, "to")
+        end = to or now
+        start = parse_datetime_param(request.query_params, "from") or (
+            end - timedelta(days=30)
+        )
+        if start >= end:
+            raise ValidationError({"from": "from must be before to."})
+        ship_type = request.query_params.get("ship_type")
+        if ship_type is not None and ship_type not in Ship.ShipType.values:
+            raise ValidationError(
+                {"ship_type": f"Choose one of {', '.join(Ship.ShipType.values)}."}
+            )
+
+        closed = to is not None and to < now
+        key = f"vtso:od-matrix:{start.isoformat()}:{end.isoformat()}:{ship_type}"
+        data = cache.get(key) if closed else None
+        if data is None:
+            matrix = od_matrix(start, end, ship_type=ship_type)
+            data = self.get_serializer(matrix, many=True).data
+            if closed:
+                cache.set(key, data, getattr(settings, "VTSO_OD_CACHE_SECONDS", 86_400))
+        return Response(data)
+
+
+@extend_schema_view(
+    post=extend_schema(
+        parameters=[IDEMPOTENCY_KEY_PARAMETER],
+        responses={
+            201: VisitSerializer,
+            422: OpenApiResponse(
+                description="The Idempotency-Key was used for another request."
+            ),
+        },
+    ),
+)
+class VisitList(IdempotentCreateMixin, generics.ListCreateAPIView):
     """
     View for the /vtso/visits endpoint.
 
-    A GET request will list all the Visits in the system.
+    A GET request will list all the Visits in the system, archived ones
+    included. They can be filtered by ?harbour=, ?ship= and entry/exit time
+    ranges, and sorted with ?ordering= (see VisitFilter). The archive is
+    only read when the filters can match archived Visits, i.e. not for
+    ?open=true nor for an ?entry_time_after= newer than the archive; when
+    it is, the Visits are sorted by id unless ?ordering= is given.
 
     A POST request will create a new Visit.
     """
@@ -258,3 +1302,237 @@ class VisitList(generics.ListCreateAPIView):
     queryset = Visit.objects.select_related("harbour", "ship").all()
     serializer_class = VisitSerializer
     permission_classes = [IsAuthenticated]
+    throttle_scope = "expensive"
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = VisitFilter
+
+    @classmethod
+    def archive_filterset(cls, query_params) -> VisitFilter:
+        """
+        Returns:
+            VisitFilter: the filters of the request applied to the archive,
+            validated (the same filters on the hot table already passed)
+        """
+        filterset = cls.filterset_class(
+            query_params, queryset=ArchivedVisit.objects.all()
+        )
+        filterset.is_valid()
+        return filterset
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        archived = self.archive_filterset(request.query_params)
+        filters = archived.form.cleaned_data
+        if visit_filters_need_archive(filters):
+            queryset = as_visits(
+                with_archive(queryset, archived.qs, filters.get("ordering"))
+            )
+        return Response(self.get_serializer(queryset, many=True).data)
+
+
+@extend_schema_view(
+    post=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="id",
+                description="The ID of the Visit to close.",
+                required=True,
+                type=int,
+                location=OpenApiParameter.PATH,
+            ),
+            IF_MATCH_PARAMETER,
+        ],
+        request=VisitCloseSerializer,
+        responses={
+            200: VisitSerializer,
+            400: OpenApiResponse(
+                description="The Visit is already closed or exit_time is invalid."
+            ),
+            404: OpenApiResponse(description="Visit not found."),
+            412: PRECONDITION_FAILED_RESPONSE,
+        },
+    ),
+)
+class VisitClose(IfMatchMixin, generics.GenericAPIView):
+    """
+    View for the /vtso/visits/<int:pk>/close/ endpoint.
+
+    A POST request will record the departure of the Ship of an open Visit,
+    at the given exit_time or now. The Visit is not locked: of two
+    concurrent closes, the second fails with a 412 (see IfMatchMixin).
+    """
+
+    queryset = Visit.objects.all()
+    serializer_class = VisitCloseSerializer
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        visit = self.get_object()
+        self.check_if_match(visit)
+        if not visit.is_open:
+            raise ValidationError({"detail": "The Visit is already closed."})
+        visit.exit_time = serializer.validated_data.get("exit_time", clock.now())
+        try:
+            visit.clean()
+        except DjangoValidationError as e:
+            raise ValidationError({"exit_time": e.messages}) from e
+        self.save_versioned(visit.save, update_fields=["exit_time"])
+        response = Response(VisitSerializer(visit).data)
+        response["ETag"] = version_etag(visit.version)
+        return response
+
+
+@extend_schema_view(
+    get=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="since",
+                description="Only list the changes after this seq. Defaults to 0.",
+                required=False,
+                type=int,
+                location=OpenApiParameter.QUERY,
+            ),
+            OpenApiParameter(
+                name="limit",
+                description=(
+                    "Maximum number of changes returned, "
+                    "up to VTSO_CHANGE_FEED_MAX_LIMIT."
+                ),
+                required=False,
+                type=int,
+                location=OpenApiParameter.QUERY,
+            ),
+        ],
+        responses={
+            200: OpenApiResponse(
+                description=(
+                    '{"results": [...], "next": <seq>, "has_more": <bool>}. '
+                    "Pass next as ?since= to read the following batch."
+                )
+            ),
+            400: OpenApiResponse(description="Invalid since or limit."),
+        },
+    ),
+)
+class ChangeList(generics.ListAPIView):
+    """
+    View for the /vtso/changes/ endpoint.
+
+    A GET request will list, in seq order, the creates, updates and deletes
+    of Companies, Persons, Harbours, Ships and Visits recorded after ?since=.
+    Mirrors apply the batch, store "next" and poll again with ?since=<next>
+    until has_more is false, so a sync costs what changed since the last one.
+
+    seq values are allocated when a change is written, so with concurrent
+    writers a change may commit after a higher seq was read. The feed
+    therefore stops at the first change written in the last
+    VTSO_CHANGE_FEED_SETTLE_SECONDS: a mirror never moves past a seq whose
+    transaction may still be in flight, as long as write transactions are
+    shorter than that window. Held back changes are served by a later poll.
+    """
+
+    queryset = ChangeLog.objects.all()
+    serializer_class = ChangeLogSerializer
+    permission_classes = [IsAuthenticated]
+    throttle_scope = "expensive"
+
+    def list(self, request, *args, **kwargs):
+        since = parse_int_param(request.query_params, "since", default=0)
+        max_limit = getattr(settings, "VTSO_CHANGE_FEED_MAX_LIMIT", 1000)
+        limit = min(
+            parse_int_param(request.query_params, "limit", max_limit, minimum=1),
+            max_limit,
+        )
+
+        # one extra row tells whether another batch follows
+        changes = list(
+            self.get_queryset().filter(seq__gt=since).order_by("seq")[: limit + 1]
+        )
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+        settle = getattr(settings, "VTSO_CHANGE_FEED_SETTLE_SECONDS", 5)
+        settled = timezone.now() - timedelta(seconds=settle)
+        for index, change in enumerate(changes):
+            if change.created_at > settled:
+                changes, has_more = changes[:index], False
+                break
+        return Response(
+            {
+                "results": self.get_serializer(changes, many=True).data,
+                "next": changes[-1].seq if changes else since,
+                "has_more": has_more,
+            }
+        )
+
+
+@extend_schema_view(
+    post=extend_schema(
+        request=AuthTokenSerializer,
+        responses={
+            201: AccessTokenSerializer,
+            400: OpenApiResponse(description="Invalid username or password."),
+        },
+    ),
+)
+class TokenCreate(generics.GenericAPIView):
+    """
+    View for the /vtso/tokens/ endpoint.
+
+    A POST request with a username and password returns a new expiring
+    token, valid for VTSO_TOKEN_TTL seconds. This checks the password, which
+    is slow by design, so clients should keep the token and renew it with
+    /vtso/tokens/refresh/ instead of asking for a new one every time.
+    """
+
+    serializer_class = AuthTokenSerializer
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    throttle_scope = "expensive"
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        access_token, token = AccessToken.issue(serializer.validated_data["user"])
+        pin_credentials(request, f"{ExpiringTokenAuthentication.keyword} {token}")
+        data = {"token": token, "expires_at": access_token.expires_at}
+        return Response(
+            AccessTokenSerializer(data).data, status=status.HTTP_201_CREATED
+        )
+
+
+@extend_schema_view(
+    post=extend_schema(
+        request=None,
+        responses={
+            201: AccessTokenSerializer,
+            401: OpenApiResponse(description="The token is invalid or expired."),
+        },
+    ),
+)
+class TokenRefresh(generics.GenericAPIView):
+    """
+    View for the /vtso/tokens/refresh/ endpoint.
+
+    A POST request authenticated with a valid expiring token replaces it
+    with a new one. The old token stops working. No password is checked,
+    so a refresh costs one indexed lookup, one delete and one insert. The
+    old token is deleted first: of concurrent refreshes with the same token,
+    only the one that deleted it gets a new token, the others get a 401.
+    """
+
+    authentication_classes = [ExpiringTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        with transaction.atomic():
+            deleted, _ = AccessToken.objects.filter(pk=request.auth.pk).delete()
+            if not deleted:
+                raise AuthenticationFailed("Invalid token.")
+            access_token, token = AccessToken.issue(request.user)
+        pin_credentials(request, f"{ExpiringTokenAuthentication.keyword} {token}")
+        data = {"token": token, "expires_at": access_token.expires_at}
+        return Response(
+            AccessTokenSerializer(data).data, status=status.HTTP_201_CREATED
+        )